@@ -0,0 +1,345 @@
+import gc
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import archive
+import replica
+import streaming
+
+EXTRACT_CHUNK_SIZE = int(os.environ.get("CRM_ANALYTICS_CHUNK_SIZE", "200000"))
+# Largest customer x month matrix cohort_retention() builds (bytes)
+PRESENCE_LIMIT = 64 * 2 ** 20
+
+# Reporting periods offered to callers, as pandas offsets
+PERIODS = {
+    "day": "D",
+    "week": "W-MON",
+    "month": "MS",
+    "quarter": "QS",
+}
+
+
+def _empty_sales():
+    return pd.DataFrame({
+        "sale_id": pd.Series(dtype="int64"),
+        "product_id": pd.Series(dtype="int32"),
+        "quantity": pd.Series(dtype="int32"),
+        "total_price": pd.Series(dtype="float64"),
+        "customer": pd.Series(dtype="int32"),
+        "sale_date": pd.Series(dtype="datetime64[ns]"),
+    })
+
+
+def period_start(dates, period="month"):
+    """
+    First day of the period containing each timestamp, as datetime64[D];
+    weeks start on Monday
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if period == "day":
+        return days
+    if period == "week":
+        # 1970-01-01 was a Thursday
+        return days - ((days.astype("int64") + 3) % 7).astype("timedelta64[D]")
+    months = days.astype("datetime64[M]")
+    if period == "quarter":
+        ordinals = months.astype("int64")
+        months = (ordinals - ordinals % 3).astype("datetime64[M]")
+    elif period != "month":
+        raise ValueError(f"Unknown period: {period}")
+    return months.astype("datetime64[D]")
+
+
+class SalesExtract:
+    """
+    Columnar copy of the sales table, archived months included, plus the
+    product catalog.
+
+    refresh() only reads sales with an id above the highest one already held
+    and appends them as a new chunk; frame() concatenates chunks lazily.
+    Customer emails are lower-cased and stored as stable integer codes. If
+    the trigger-maintained order count no longer matches the rows held
+    (sales were deleted), the extract is rebuilt from scratch.
+    """
+
+    def __init__(self, chunk_size=EXTRACT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.products = pd.DataFrame({
+            "name": pd.Series(dtype="object"),
+            "category": pd.Series(dtype="category"),
+            "stock_quantity": pd.Series(dtype="int64"),
+        }, index=pd.Index([], dtype="int64", name="product_id"))
+        self.refreshed_at = None
+        self.last_refresh = {"rows": 0, "seconds": 0.0, "full": False}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._chunks = []
+        self._rows = 0
+        self._emails = pd.Index([], dtype="object")
+        self._frame = None
+        self.last_id = 0
+
+    def _encode_emails(self, values):
+        # Factorize the chunk, normalize only its distinct values, then map
+        # them onto the codes already handed out
+        codes, uniques = pd.factorize(np.asarray(values, dtype="object"))
+        if not len(uniques):
+            return codes.astype("int32")
+        normalized = pd.Index(uniques).str.strip().str.lower()
+        positions = self._emails.get_indexer(normalized)
+        unseen = normalized[positions == -1].unique()
+        if len(unseen):
+            self._emails = self._emails.append(unseen)
+            positions = self._emails.get_indexer(normalized)
+        return np.where(codes >= 0, positions[codes], -1).astype("int32")
+
+    def _typed_chunk(self, rows):
+        columns = list(zip(*rows))
+        return pd.DataFrame({
+            "sale_id": np.array(columns[0], dtype="int64"),
+            "product_id": np.array(columns[1], dtype="int32"),
+            "quantity": np.array(columns[2], dtype="int32"),
+            "total_price": np.array(columns[3], dtype="float64"),
+            "customer": self._encode_emails(columns[4]),
+            "sale_date": pd.to_datetime(pd.Series(columns[5]), format="ISO8601"),
+        })
+
+    def _read_sales(self, conn, after_id, table="sales"):
+        cursor = conn.execute(f'''
+        SELECT id, product_id, quantity, total_price, customer_email, sale_date
+        FROM {table}
+        WHERE id > ? AND product_id IS NOT NULL
+        ORDER BY id
+        ''', (after_id,))
+        read = 0
+        # Millions of short-lived row tuples would otherwise trigger repeated
+        # full garbage collections that find nothing to free
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for rows in streaming.iter_chunks(cursor, self.chunk_size):
+                chunk = self._typed_chunk(rows)
+                self._chunks.append(chunk)
+                self._rows += len(chunk)
+                self.last_id = max(self.last_id, int(chunk["sale_id"].iloc[-1]))
+                read += len(chunk)
+        finally:
+            if collecting:
+                gc.enable()
+        return read
+
+    def _read_all_sales(self, conn):
+        # Archived months first, one file attached at a time, then the hot
+        # table; new sales only ever land in the hot table
+        read = 0
+        for partition in archive.partitions(conn):
+            with archive.attached(conn, [partition]) as aliases:
+                read += self._read_sales(conn, 0, f"{aliases[0]}.sales")
+        return read + self._read_sales(conn, 0)
+
+    def _read_products(self, conn):
+        cursor = conn.execute("SELECT id, name, category, stock_quantity FROM products")
+        frame = pd.DataFrame.from_records(cursor.fetchall(),
+                                          columns=["product_id", "name", "category", "stock_quantity"])
+        frame["category"] = frame["category"].fillna("Uncategorized").astype("category")
+        return frame.set_index("product_id")
+
+    def _expected_rows(self, conn):
+        try:
+            row = conn.execute("SELECT value FROM metric_totals WHERE name = 'orders'").fetchone()
+        except Exception:
+            return None
+        return None if row is None else int(row[0])
+
+    def refresh(self, conn=None, full=False):
+        """
+        Pull new sales into the extract; returns the number of rows read
+        """
+        if conn is None:
+            with replica.report_connection() as conn:
+                return self.refresh(conn, full)
+
+        with self._lock:
+            started = time.perf_counter()
+            if not self.last_id:
+                full = True
+            if full:
+                self._reset()
+                read = self._read_all_sales(conn)
+            else:
+                read = self._read_sales(conn, self.last_id)
+
+            expected = self._expected_rows(conn)
+            if not full and expected is not None and self._rows != expected:
+                # Rows were deleted or written below the high-water mark
+                full = True
+                self._reset()
+                read = self._read_all_sales(conn)
+
+            products = self._read_products(conn)
+            if read or full or not products.equals(self.products):
+                self._frame = None
+            self.products = products
+            self.refreshed_at = time.time()
+            self.last_refresh = {"rows": read, "seconds": time.perf_counter() - started, "full": full}
+            return read
+
+    def frame(self):
+        """
+        All sales with customer_email and the current product category as
+        categoricals. The frame is shared until the next refresh; don't
+        modify it in place.
+        """
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+            if len(self._chunks) > 1:
+                self._chunks = [pd.concat(self._chunks, ignore_index=True)]
+            sales = self._chunks[0] if self._chunks else _empty_sales()
+            products = self.products
+
+            frame = sales.drop(columns="customer")
+            frame["customer_email"] = pd.Categorical.from_codes(sales["customer"].to_numpy(),
+                                                                categories=self._emails)
+            # Category codes looked up by product id in one vectorized take
+            categories = products["category"]
+            size = max(int(products.index.max()) if len(products) else 0,
+                       int(sales["product_id"].max()) if len(sales) else 0) + 1
+            lookup = np.full(size, -1, dtype="int32")
+            lookup[products.index.to_numpy()] = categories.cat.codes.to_numpy()
+            frame["category"] = pd.Categorical.from_codes(lookup[sales["product_id"].to_numpy()],
+                                                          categories=categories.cat.categories)
+            self._frame = frame
+            return frame
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": self._rows,
+                "chunks": len(self._chunks),
+                "customers": len(self._emails),
+                "last_id": self.last_id,
+                "memory_bytes": int(sum(chunk.memory_usage().sum() for chunk in self._chunks)),
+                "refreshed_at": self.refreshed_at,
+                "last_refresh": dict(self.last_refresh),
+            }
+
+
+def _period_codes(dates, period):
+    # Map each timestamp to the index of its period. Periods are resolved
+    # once per calendar day in the range and looked up by day offset.
+    days = np.asarray(dates, dtype="datetime64[D]").astype("int64")
+    first = days.min()
+    calendar = np.arange(first, days.max() + 1).astype("datetime64[D]")
+    periods, day_codes = np.unique(period_start(calendar, period), return_inverse=True)
+    return day_codes[days - first], pd.DatetimeIndex(periods, name="period")
+
+
+def revenue_by_category(frame, period="month"):
+    """
+    Revenue per period (rows, every period in range) and category (columns)
+    """
+    if frame.empty:
+        return pd.DataFrame()
+    codes, periods = _period_codes(frame["sale_date"], period)
+    categories = frame["category"].cat.categories
+    category_codes = frame["category"].cat.codes.to_numpy()
+    known = category_codes >= 0
+    cells = codes[known] * len(categories) + category_codes[known]
+    size = len(periods) * len(categories)
+    revenue = np.bincount(cells, weights=frame["total_price"].to_numpy()[known], minlength=size)
+    sold = np.bincount(cells, minlength=size).reshape(len(periods), -1).sum(axis=0) > 0
+    return pd.DataFrame(revenue.reshape(len(periods), -1)[:, sold], index=periods,
+                        columns=pd.Index(categories[sold], name="category"))
+
+
+def moving_average(frame, window=7, period="day"):
+    """
+    Revenue per period, including periods without sales, with a trailing
+    moving average over `window` periods
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=["revenue", "moving_average"])
+    codes, periods = _period_codes(frame["sale_date"], period)
+    revenue = pd.Series(np.bincount(codes, weights=frame["total_price"].to_numpy(), minlength=len(periods)),
+                        index=periods)
+    return pd.DataFrame({
+        "revenue": revenue,
+        "moving_average": revenue.rolling(window, min_periods=1).mean(),
+    })
+
+
+def cohort_retention(frame):
+    """
+    Share of each first-purchase month's customers who bought again N months
+    later; rows are cohorts, columns are months since the first purchase
+    """
+    customers = frame["customer_email"].cat.codes.to_numpy()
+    known = customers >= 0
+    if not known.any():
+        return pd.DataFrame()
+    months, index = _period_codes(frame["sale_date"], "month")
+    customers, months = customers[known].astype("int64"), months[known]
+    n_customers, n_months = len(frame["customer_email"].cat.categories), len(index)
+
+    if n_customers * n_months <= PRESENCE_LIMIT:
+        # Customer x month presence matrix: deduplicates and orders in one pass
+        active = np.zeros((n_customers, n_months), dtype=bool)
+        active[customers, months] = True
+        customers, months = np.nonzero(active)
+        first = active.argmax(axis=1)
+    else:
+        pairs = pd.unique(customers * n_months + months)
+        customers, months = pairs // n_months, pairs % n_months
+        first = np.full(n_customers, n_months)
+        np.minimum.at(first, customers, months)
+
+    cohorts = first[customers]
+    counts = np.bincount(cohorts * n_months + (months - cohorts),
+                         minlength=n_months * n_months).reshape(n_months, n_months)
+    rows = counts[:, 0] > 0
+    ages = np.flatnonzero(counts.any(axis=0)).max() + 1
+    counts = counts[rows, :ages]
+    retention = pd.DataFrame(counts / counts[:, :1], columns=pd.RangeIndex(ages, name="age"),
+                             index=index[rows].to_period("M").rename("cohort"))
+    retention.insert(0, "customers", counts[:, 0])
+    return retention
+
+
+def product_velocity(frame, products, days=30, end=None):
+    """
+    Units and revenue per day for each product over the trailing `days`
+    days, with days of stock cover at that rate
+    """
+    end = frame["sale_date"].max() if end is None else pd.Timestamp(end)
+    if pd.isna(end):
+        return pd.DataFrame()
+    recent = frame[frame["sale_date"] > end - pd.Timedelta(days=days)]
+    velocity = recent.groupby("product_id").agg(
+        units=("quantity", "sum"),
+        revenue=("total_price", "sum"),
+        orders=("sale_id", "size"),
+    )
+    velocity["units_per_day"] = velocity["units"] / days
+    velocity = velocity.join(products[["name", "category", "stock_quantity"]], how="left")
+    velocity["days_of_cover"] = velocity["stock_quantity"] / velocity["units_per_day"].replace(0, np.nan)
+    return velocity.sort_values("units_per_day", ascending=False)
+
+
+_extract = None
+_extract_lock = threading.Lock()
+
+
+def get_extract():
+    global _extract
+    if _extract is None:
+        with _extract_lock:
+            if _extract is None:
+                _extract = SalesExtract()
+    return _extract
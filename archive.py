@@ -0,0 +1,307 @@
+import argparse
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import cache
+import db
+import inventory
+import metrics
+
+# Archive settings (overridable through the environment)
+ARCHIVE_DIR = os.environ.get("CRM_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "archive"))
+# Closed months kept in the hot file besides the current one
+KEEP_MONTHS = int(os.environ.get("CRM_ARCHIVE_KEEP_MONTHS", "3"))
+
+# Partitioned tables and their date column
+TABLES = {
+    "sales": "sale_date",
+    "inventory_log": "log_date",
+}
+
+# SQLite's compile-time limit is 10 attached databases; leave room for callers
+MAX_ATTACHED = 8
+
+
+def create_archive_catalog(c):
+    """
+    Partition catalog, and the maintenance flag that stops the sales rollup
+    triggers subtracting rows the rollover moves to an archive file
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS archive_partitions (
+        month TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        sales_rows INTEGER NOT NULL DEFAULT 0,
+        inventory_log_rows INTEGER NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS maintenance (
+        name TEXT PRIMARY KEY
+    )
+    ''')
+    c.execute("DROP TRIGGER IF EXISTS sales_rollup_ad")
+    c.execute(f'''
+    CREATE TRIGGER sales_rollup_ad AFTER DELETE ON sales
+    WHEN NOT EXISTS (SELECT 1 FROM maintenance WHERE name = 'archiving')
+    BEGIN {metrics.REMOVE_SALE} END
+    ''')
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bounds(month):
+    # [start, end) of a 'YYYY-MM' month as timestamps comparable with the date columns
+    start = date.fromisoformat(f"{month}-01")
+    return f"{start} 00:00:00", f"{_add_months(start, 1)} 00:00:00"
+
+
+def _alias(month):
+    return "archive_" + month.replace("-", "_")
+
+
+def partitions(conn, start=None, end=None):
+    """
+    Archived months, oldest first, optionally only those overlapping
+    [start, end]; each with its file size
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archive_partitions'").fetchone() is None:
+        return []
+    rows = conn.execute('''
+    SELECT month, path, sales_rows, inventory_log_rows, archived_at
+    FROM archive_partitions
+    WHERE (? IS NULL OR month >= substr(?, 1, 7)) AND (? IS NULL OR month <= substr(?, 1, 7))
+    ORDER BY month
+    ''', (start, start, end, end)).fetchall()
+    keys = ("month", "path", "sales_rows", "inventory_log_rows", "archived_at")
+    result = []
+    for row in rows:
+        partition = dict(zip(keys, row))
+        partition["bytes"] = os.path.getsize(partition["path"]) if os.path.exists(partition["path"]) else None
+        result.append(partition)
+    return result
+
+
+def archived_until(conn):
+    """
+    Start of the first month after the newest archived one, or None when
+    nothing has been archived. Rows dated before it may live in archives.
+    """
+    newest = partitions(conn)
+    if not newest:
+        return None
+    return _bounds(newest[-1]["month"])[1]
+
+
+@contextmanager
+def attached(conn, months):
+    """
+    Attach the archive files of the given partitions; yields their aliases
+    """
+    aliases = []
+    try:
+        for partition in months:
+            alias = _alias(partition["month"])
+            conn.execute("ATTACH DATABASE ? AS " + alias, (partition["path"],))
+            aliases.append(alias)
+        yield aliases
+    finally:
+        for alias in aliases:
+            conn.execute("DETACH DATABASE " + alias)
+
+
+@contextmanager
+def history(conn, start=None, end=None):
+    """
+    Temporary views sales_history and inventory_log_history: the hot tables
+    UNION ALL the archives overlapping [start, end], which are the only
+    ones attached. Filter the views on the same range so SQLite pushes the
+    date predicate into every branch and uses each file's date index.
+    """
+    months = partitions(conn, start, end)
+    if len(months) > MAX_ATTACHED:
+        raise ValueError(f"The range spans {len(months)} archived months; at most {MAX_ATTACHED} can be "
+                         "queried together")
+    with attached(conn, months) as aliases:
+        try:
+            for table in TABLES:
+                columns = ", ".join(_columns(conn, "main", table))
+                branches = [f"SELECT {columns} FROM main.{table}"]
+                branches += [f"SELECT {columns} FROM {alias}.{table}" for alias in aliases]
+                conn.execute(f"CREATE TEMP VIEW {table}_history AS " + " UNION ALL ".join(branches))
+            yield aliases
+        finally:
+            for table in TABLES:
+                conn.execute(f"DROP VIEW IF EXISTS temp.{table}_history")
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _prepare_archive(conn, alias):
+    # Same table definitions as the hot file, plus the date indexes; columns
+    # added to the hot tables since the file was created are added here too
+    for table, date_column in TABLES.items():
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                           (table,)).fetchone()[0]
+        conn.execute(re.sub(r"^CREATE TABLE\s+\"?\w+\"?", f"CREATE TABLE IF NOT EXISTS {alias}.{table}", sql))
+        existing = set(_columns(conn, alias, table))
+        for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+            if row[1] not in existing:
+                conn.execute(f"ALTER TABLE {alias}.{table} ADD COLUMN {row[1]} {row[2]}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_{table}_{date_column} ON {table} ({date_column})")
+
+
+def closed_months(conn, keep_months=KEEP_MONTHS, today=None):
+    """
+    'YYYY-MM' months with hot rows older than the retention window that
+    have not been archived yet, oldest first
+    """
+    cutoff = f"{_add_months(_month_start(today or date.today()), -keep_months)} 00:00:00"
+    months = set()
+    for table, date_column in TABLES.items():
+        months.update(row[0] for row in conn.execute(
+            f"SELECT DISTINCT substr({date_column}, 1, 7) FROM {table} WHERE {date_column} < ?", (cutoff,)))
+    archived = {partition["month"] for partition in partitions(conn)}
+    return sorted(month for month in months if month and month not in archived)
+
+
+def _snapshot_at(conn, timestamp):
+    if conn.execute("SELECT 1 FROM inventory_snapshots WHERE as_of = ?", (timestamp,)).fetchone() is None:
+        inventory.snapshot(conn, datetime.fromisoformat(timestamp))
+
+
+def _check_no_transaction(conn):
+    # Committing here would also commit whatever the caller has pending
+    if conn.in_transaction:
+        raise RuntimeError("Archiving commits its own transactions; commit or roll back the open one first")
+
+
+def archive_month(conn, month, archive_dir=ARCHIVE_DIR):
+    """
+    Move one month of sales and inventory_log rows into its archive file.
+
+    Rows are copied (INSERT OR IGNORE, so a rerun after a crash is safe) and
+    committed to the archive first, then deleted from the hot file in a
+    second transaction, under the maintenance flag so the rollups keep
+    counting them. Inventory snapshots at both month boundaries are taken
+    first, so as-of queries never need more than one archive. Rows added
+    later with dates in the month stay in the hot file. The steps commit on
+    their own, so `conn` must not be in a transaction.
+    """
+    _check_no_transaction(conn)
+    start, end = _bounds(month)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.abspath(os.path.join(archive_dir, f"crm_{month.replace('-', '_')}.db"))
+    alias = _alias(month)
+
+    _snapshot_at(conn, start)
+    _snapshot_at(conn, end)
+
+    counts = {}
+    with attached(conn, [{"month": month, "path": path}]):
+        _prepare_archive(conn, alias)
+        conn.commit()
+
+        conn.execute("BEGIN")
+        try:
+            for table, date_column in TABLES.items():
+                columns = ", ".join(_columns(conn, "main", table))
+                # The highest id always stays hot: the tables have no
+                # AUTOINCREMENT, so SQLite would hand out archived ids again
+                conn.execute(f'''
+                INSERT OR IGNORE INTO {alias}.{table} ({columns})
+                SELECT {columns} FROM main.{table}
+                WHERE {date_column} >= ? AND {date_column} < ?
+                  AND id < (SELECT MAX(id) FROM main.{table})
+                ''', (start, end))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO maintenance (name) VALUES ('archiving')")
+            for table, date_column in TABLES.items():
+                conn.execute(f'''
+                DELETE FROM main.{table}
+                WHERE {date_column} >= ? AND {date_column} < ? AND id IN (SELECT id FROM {alias}.{table})
+                ''', (start, end))
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM {alias}.{table}").fetchone()[0]
+            conn.execute("DELETE FROM maintenance WHERE name = 'archiving'")
+            conn.execute('''
+            INSERT OR REPLACE INTO archive_partitions (month, path, sales_rows, inventory_log_rows)
+            VALUES (?, ?, ?, ?)
+            ''', (month, path, counts["sales"], counts["inventory_log"]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    cache.invalidate("archive_partitions", "table_stats")
+    return {"month": month, "path": path, **{f"{table}_rows": count for table, count in counts.items()}}
+
+
+def rollover(conn=None, keep_months=KEEP_MONTHS, today=None, archive_dir=ARCHIVE_DIR, vacuum=False):
+    """
+    Archive every closed month outside the retention window, oldest first.
+    Returns one summary per archived month. Like archive_month, needs a
+    connection outside any transaction.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return rollover(conn, keep_months, today, archive_dir, vacuum)
+
+    _check_no_transaction(conn)
+    # Log rows still waiting for the ledger must be applied before they move
+    inventory.replay(conn)
+    archived = [archive_month(conn, month, archive_dir) for month in closed_months(conn, keep_months, today)]
+    if archived and vacuum:
+        conn.execute("VACUUM")
+    return archived
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move closed months of sales and inventory_log to archive files")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    parser.add_argument("--archive-dir", help="where archive files go (default: archive/ next to the database)")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS,
+                        help="closed months kept in the hot file (default: %(default)s)")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the hot file afterwards")
+    parser.add_argument("--list", action="store_true", help="only list the archived partitions")
+    args = parser.parse_args(argv)
+    archive_dir = args.archive_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "archive")
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            if not args.list:
+                started = time.perf_counter()
+                for summary in rollover(conn, args.keep_months, archive_dir=archive_dir, vacuum=args.vacuum):
+                    print(f"Archived {summary['month']}: {summary['sales_rows']:,} sales, "
+                          f"{summary['inventory_log_rows']:,} inventory_log rows -> {summary['path']}")
+                print(f"Rollover finished in {time.perf_counter() - started:.1f}s")
+            for partition in partitions(conn):
+                size = "missing" if partition["bytes"] is None else f"{partition['bytes'] / 2 ** 20:,.1f} MiB"
+                print(f"{partition['month']}  {partition['sales_rows']:>10,} sales  "
+                      f"{partition['inventory_log_rows']:>10,} inventory_log  {size}  {partition['path']}")
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+import db
+
+# scrypt cost parameters (overridable through the environment)
+SCRYPT_N = int(os.environ.get("CRM_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("CRM_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("CRM_SCRYPT_P", "1"))
+SALT_BYTES = 16
+
+# Signed session tokens
+SESSION_TTL = int(os.environ.get("CRM_SESSION_TTL", str(12 * 3600)))
+SESSION_KEY_FILE = os.environ.get("CRM_SESSION_KEY_FILE", ".session_key")
+VERIFIED_CACHE_SIZE = 4096
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    """
+    Salted scrypt hash encoded as scrypt$n$r$p$salt$hash
+    """
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def _is_legacy(stored):
+    # Unsalted SHA-256 hex digests from before scrypt
+    return len(stored) == 64 and all(ch in "0123456789abcdef" for ch in stored)
+
+
+def check_password(password, stored):
+    if _is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        scheme, n, r, p, salt, digest = stored.split("$")
+        if scheme != "scrypt":
+            return False
+        computed = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+        expected = _unb64(digest)
+    except ValueError:
+        return False
+    return hmac.compare_digest(computed, expected)
+
+
+def needs_rehash(stored):
+    if _is_legacy(stored):
+        return True
+    try:
+        scheme, n, r, p, _, _ = stored.split("$")
+    except ValueError:
+        return True
+    return scheme != "scrypt" or (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+def authenticate(username, password, conn=None):
+    """
+    Check a login with one lookup on the unique username index. Returns
+    {"id", "username", "role"} or None. Legacy or outdated hashes are
+    upgraded in place on success.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return authenticate(username, password, conn)
+
+    row = conn.execute("SELECT id, password, role FROM users WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        # Spend the same work as a real check so timing doesn't reveal usernames
+        check_password(password, _dummy_hash())
+        return None
+    user_id, stored, role = row
+    if not check_password(password, stored):
+        return None
+    if needs_rehash(stored):
+        conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                     (hash_password(password), user_id, stored))
+    return {"id": user_id, "username": username, "role": role}
+
+
+_dummy = None
+
+
+def _dummy_hash():
+    global _dummy
+    if _dummy is None:
+        _dummy = hash_password(secrets.token_hex(8))
+    return _dummy
+
+
+# Session tokens
+
+_key = None
+_key_lock = threading.Lock()
+
+
+def _session_key():
+    global _key
+    if _key is None:
+        with _key_lock:
+            if _key is None:
+                secret = os.environ.get("CRM_SESSION_SECRET")
+                if secret:
+                    _key = secret.encode()
+                elif os.path.exists(SESSION_KEY_FILE):
+                    with open(SESSION_KEY_FILE, "rb") as f:
+                        _key = f.read().strip()
+                else:
+                    key = secrets.token_hex(32).encode()
+                    # Write the key in full under a temporary name, then link it
+                    # into place, so no process can read a partly written file
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(SESSION_KEY_FILE)))
+                    try:
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(key)
+                        os.link(tmp_path, SESSION_KEY_FILE)
+                    except FileExistsError:
+                        # Another process created it first
+                        with open(SESSION_KEY_FILE, "rb") as f:
+                            key = f.read().strip()
+                    finally:
+                        os.unlink(tmp_path)
+                    _key = key
+    return _key
+
+
+def _sign(payload):
+    return _b64(hmac.new(_session_key(), payload.encode(), hashlib.sha256).digest())
+
+
+def create_revocation_table(c):
+    """
+    Nonces of tokens revoked before they expire, shared by every process;
+    rows are purged once their token would have expired anyway
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS session_revocations (
+        nonce TEXT PRIMARY KEY,
+        expires INTEGER NOT NULL
+    )
+    ''')
+
+
+_verified = {}
+_cache_lock = threading.Lock()
+
+
+def issue_token(user, ttl=SESSION_TTL):
+    """
+    Signed, expiring token carrying the user id and name and a random nonce
+    """
+    expires = int(time.time()) + ttl
+    claims = [user["id"], user["username"], user["role"], expires, secrets.token_hex(8)]
+    payload = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def _claims(token):
+    # (user_id, nonce, expires) of a correctly signed token; cached so
+    # reruns skip the signature check
+    with _cache_lock:
+        cached = _verified.get(token)
+    if cached is not None:
+        return cached
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        user_id, _, _, expires, nonce = json.loads(_unb64(payload))
+        claims = (int(user_id), str(nonce), int(expires))
+    except (ValueError, TypeError):
+        return None
+    with _cache_lock:
+        if len(_verified) >= VERIFIED_CACHE_SIZE:
+            _verified.clear()
+        _verified[token] = claims
+    return claims
+
+
+def verify_token(token, conn=None):
+    """
+    Return the user for a valid, unexpired, unrevoked token, else None. The
+    name and role are read from users, so a demotion applies at once.
+    """
+    if not token:
+        return None
+    claims = _claims(token)
+    if claims is None or claims[2] <= time.time():
+        return None
+    if conn is None:
+        with db.connection() as conn:
+            return verify_token(token, conn)
+
+    user_id, nonce, _ = claims
+    row = conn.execute('''
+    SELECT username, role FROM users
+    WHERE id = ? AND NOT EXISTS (SELECT 1 FROM session_revocations WHERE nonce = ?)
+    ''', (user_id, nonce)).fetchone()
+    if row is None:
+        return None
+    return {"id": user_id, "username": row[0], "role": row[1]}
+
+
+def revoke_token(token, conn=None):
+    """
+    Revoke a token in every process until it expires
+    """
+    claims = _claims(token) if token else None
+    if claims is None:
+        return
+    if conn is None:
+        with db.connection() as conn:
+            return revoke_token(token, conn)
+
+    _, nonce, expires = claims
+    now = int(time.time())
+    conn.execute("DELETE FROM session_revocations WHERE expires <= ?", (now,))
+    if expires > now:
+        conn.execute("INSERT OR IGNORE INTO session_revocations (nonce, expires) VALUES (?, ?)", (nonce, expires))
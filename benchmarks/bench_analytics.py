@@ -0,0 +1,84 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import analytics
+import db
+import migrations
+from benchmarks import datagen
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the sales extract and analytics over a large sales table")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="sales rows to generate")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--increment", type=int, default=10_000, help="sales added before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    pool = db.ConnectionPool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            existing = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+            if existing < args.rows:
+                print(f"Generating {args.rows - existing:,} sales in {path} ...")
+                started = time.perf_counter()
+                datagen.generate(conn, products=args.products, sales=args.rows - existing,
+                                 customers=args.customers, start="2023-01-01", days=730)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+
+            extract = analytics.SalesExtract()
+            started = time.perf_counter()
+            extract.refresh(conn)
+            full_load = time.perf_counter() - started
+            stats = extract.stats()
+            print(f"Full extract: {stats['rows']:,} rows in {full_load:.2f}s "
+                  f"({stats['rows'] / full_load:,.0f} rows/s), {stats['memory_bytes'] / 2 ** 20:,.0f} MiB")
+
+            datagen.generate(conn, products=0, sales=args.increment, customers=args.customers,
+                             start="2025-01-01", days=30, seed=7)
+            started = time.perf_counter()
+            read = extract.refresh(conn)
+            print(f"Incremental refresh: {read:,} new rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+            started = time.perf_counter()
+            extract.refresh(conn)
+            print(f"No-op refresh: {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        pool.close()
+
+    started = time.perf_counter()
+    frame = extract.frame()
+    print(f"Build frame: {(time.perf_counter() - started) * 1000:.1f} ms")
+    products = extract.products
+    cases = [
+        ("revenue by category / month", lambda: analytics.revenue_by_category(frame, "month")),
+        ("revenue by category / week", lambda: analytics.revenue_by_category(frame, "week")),
+        ("7-day moving average", lambda: analytics.moving_average(frame, 7)),
+        ("cohort retention", lambda: analytics.cohort_retention(frame)),
+        ("product velocity (30 days)", lambda: analytics.product_velocity(frame, products, 30)),
+    ]
+    print()
+    print(f"{'computation':<30} {'median (ms)':>12}")
+    for name, func in cases:
+        print(f"{name:<30} {timed(func, args.repeat) * 1000:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
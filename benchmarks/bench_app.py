@@ -0,0 +1,279 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import datagen, results
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Pages driven through AppTest, as stored in st.session_state.page
+PAGES = ["dashboard", "analytics", "products", "feedback", "database", "customers", "record_sales",
+         "import", "inventory", "performance"]
+
+
+def configure(path, workdir, profile=False):
+    """
+    Point the app at the benchmark database. db, feedback_queue, replica and
+    profiler read their settings when first imported, so this runs before
+    them.
+    """
+    os.environ["CRM_DB_PATH"] = path
+    os.environ["CRM_PROFILE"] = "1" if profile else "0"
+    os.environ.setdefault("CRM_FEEDBACK_SPILL_FILE", os.path.join(workdir, "feedback_spill.jsonl"))
+    os.environ.setdefault("CRM_SNAPSHOT_PATH", os.path.join(workdir, "crm_snapshot.db"))
+
+
+def prepare(path, products, sales, feedback, inventory, customers, skew, seed=42):
+    """
+    Migrate the database and top it up to the requested number of sales
+    """
+    import db
+    import migrations
+
+    pool = db.ConnectionPool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            existing = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+            if existing < sales:
+                print(f"Generating {sales - existing:,} sales, {feedback:,} feedback and "
+                      f"{inventory:,} inventory rows in {path} ...")
+                started = time.perf_counter()
+                datagen.generate(conn, products=products, sales=sales - existing, feedback=feedback,
+                                 inventory=inventory, customers=customers, skew=skew, seed=seed)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+            conn.execute("ANALYZE")
+    finally:
+        pool.close()
+
+
+def _import_data():
+    # The data functions live in views.data, importable without running the
+    # app script; widgets they draw are no-ops in bare mode
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    from views import data
+    return data
+
+
+def function_cases(data):
+    """
+    (name, callable, cached) for each data function in views/data.py
+    """
+    import db
+
+    with db.connection() as conn:
+        product_id, category = conn.execute(
+            "SELECT id, category FROM products ORDER BY id DESC LIMIT 1").fetchone()
+        email = conn.execute("SELECT email FROM customers ORDER BY lifetime_value DESC LIMIT 1").fetchone()[0]
+    return [
+        ("verify_password", lambda: data.verify_password("admin", "password"), False),
+        ("username_exists", lambda: data.username_exists("admin"), False),
+        ("get_products", lambda: data.get_products(), True),
+        ("get_products_search", lambda: data.get_products("product"), True),
+        ("get_products_category", lambda: data.get_products(category=category), True),
+        ("get_products_page", lambda: data.get_products(after_id=0, limit=24), True),
+        ("count_products", lambda: data.count_products("product", category), True),
+        ("get_product_categories", lambda: data.get_product_categories(), True),
+        ("get_product_by_id", lambda: data.get_product_by_id(product_id), True),
+        ("get_recent_products", lambda: data.get_recent_products(5), True),
+        ("get_dashboard_metrics", lambda: data.get_dashboard_metrics(), True),
+        ("get_top_products", lambda: data.get_top_products(5), True),
+        ("submit_feedback", lambda: data.submit_feedback("Bench", "bench@example.com", product_id, 4,
+                                                         "Benchmark feedback"), False),
+        ("get_tables", lambda: data.get_tables(), False),
+        ("get_table_info", lambda: data.get_table_info("sales"), True),
+        ("execute_query", lambda: data.execute_query("SELECT COUNT(*) FROM sales"), False),
+        ("get_inventory_reconciliation", lambda: data.get_inventory_reconciliation(), False),
+        ("get_low_stock_alerts", lambda: data.get_low_stock_alerts(), False),
+        ("get_stock_as_of", lambda: data.get_stock_as_of("2024-06-30"), True),
+        ("get_product_sentiment", lambda: data.get_product_sentiment(5), True),
+        ("get_topic_breakdown", lambda: data.get_topic_breakdown(), True),
+        ("count_unscored_feedback", lambda: data.count_unscored_feedback(), False),
+        ("get_also_bought", lambda: data.get_also_bought((product_id,)), True),
+        ("search_customers", lambda: data.search_customers(email[:8]), False),
+        ("get_top_customers", lambda: data.get_top_customers(), False),
+        ("get_customer", lambda: data.get_customer(email), False),
+    ]
+
+
+def bench_functions(repeat):
+    """
+    Time every data function; cached ones are timed cold (cache cleared
+    before each call) and warm
+    """
+    import cache
+
+    data = _import_data()
+    timings = {}
+    for name, func, cached in function_cases(data):
+        variants = [("cold", True), ("warm", False)] if cached else [(None, False)]
+        for variant, clear in variants:
+            func()
+            samples = []
+            for _ in range(repeat):
+                if clear:
+                    cache.clear()
+                started = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - started)
+            key = f"function/{name}" + (f"[{variant}]" if variant else "")
+            timings[key] = results.summarize(samples)
+    return timings
+
+
+def _session(timeout):
+    from streamlit.testing.v1 import AppTest
+
+    import auth
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state.session_token = auth.issue_token({"id": 1, "username": "admin", "role": "admin"})
+    at.session_state.logged_in = True
+    at.session_state.username = "admin"
+    at.session_state.role = "admin"
+    at.session_state.page = "dashboard"
+    return at
+
+
+def _page_worker(iterations, timeout, trace_memory, ready):
+    # One session per process: AppTest sessions in one process share
+    # Streamlit's script context and can't run concurrently
+    at = _session(timeout)
+    # First rerun loads modules and caches; not timed
+    at.run()
+    ready.wait()
+    if trace_memory:
+        tracemalloc.start()
+    samples = {page: [] for page in PAGES}
+    errors = []
+    for _ in range(iterations):
+        for page in PAGES:
+            at.session_state.page = page
+            started = time.perf_counter()
+            try:
+                at.run()
+            except Exception as e:
+                errors.append(f"{page}: {e}")
+                continue
+            samples[page].append(time.perf_counter() - started)
+            errors.extend(f"{page}: {ex.message}" for ex in at.exception)
+    python_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    # ru_maxrss is in KiB on Linux
+    return samples, errors, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, python_peak
+
+
+def bench_pages(concurrency, iterations, timeout=120, trace_memory=False):
+    """
+    Drive every page headlessly with AppTest from `level` concurrent
+    sessions (one worker process each) per concurrency level, all on the
+    same database. Reports per-page rerun latency, overall throughput and
+    per-session memory peaks (RSS, and the Python heap with trace_memory).
+    """
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    timings = {}
+    for level in concurrency:
+        # Every session finishes its warm-up rerun before any is timed
+        ready = manager.Barrier(level + 1)
+        with context.Pool(level) as pool:
+            pending = [pool.apply_async(_page_worker, (iterations, timeout, trace_memory, ready))
+                       for _ in range(level)]
+            ready.wait()
+            started = time.perf_counter()
+            outcomes = [result.get() for result in pending]
+            wall = time.perf_counter() - started
+
+        samples = {page: [] for page in PAGES}
+        errors = []
+        for page_samples, worker_errors, _, _ in outcomes:
+            for page, values in page_samples.items():
+                samples[page].extend(values)
+            errors.extend(worker_errors)
+        everything = [sample for page_samples in samples.values() for sample in page_samples]
+        for page, page_samples in samples.items():
+            timings[f"page/c{level}/{page}"] = results.summarize(page_samples)
+        timings[f"page/c{level}/all"] = dict(results.summarize(everything),
+                                             reruns_per_sec=len(everything) / wall if wall else 0.0,
+                                             errors=len(errors))
+        python_peaks = [outcome[3] for outcome in outcomes if outcome[3] is not None]
+        timings[f"memory/c{level}"] = {
+            "rss_peak_mb": max(outcome[2] for outcome in outcomes) / 2 ** 20,
+            "python_peak_mb": max(python_peaks) / 2 ** 20 if python_peaks else None,
+        }
+        if errors:
+            print(f"  {len(errors)} page errors at concurrency {level}, first: {errors[0]}")
+    manager.shutdown()
+    return timings
+
+
+def _print(timings):
+    width = max(len(name) for name in timings)
+    print(f"{'benchmark':<{width}} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, summary in timings.items():
+        if "p50_ms" in summary:
+            print(f"{name:<{width}} {summary['count']:>5} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+                  f"{summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f}"
+                  + (f"  {summary['reruns_per_sec']:.1f} reruns/s" if "reruns_per_sec" in summary else ""))
+        elif "rss_peak_mb" in summary:
+            python_peak = summary["python_peak_mb"]
+            print(f"{name:<{width}} peak RSS per session {summary['rss_peak_mb']:,.0f} MiB"
+                  + (f", Python heap peak {python_peak:,.1f} MiB" if python_peak is not None else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's data functions and pages on synthetic data")
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=200_000)
+    parser.add_argument("--feedback", type=int, default=20_000)
+    parser.add_argument("--inventory", type=int, default=50_000)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for popularity (0 for uniform)")
+    parser.add_argument("--suite", choices=["all", "functions", "pages"], default="all")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per data function")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="concurrent page sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="passes over every page per session")
+    parser.add_argument("--trace-memory", action="store_true", help="also track the Python heap peak (slower)")
+    parser.add_argument("--profile", action="store_true", help="time SQL statements with the profiler (slower)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare with an earlier results file; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative p50 slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-")
+    path = os.path.abspath(args.db or os.path.join(workdir, "bench.db"))
+    configure(path, workdir, profile=args.profile)
+    prepare(path, args.products, args.sales, args.feedback, args.inventory, args.customers, args.skew)
+
+    timings = {}
+    if args.suite in ("all", "functions"):
+        timings.update(bench_functions(args.repeat))
+    if args.suite in ("all", "pages"):
+        timings.update(bench_pages(args.concurrency, args.iterations, trace_memory=args.trace_memory))
+    _print(timings)
+
+    params = {key: value for key, value in vars(args).items() if key not in ("db", "out", "baseline", "threshold")}
+    run = results.save(args.out, "app", params, timings) if args.out else {
+        "environment": results.environment(), "created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": timings}
+    if args.out:
+        print(f"Results written to {args.out}")
+    if args.baseline:
+        rows = results.compare(results.load(args.baseline), run, threshold=args.threshold)
+        regressions = [row for row in rows if row["regression"]]
+        for row in regressions:
+            print(f"REGRESSION {row['benchmark']}: p50 {row['baseline']:.2f} -> {row['current']:.2f} ms "
+                  f"({row['change']:+.1%})")
+        print(f"{len(regressions)} regressions over {args.threshold:.0%} in {len(rows)} benchmarks")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
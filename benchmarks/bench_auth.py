@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import auth
+import db
+import migrations
+
+
+def rate(func, seconds):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        func()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure login and session-token throughput")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each measurement")
+    parser.add_argument("--costs", default="13,14,15", help="comma-separated log2(N) scrypt costs to compare")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    pool = db.ConnectionPool(path, size=1)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+        conn.execute("UPDATE users SET password = ? WHERE username = 'admin'", (auth.hash_password("password"),))
+        conn.commit()
+
+        print(f"{'scrypt N':>10} {'hash ms':>9} {'logins/s':>10}")
+        for log_n in (int(cost) for cost in args.costs.split(",")):
+            n = 2 ** log_n
+            stored = auth.hash_password("password", n=n)
+            started = time.perf_counter()
+            auth.check_password("password", stored)
+            hash_ms = (time.perf_counter() - started) * 1000
+            per_sec = rate(lambda: auth.check_password("password", stored), args.seconds)
+            marker = "  <- configured" if n == auth.SCRYPT_N else ""
+            print(f"{'2^' + str(log_n):>10} {hash_ms:>9.1f} {per_sec:>10.1f}{marker}")
+
+        logins = rate(lambda: auth.authenticate("admin", "password", conn), args.seconds)
+        print(f"\nauthenticate() end to end at the configured cost: {logins:,.1f} logins/s")
+
+        user = {"id": 1, "username": "admin", "role": "admin"}
+        token = auth.issue_token(user)
+        issued = rate(lambda: auth.issue_token(user), args.seconds)
+        auth.verify_token(token, conn)
+        verified = rate(lambda: auth.verify_token(token, conn), args.seconds)
+        print(f"session tokens: {issued:,.0f} issued/s, {verified:,.0f} verifications/s "
+              "(signature cached, revocation and role read per call)")
+    pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
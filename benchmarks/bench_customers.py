@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import customers
+import db
+import migrations
+from benchmarks import datagen, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the customer index rebuild, its write overhead and lookups")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="sales rows to generate")
+    parser.add_argument("--feedback", type=int, default=100_000, help="feedback rows to generate")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--increment", type=int, default=50_000, help="sales inserted to time the triggers")
+    parser.add_argument("--repeat", type=int, default=1000, help="lookups to time")
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    timings = {}
+    pool = db.ConnectionPool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            existing = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+            if existing < args.rows:
+                print(f"Generating {args.rows - existing:,} sales in {path} ...")
+                started = time.perf_counter()
+                datagen.generate(conn, products=args.products, sales=args.rows - existing, feedback=args.feedback,
+                                 customers=args.customers, skew=1.1)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            customers.rebuild_customers(conn)
+            conn.commit()
+            count = conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+            timings["rebuild"] = dict(results.summarize([time.perf_counter() - started]), customers=count)
+            print(f"Rebuild: {count:,} customers in {timings['rebuild']['p50_ms'] / 1000:.2f}s")
+
+            # Inserts pay for the expression index and the upsert per row
+            started = time.perf_counter()
+            datagen.generate(conn, products=0, sales=args.increment, customers=args.customers, skew=1.1,
+                             start="2025-01-01", days=30, seed=7)
+            elapsed = time.perf_counter() - started
+            timings["insert"] = dict(results.summarize([elapsed]), rows=args.increment,
+                                     rows_per_second=args.increment / elapsed)
+            print(f"Inserted {args.increment:,} sales at {timings['insert']['rows_per_second']:,.0f} rows/s")
+
+            # Totals kept by the triggers must match a rebuild from the rows
+            kept = conn.execute("SELECT email, orders, units, round(lifetime_value, 2) FROM customers "
+                                "ORDER BY email").fetchall()
+            conn.execute("BEGIN IMMEDIATE")
+            customers.rebuild_customers(conn)
+            conn.commit()
+            rebuilt = conn.execute("SELECT email, orders, units, round(lifetime_value, 2) FROM customers "
+                                   "ORDER BY email").fetchall()
+            if kept != rebuilt:
+                print("Trigger-maintained totals differ from a rebuild")
+                return 1
+
+            email = conn.execute("SELECT email FROM customers ORDER BY orders DESC LIMIT 1").fetchone()[0]
+            cases = [
+                ("lookup/customer", lambda: customers.customer(conn, email.upper())),
+                ("lookup/recent_orders", lambda: customers.recent_orders(conn, email)),
+                ("lookup/recent_feedback", lambda: customers.recent_feedback(conn, email)),
+                ("search/email", lambda: customers.search(conn, email[:-4])),
+                ("search/name_prefix", lambda: customers.search(conn, "Maria")),
+                ("search/one_letter", lambda: customers.search(conn, "m")),
+                ("top_customers", lambda: customers.top_customers(conn)),
+            ]
+            for name, func in cases:
+                func()
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    func()
+                    samples.append(time.perf_counter() - started)
+                timings[name] = results.summarize(samples)
+                print(f"{name:<24} p50 {timings[name]['p50_ms']:8.3f} ms  p99 {timings[name]['p99_ms']:8.3f} ms")
+    finally:
+        pool.close()
+
+    if args.out:
+        params = {key: value for key, value in vars(args).items() if key not in ("db", "out")}
+        results.save(args.out, "customers", params, timings)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
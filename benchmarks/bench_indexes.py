@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+import migrations
+import query_audit
+from benchmarks import datagen
+
+# Report-style queries from query_audit that touch the large tables
+BENCH_QUERIES = [
+    "sales for product",
+    "sales in date range",
+    "product sales in date range",
+    "feedback for product",
+    "inventory for product",
+    "inventory in date range",
+]
+
+
+def bench_params(conn, name, params):
+    # Point the audit's sample parameters at a generated product and a one-week window
+    product_id = conn.execute("SELECT MAX(id) FROM products").fetchone()[0] // 2
+    week = ("2025-03-01", "2025-03-08")
+    if "date range" in name and "product" in name:
+        return (product_id,) + week
+    if "date range" in name:
+        return week
+    return (product_id,)
+
+
+def time_queries(conn, repeat):
+    timings = {}
+    for name in BENCH_QUERIES:
+        sql, params = query_audit.APP_QUERIES[name]
+        params = bench_params(conn, name, params)
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append(time.perf_counter() - started)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare report query times with and without the managed indexes")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="sales and inventory_log rows to generate")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    pool = db.ConnectionPool(path, size=1)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+        migrations.drop_indexes(conn)
+        print(f"Generating {args.rows:,} sales and inventory rows in {path} ...")
+        started = time.perf_counter()
+        datagen.generate(conn, products=args.products, sales=args.rows, feedback=args.rows // 10,
+                         inventory=args.rows, start="2024-01-01", days=730)
+        print(f"  done in {time.perf_counter() - started:.1f}s")
+
+        before = time_queries(conn, args.repeat)
+        started = time.perf_counter()
+        migrations.ensure_indexes(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+        print(f"Built managed indexes in {time.perf_counter() - started:.1f}s")
+        after = time_queries(conn, args.repeat)
+
+        print()
+        print(f"{'query':<30} {'no index (ms)':>14} {'indexed (ms)':>14} {'speedup':>9}")
+        for name in BENCH_QUERIES:
+            speedup = before[name] / after[name] if after[name] else float("inf")
+            print(f"{name:<30} {before[name] * 1000:>14.2f} {after[name] * 1000:>14.2f} {speedup:>8.1f}x")
+
+        print()
+        for result in query_audit.audit(conn):
+            if result["full_scans"]:
+                print(f"full scan remaining: {result['query']}: {'; '.join(result['full_scans'])}")
+    pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
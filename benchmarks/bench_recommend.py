@@ -0,0 +1,92 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import db
+import migrations
+import recommend
+from benchmarks import datagen, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the co-purchase recommendation build, updates and lookups")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="sales rows to generate")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--increment", type=int, default=10_000, help="sales added before the incremental update")
+    parser.add_argument("--repeat", type=int, default=1000, help="neighbor lookups to time")
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    timings = {}
+    pool = db.ConnectionPool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            existing = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+            if existing < args.rows:
+                print(f"Generating {args.rows - existing:,} sales in {path} ...")
+                started = time.perf_counter()
+                datagen.generate(conn, products=args.products, sales=args.rows - existing, customers=args.customers,
+                                 skew=1.1)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            pairs, lists = recommend.refresh(conn, full=True)
+            timings["full"] = dict(results.summarize([time.perf_counter() - started]), pairs=pairs, lists=lists)
+            print(f"Full build: {pairs:,} customer/product pairs, {lists:,} neighbor lists in "
+                  f"{timings['full']['p50_ms'] / 1000:.2f}s")
+
+            datagen.generate(conn, products=0, sales=args.increment, customers=args.customers, skew=1.1,
+                             start="2025-01-01", days=30, seed=7)
+            recommend._interactions = None
+            started = time.perf_counter()
+            pairs, lists = recommend.refresh(conn)
+            timings["incremental/cold"] = dict(results.summarize([time.perf_counter() - started]), pairs=pairs,
+                                               lists=lists)
+            datagen.generate(conn, products=0, sales=args.increment, customers=args.customers, skew=1.1,
+                             start="2025-02-01", days=30, seed=8)
+            started = time.perf_counter()
+            pairs, lists = recommend.refresh(conn)
+            timings["incremental/warm"] = dict(results.summarize([time.perf_counter() - started]), pairs=pairs,
+                                               lists=lists)
+            for name in ("incremental/cold", "incremental/warm"):
+                print(f"{name}: {args.increment:,} new sales, {timings[name]['pairs']:,} new pairs, "
+                      f"{timings[name]['lists']:,} lists in {timings[name]['p50_ms']:.0f} ms")
+
+            started = time.perf_counter()
+            recommend.refresh(conn)
+            timings["noop"] = results.summarize([time.perf_counter() - started])
+
+            product_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT product_id FROM product_neighbors LIMIT 24")]
+            cases = [
+                ("lookup/one_product", lambda: recommend.neighbors(conn, product_ids[0], 5)),
+                ("lookup/page_of_24", lambda: recommend.neighbors_for(conn, product_ids, 3)),
+            ]
+            for name, func in cases:
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    func()
+                    samples.append(time.perf_counter() - started)
+                timings[name] = results.summarize(samples)
+            print(f"No-op update {timings['noop']['p50_ms']:.2f} ms; lookups p50: one product "
+                  f"{timings['lookup/one_product']['p50_ms']:.3f} ms, page of 24 "
+                  f"{timings['lookup/page_of_24']['p50_ms']:.3f} ms")
+    finally:
+        pool.close()
+
+    if args.out:
+        params = {key: value for key, value in vars(args).items() if key not in ("db", "out")}
+        results.save(args.out, "recommend", params, timings)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
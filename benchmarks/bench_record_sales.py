@@ -0,0 +1,97 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import db
+import migrations
+import sales
+from benchmarks import datagen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test record_sales() with concurrent writers")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=200, help="batches per writer")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    pool = db.ConnectionPool(path, size=args.writers)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+        datagen.generate(conn, products=args.products)
+        initial_stock = dict(conn.execute("SELECT id, stock_quantity FROM products"))
+        initial_logs = conn.execute("SELECT COUNT(*) FROM inventory_log").fetchone()[0]
+        first_sale = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+    product_ids = list(initial_stock)
+
+    latencies = []
+    outcomes = {}
+    errors = []
+    lock = threading.Lock()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for _ in range(args.batches):
+            batch = [
+                {"product_id": rng.choice(product_ids), "quantity": rng.randint(1, 5),
+                 "customer_name": f"Load {seed}", "customer_email": f"load{seed}@example.com"}
+                for _ in range(args.batch_size)
+            ]
+            started = time.perf_counter()
+            try:
+                with pool.connection() as conn:
+                    results = sales.record_sales(batch, conn)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                for result in results:
+                    outcomes[result["status"]] = outcomes.get(result["status"], 0) + 1
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(args.writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    # Invariants: no negative stock, and stock, sales and ledger agree
+    with pool.connection() as conn:
+        negative = conn.execute("SELECT COUNT(*) FROM products WHERE stock_quantity < 0").fetchone()[0]
+        sold = dict(conn.execute(
+            "SELECT product_id, SUM(quantity) FROM sales WHERE id > ? GROUP BY product_id", (first_sale,)))
+        stock = dict(conn.execute("SELECT id, stock_quantity FROM products"))
+        logs = conn.execute("SELECT COUNT(*) FROM inventory_log").fetchone()[0] - initial_logs
+    pool.close()
+    mismatched = [pid for pid in product_ids if initial_stock[pid] - sold.get(pid, 0) != stock[pid]]
+
+    latencies.sort()
+    total_lines = sum(outcomes.values())
+    print(f"writers={args.writers} batches={args.writers * args.batches} lines={total_lines} wall={wall:.2f}s")
+    print(f"throughput: {len(latencies) / wall:,.0f} batches/s, {total_lines / wall:,.0f} lines/s")
+    if latencies:
+        print(f"batch latency ms: p50={statistics.median(latencies) * 1000:.1f} "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} "
+              f"max={latencies[-1] * 1000:.1f}")
+    print(f"outcomes: {outcomes}")
+    print(f"errors: {len(errors)}{' (' + errors[0] + ')' if errors else ''}")
+    print(f"negative stock rows: {negative}, stock mismatches: {len(mismatched)}, "
+          f"ledger rows: {logs} (accepted lines: {outcomes.get(sales.OK, 0)})")
+    ok = not negative and not mismatched and not errors and logs == outcomes.get(sales.OK, 0)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import db
+import migrations
+import sentiment
+from benchmarks import datagen, results
+
+
+def _reset(conn):
+    # Forget every score so the next run starts from feedback.id 0
+    conn.execute("DELETE FROM feedback_sentiment")
+    conn.execute("DELETE FROM sentiment_summary")
+    conn.execute("DELETE FROM sentiment_pending")
+    conn.execute("UPDATE sentiment_state SET value = 0 WHERE name = 'last_feedback_id'")
+    conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time batched sentiment scoring over a large feedback table")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="feedback rows to generate")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[5000, 20000, 100000])
+    parser.add_argument("--increment", type=int, default=10_000, help="feedback added before the incremental run")
+    parser.add_argument("--sample", type=int, default=20_000, help="comments scored one at a time with nltk's VADER")
+    parser.add_argument("--repeat", type=int, default=20, help="reads of the per-product scores")
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    timings = {}
+    pool = db.ConnectionPool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            existing = conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+            if existing < args.rows:
+                print(f"Generating {args.rows - existing:,} feedback rows in {path} ...")
+                started = time.perf_counter()
+                datagen.generate(conn, products=args.products, sales=0, feedback=args.rows - existing,
+                                 inventory=0, skew=1.1)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+            rows = conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+            started = time.perf_counter()
+            scorer = sentiment.get_scorer()
+            timings["load"] = results.summarize([time.perf_counter() - started])
+            print(f"Lexicon and vectorizer loaded once in {timings['load']['p50_ms']:.0f} ms")
+
+            # The rule-based analyzer one comment at a time, for comparison
+            from nltk.sentiment.vader import SentimentIntensityAnalyzer
+            analyzer = SentimentIntensityAnalyzer()
+            comments = [row[0] for row in conn.execute("SELECT comments FROM feedback LIMIT ?", (args.sample,))]
+            started = time.perf_counter()
+            for comment in comments:
+                analyzer.polarity_scores(comment)
+            per_comment = time.perf_counter() - started
+            started = time.perf_counter()
+            scorer.score(comments)
+            batched = time.perf_counter() - started
+            print(f"{len(comments):,} comments: nltk VADER one by one {len(comments) / per_comment:,.0f}/s, "
+                  f"batched {len(comments) / batched:,.0f}/s")
+
+            print()
+            print(f"{'batch size':>10} {'seconds':>9} {'comments/s':>12}")
+            for batch_size in args.batch_sizes:
+                _reset(conn)
+                started = time.perf_counter()
+                scored = sentiment.score_new(conn, batch_size)
+                elapsed = time.perf_counter() - started
+                timings[f"full/{batch_size}"] = dict(results.summarize([elapsed]), rows=scored,
+                                                     rows_per_sec=scored / elapsed)
+                print(f"{batch_size:>10,} {elapsed:>9.2f} {scored / elapsed:>12,.0f}")
+
+            datagen.generate(conn, products=0, sales=0, feedback=args.increment, inventory=0, skew=1.1, seed=7)
+            started = time.perf_counter()
+            scored = sentiment.score_new(conn)
+            timings["incremental"] = dict(results.summarize([time.perf_counter() - started]), rows=scored)
+            started = time.perf_counter()
+            sentiment.score_new(conn)
+            timings["noop"] = results.summarize([time.perf_counter() - started])
+            print()
+            print(f"Incremental run: {scored:,} new comments in {timings['incremental']['p50_ms']:.0f} ms; "
+                  f"no-op run {timings['noop']['p50_ms']:.1f} ms")
+
+            product_id = conn.execute("SELECT product_id FROM sentiment_summary ORDER BY scored DESC LIMIT 1").fetchone()[0]
+            cases = [
+                ("read/lowest_products", lambda: sentiment.product_sentiment(conn, limit=5)),
+                ("read/one_product", lambda: sentiment.product_sentiment(conn, product_id)),
+                ("read/topics_one_product", lambda: sentiment.topic_breakdown(conn, product_id)),
+                ("read/topics_all", lambda: sentiment.topic_breakdown(conn)),
+            ]
+            for name, func in cases:
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    func()
+                    samples.append(time.perf_counter() - started)
+                timings[name] = results.summarize(samples)
+                print(f"{name:<24} p50 {timings[name]['p50_ms']:>8.2f} ms")
+    finally:
+        pool.close()
+
+    if args.out:
+        params = {key: value for key, value in vars(args).items() if key not in ("db", "out")}
+        results.save(args.out, "sentiment", dict(params, feedback_rows=rows), timings)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
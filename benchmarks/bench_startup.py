@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import startup
+import views
+from benchmarks import bench_app, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the app's first paint per page from fresh processes")
+    parser.add_argument("--db", help="database file to use (default: a temporary file)")
+    parser.add_argument("--sales", type=int, default=200_000)
+    parser.add_argument("--pages", nargs="+", choices=views.PAGES, default=views.PAGES)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per page")
+    parser.add_argument("--out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-")
+    path = os.path.abspath(args.db or os.path.join(workdir, "bench.db"))
+    bench_app.configure(path, workdir)
+    bench_app.prepare(path, products=1000, sales=args.sales, feedback=20_000, inventory=50_000, customers=20_000,
+                      skew=1.1)
+    # Migrations run in the first process only; later ones find the schema current
+    startup.first_paint("login")
+
+    timings = {}
+    print(f"{'page':<14} {'p50 ms':>9} {'max ms':>9}  heavy libraries")
+    for page in args.pages:
+        samples, heavy, errors = [], [], []
+        for _ in range(args.repeat):
+            paint = startup.first_paint(page)
+            samples.append(paint["first_paint_ms"] / 1000)
+            heavy, errors = paint["heavy"], errors + paint["errors"]
+        timings[f"first_paint/{page}"] = dict(results.summarize(samples), heavy=heavy, errors=len(errors))
+        summary = timings[f"first_paint/{page}"]
+        print(f"{page:<14} {summary['p50_ms']:>9.0f} {summary['max_ms']:>9.0f}  {', '.join(heavy) or '-'}"
+              + (f"  ({len(errors)} errors, first: {errors[0]})" if errors else ""))
+
+    if args.out:
+        params = {key: value for key, value in vars(args).items() if key not in ("db", "out")}
+        results.save(args.out, "startup", dict(params, target_ms=startup.FIRST_PAINT_TARGET_MS), timings)
+        print(f"Results written to {args.out}")
+
+    login = timings.get("first_paint/login")
+    if login:
+        met = login["p50_ms"] <= startup.FIRST_PAINT_TARGET_MS and not login["heavy"] and not login["errors"]
+        print(f"Login page p50 {login['p50_ms']:.0f} ms against a {startup.FIRST_PAINT_TARGET_MS:.0f} ms target: "
+              f"{'met' if met else 'MISSED'}")
+        return 0 if met else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import argparse
+import bisect
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+CATEGORIES = ["Electronics", "Furniture", "Software", "Services", "Office Supplies"]
+FIRST_NAMES = ["John", "Sarah", "Michael", "Emma", "David", "Lisa", "Robert", "Anna", "James", "Maria"]
+LAST_NAMES = ["Smith", "Johnson", "Brown", "Wilson", "Lee", "Wang", "Garcia", "Martin", "Clark", "Lopez"]
+
+# With skew, ratings follow the usual J shape of review sites (1 to 5 stars)
+RATING_WEIGHTS = [0.08, 0.05, 0.09, 0.25, 0.53]
+COMMENTS = {
+    1: ["Stopped working after a week.", "Very disappointed, would not buy again.", "Terrible support experience."],
+    2: ["Not worth the price.", "Arrived late and damaged.", "Below expectations."],
+    3: ["It's okay for the price.", "Does the job, nothing special.", "Average quality."],
+    4: ["Good product, works as described.", "Happy with the purchase.", "Solid value for money."],
+    5: ["Excellent, highly recommend!", "Love it, works perfectly.", "Outstanding quality and fast delivery."],
+}
+
+
+def _dates(rng, start, days):
+    start = datetime.fromisoformat(start)
+    seconds = days * 86400
+    while True:
+        yield (start + timedelta(seconds=rng.randrange(seconds))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _picker(rng, population, skew):
+    # Uniform choice, or Zipf-like: the item at popularity rank r is drawn
+    # with weight 1 / r ** skew. Ranks are shuffled so popularity is not
+    # tied to id order.
+    population = list(population)
+    if not skew:
+        return lambda: rng.choice(population)
+    rng.shuffle(population)
+    weights = list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, len(population) + 1)))
+    total = weights[-1]
+    return lambda: population[bisect.bisect_left(weights, rng.random() * total)]
+
+
+def generate(conn, products=1000, sales=0, feedback=0, inventory=0, customers=10000,
+             start="2024-01-01", days=365, seed=42, batch_size=50000, skew=0.0):
+    """
+    Fill an already-migrated database with synthetic catalog, sales, feedback
+    and inventory rows. skew > 0 makes a few products and customers account
+    for most rows (about 1.0 to 1.2 is typical of real order data) and gives
+    feedback realistic ratings and comments.
+    """
+    rng = random.Random(seed)
+    conn.execute("PRAGMA synchronous = OFF")
+
+    offset = conn.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO products (name, description, category, price, stock_quantity) VALUES (?, ?, ?, ?, ?)",
+        (
+            (f"Product {i}", f"Synthetic product number {i}", rng.choice(CATEGORIES),
+             round(rng.uniform(5, 2000), 2), rng.randint(0, 1000))
+            for i in range(products)
+        ),
+    )
+    conn.commit()
+    prices = dict(conn.execute("SELECT id, price FROM products"))
+    product_ids = [pid for pid in prices if pid > offset] or list(prices)
+    product = _picker(rng, product_ids, skew)
+    customer_number = _picker(rng, range(customers), skew)
+
+    def customer():
+        n = customer_number()
+        name = f"{FIRST_NAMES[n % len(FIRST_NAMES)]} {LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+        return name, f"customer{n}@example.com"
+
+    def insert(sql, rows, total):
+        batch = []
+        for _ in range(total):
+            batch.append(next(rows))
+            if len(batch) >= batch_size:
+                conn.executemany(sql, batch)
+                conn.commit()
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+            conn.commit()
+
+    def sale_rows():
+        dates = _dates(rng, start, days)
+        while True:
+            product_id = product()
+            quantity = rng.randint(1, 5)
+            name, email = customer()
+            yield (product_id, quantity, round(prices[product_id] * quantity, 2), name, email, next(dates))
+
+    def feedback_rows():
+        while True:
+            name, email = customer()
+            if skew:
+                rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+                yield (name, email, product(), rating, rng.choice(COMMENTS[rating]))
+            else:
+                yield (name, email, product(), rng.randint(1, 5), "Synthetic feedback comment")
+
+    def inventory_rows():
+        dates = _dates(rng, start, days)
+        while True:
+            change = rng.randint(1, 100) if rng.random() < 0.2 else -rng.randint(1, 5)
+            yield (product(), change, "Restocked inventory" if change > 0 else "Sale", next(dates))
+
+    insert("INSERT INTO sales (product_id, quantity, total_price, customer_name, customer_email, sale_date) "
+           "VALUES (?, ?, ?, ?, ?, ?)", sale_rows(), sales)
+    insert("INSERT INTO feedback (customer_name, customer_email, product_id, rating, comments) "
+           "VALUES (?, ?, ?, ?, ?)", feedback_rows(), feedback)
+    insert("INSERT INTO inventory_log (product_id, quantity_change, reason, log_date) "
+           "VALUES (?, ?, ?, ?)", inventory_rows(), inventory)
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or extend a CRM database with synthetic data")
+    parser.add_argument("--db", required=True, help="database file to fill (migrated first)")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--feedback", type=int, default=10_000)
+    parser.add_argument("--inventory", type=int, default=50_000)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for popularity (0 for uniform)")
+    parser.add_argument("--start", default="2024-01-01")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    # Imported here so importing this module never loads db, whose settings
+    # come from CRM_* variables read at import time
+    import db
+    import migrations
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            migrations.migrate(conn)
+            started = time.perf_counter()
+            generate(conn, products=args.products, sales=args.sales, feedback=args.feedback,
+                     inventory=args.inventory, customers=args.customers, start=args.start,
+                     days=args.days, seed=args.seed, skew=args.skew)
+            counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("products", "sales", "feedback", "inventory_log")}
+    finally:
+        pool.close()
+    print(f"Generated in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{count:,} {table}" for table, count in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
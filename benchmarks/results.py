@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+
+def summarize(samples):
+    """
+    Latency summary in milliseconds for a list of durations in seconds
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": _git_commit(),
+    }
+
+
+def save(path, suite, params, results):
+    """
+    Write one run as JSON: {suite, created_at, environment, params, results},
+    where results maps a benchmark name to a summarize() dict
+    """
+    run = {
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment(),
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2, sort_keys=True)
+    return run
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, metric="p50_ms", threshold=0.10):
+    """
+    Benchmarks present in both runs, with the relative change in `metric`;
+    regression is True when it grew by more than `threshold`
+    """
+    rows = []
+    for name in sorted(set(baseline["results"]) & set(current["results"])):
+        before = baseline["results"][name].get(metric)
+        after = current["results"][name].get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        rows.append({"benchmark": name, "baseline": before, "current": after, "change": change,
+                     "regression": change > threshold})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--metric", default="p50_ms")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    rows = compare(baseline, current, args.metric, args.threshold)
+    width = max([len(row["benchmark"]) for row in rows] + [9])
+    print(f"baseline {baseline['environment'].get('commit')} ({baseline['created_at']}) vs "
+          f"current {current['environment'].get('commit')} ({current['created_at']}), {args.metric}")
+    print(f"{'benchmark':<{width}} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['benchmark']:<{width}} {row['baseline']:>10.2f} {row['current']:>10.2f} "
+              f"{row['change']:>+8.1%}{flag}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} regressions over {args.threshold:.0%} in {len(rows)} benchmarks")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import cache
+import db
+import replica
+
+CHUNK_SIZE = int(os.environ.get("CRM_IMPORT_CHUNK_SIZE", "50000"))
+MAX_REPORTED_ERRORS = 100
+
+# PRAGMAs used for the duration of an import; previous values are restored
+IMPORT_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "OFF"),
+    ("cache_size", "-262144"),
+    ("temp_store", "MEMORY"),
+]
+
+TABLES = ("products", "sales", "inventory_log")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _required(row, key):
+    value = row.get(key)
+    if value is None or str(value).strip() == "":
+        raise RowError(f"missing {key}")
+    return value
+
+
+def _int(row, key, default=None):
+    value = row.get(key)
+    if value is None or str(value).strip() == "":
+        if default is None:
+            raise RowError(f"missing {key}")
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{key} is not an integer: {value!r}")
+
+
+def _float(row, key):
+    value = _required(row, key)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{key} is not a number: {value!r}")
+
+
+def _timestamp(row, key):
+    value = row.get(key)
+    if value is None or str(value).strip() == "":
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise RowError(f"{key} is not an ISO date: {value!r}")
+
+
+def _text(row, key):
+    value = row.get(key)
+    return None if value is None or str(value).strip() == "" else str(value).strip()
+
+
+def validate_product(row, product_ids):
+    price = _float(row, "price")
+    stock = _int(row, "stock_quantity")
+    if price < 0:
+        raise RowError("price is negative")
+    if stock < 0:
+        raise RowError("stock_quantity is negative")
+    product_id = row.get("id")
+    product_id = _int(row, "id") if product_id not in (None, "") else None
+    return (product_id, str(_required(row, "name")).strip(), _text(row, "description"),
+            _text(row, "category"), price, stock)
+
+
+def validate_sale(row, product_ids):
+    product_id = _int(row, "product_id")
+    if product_id not in product_ids:
+        raise RowError(f"unknown product_id {product_id}")
+    quantity = _int(row, "quantity")
+    if quantity <= 0:
+        raise RowError("quantity must be positive")
+    total_price = _float(row, "total_price")
+    return (product_id, quantity, total_price, _text(row, "customer_name"),
+            _text(row, "customer_email"), _timestamp(row, "sale_date"))
+
+
+def validate_inventory(row, product_ids):
+    product_id = _int(row, "product_id")
+    if product_id not in product_ids:
+        raise RowError(f"unknown product_id {product_id}")
+    change = _int(row, "quantity_change")
+    if change == 0:
+        raise RowError("quantity_change is zero")
+    return (product_id, change, _text(row, "reason"), _timestamp(row, "log_date"))
+
+
+VALIDATORS = {
+    "products": validate_product,
+    "sales": validate_sale,
+    "inventory_log": validate_inventory,
+}
+
+
+def read_csv_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of row dicts from a CSV path or binary/text file object
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="", encoding="utf-8") as f:
+            yield from read_csv_chunks(f, chunk_size)
+        return
+    if isinstance(source, (io.RawIOBase, io.BufferedIOBase)) or hasattr(source, "getbuffer"):
+        source = io.TextIOWrapper(source, encoding="utf-8", newline="")
+
+    chunk = []
+    for row in csv.DictReader(source):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_parquet_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of row dicts from a Parquet file, one record batch at a time;
+    needs pyarrow
+    """
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def _set_pragmas(conn, pragmas):
+    previous = []
+    for name, value in pragmas:
+        previous.append((name, conn.execute(f"PRAGMA {name}").fetchone()[0]))
+        conn.execute(f"PRAGMA {name} = {value}")
+    return previous
+
+
+def _stock(conn, product_ids):
+    # Current stock of the given products, read under the chunk's write lock
+    return dict(conn.execute("SELECT id, stock_quantity FROM products WHERE id IN (SELECT value FROM json_each(?))",
+                             (json.dumps(sorted(product_ids)),)))
+
+
+def _apply_chunk(conn, table, rows):
+    """
+    Write one chunk of validated rows; returns {index: error} for rows
+    rejected against the database state (sales that would oversell)
+    """
+    if table == "products":
+        # Stock set by the file is a movement too: log the difference for
+        # existing products so the inventory ledger keeps matching
+        # products.stock_quantity (new products get an opening balance)
+        current = _stock(conn, {row[0] for row in rows if row[0] is not None})
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # The last row for a product is the one the upsert keeps
+        adjustments = {row[0]: row[5] for row in rows if row[0] in current}
+        conn.executemany('''
+        INSERT INTO products (id, name, description, category, price, stock_quantity)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            name = excluded.name,
+            description = excluded.description,
+            category = excluded.category,
+            price = excluded.price,
+            stock_quantity = excluded.stock_quantity
+        ''', rows)
+        conn.executemany(
+            "INSERT INTO inventory_log (product_id, quantity_change, reason, log_date) VALUES (?, ?, ?, ?)",
+            [(product_id, stock - current[product_id], "Bulk import stock adjustment", now)
+             for product_id, stock in adjustments.items() if stock != current[product_id]])
+        return {}
+
+    rejected = {}
+    if table == "sales":
+        # Same rule as sales.record_sales: lines for a product are filled in
+        # order, and once one would oversell, it and every later line for
+        # that product are rejected
+        stock = _stock(conn, {row[0] for row in rows})
+        accepted = []
+        for index, row in enumerate(rows):
+            product_id, quantity = row[0], row[1]
+            if stock[product_id] is not None and quantity <= stock[product_id]:
+                stock[product_id] -= quantity
+                accepted.append(row)
+            else:
+                stock[product_id] = None
+                rejected[index] = f"insufficient stock for product_id {product_id}"
+        rows = accepted
+        conn.executemany(
+            "INSERT INTO sales (product_id, quantity, total_price, customer_name, customer_email, sale_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        # Every sale is also a stock movement
+        movements = [
+            (product_id, -quantity, f"Sale to {name}" if name else "Sale", sale_date)
+            for product_id, quantity, _, name, _, sale_date in rows
+        ]
+    else:
+        movements = rows
+
+    conn.executemany(
+        "INSERT INTO inventory_log (product_id, quantity_change, reason, log_date) VALUES (?, ?, ?, ?)",
+        movements)
+
+    # One stock update per product in the chunk
+    deltas = {}
+    for product_id, change, _, _ in movements:
+        deltas[product_id] = deltas.get(product_id, 0) + change
+    conn.executemany(
+        "UPDATE products SET stock_quantity = stock_quantity + ? WHERE id = ?",
+        [(delta, product_id) for product_id, delta in deltas.items()])
+    return rejected
+
+
+def import_rows(chunks, table, conn=None, progress=None):
+    """
+    Validate and load chunks of row dicts into products, sales or
+    inventory_log. Sales and inventory movements also adjust
+    products.stock_quantity, sales that would oversell are rejected, and
+    sales and stock changes to existing products append to inventory_log.
+    Each chunk is one transaction, so `conn` must not have one open.
+    Returns a report with counts, the first rejected rows and throughput.
+    """
+    if table not in VALIDATORS:
+        raise ValueError(f"Unsupported table: {table}")
+    if conn is None:
+        with db.connection() as conn:
+            return import_rows(chunks, table, conn, progress)
+
+    validate = VALIDATORS[table]
+    report = {"table": table, "rows_read": 0, "rows_imported": 0, "rows_rejected": 0,
+              "errors": [], "chunks": 0}
+    product_ids = {row[0] for row in conn.execute("SELECT id FROM products")}
+
+    db.check_no_transaction(conn)
+    previous = _set_pragmas(conn, IMPORT_PRAGMAS)
+    started = time.perf_counter()
+    try:
+        for chunk in chunks:
+            valid = []
+            numbers = []
+            errors = []
+            for row in chunk:
+                report["rows_read"] += 1
+                try:
+                    valid.append(validate(row, product_ids))
+                    numbers.append(report["rows_read"])
+                except RowError as e:
+                    errors.append((report["rows_read"], str(e)))
+
+            if valid:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rejected = _apply_chunk(conn, table, valid)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                errors.extend((numbers[index], error) for index, error in rejected.items())
+                report["rows_imported"] += len(valid) - len(rejected)
+            report["rows_rejected"] += len(errors)
+            for row_number, error in sorted(errors)[:MAX_REPORTED_ERRORS - len(report["errors"])]:
+                report["errors"].append({"row": row_number, "error": error})
+            report["chunks"] += 1
+            if progress:
+                progress(report)
+    finally:
+        _set_pragmas(conn, previous)
+        cache.invalidate("products", "metrics", "inventory_log", "table_stats", "product_neighbors")
+        replica.request_refresh()
+
+    report["elapsed"] = time.perf_counter() - started
+    report["rows_per_sec"] = report["rows_imported"] / report["elapsed"] if report["elapsed"] else 0.0
+    return report
+
+
+def import_file(source, table, fmt=None, chunk_size=CHUNK_SIZE, conn=None, progress=None):
+    """
+    Stream a CSV or Parquet file into a table; fmt defaults to the file
+    extension
+    """
+    if fmt is None:
+        name = source if isinstance(source, str) else getattr(source, "name", "")
+        fmt = "parquet" if str(name).lower().endswith(".parquet") else "csv"
+    reader = read_parquet_chunks if fmt == "parquet" else read_csv_chunks
+    return import_rows(reader(source, chunk_size), table, conn, progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import products, sales or inventory movements")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("file", help="CSV or Parquet file with a header row matching the table's columns")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="input format (default: from extension)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    def progress(report):
+        print(f"  {report['rows_read']:>12,} read  {report['rows_imported']:>12,} imported  "
+              f"{report['rows_rejected']:>8,} rejected", file=sys.stderr)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            report = import_file(args.file, args.table, args.format, args.chunk_size, conn, progress)
+    finally:
+        pool.close()
+
+    for error in report["errors"]:
+        print(f"row {error['row']}: {error['error']}")
+    print(f"Imported {report['rows_imported']:,} of {report['rows_read']:,} rows into {report['table']} "
+          f"in {report['elapsed']:.1f}s ({report['rows_per_sec']:,.0f} rows/s), "
+          f"{report['rows_rejected']:,} rejected")
+    return 1 if report["rows_rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import functools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Defaults for the shared read cache (overridable through the environment)
+DEFAULT_TTL = float(os.environ.get("CRM_CACHE_TTL", "300"))
+DEFAULT_MAXSIZE = int(os.environ.get("CRM_CACHE_MAXSIZE", "1024"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and per-namespace generation
+    counters. Bumping a namespace's generation drops its entries and stops
+    in-flight computations from storing results read before the write.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return _MISSING
+            expires, _, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, namespace, generation, ttl=None):
+        with self._lock:
+            # A write landed while this value was being computed
+            if self._generations.get(namespace, 0) != generation:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), namespace, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            stale = [key for key, entry in self._data.items() if entry[1] == namespace]
+            for key in stale:
+                del self._data[key]
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            for namespace in self._generations:
+                self._generations[namespace] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+            stats["maxsize"] = self.maxsize
+            stats["generations"] = dict(self._generations)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = TTLCache()
+_namespaces = set()
+
+
+def cached(namespace, ttl=None):
+    """
+    Cache a function's results in the shared cache under a namespace (one
+    per table), keyed by its arguments. Returned values are shared between
+    callers and must be treated as read-only.
+    """
+    _namespaces.add(namespace)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            generation = _cache.generation(namespace)
+            key = (namespace, generation, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            value = _cache.get(key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                _cache.set(key, value, namespace, generation, ttl)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate(*namespaces):
+    for namespace in namespaces:
+        _cache.invalidate(namespace)
+
+
+def invalidate_for_sql(sql):
+    """
+    Invalidate every cached namespace whose table name appears in a write
+    statement
+    """
+    for namespace in sorted(_namespaces):
+        if re.search(rf"\b{re.escape(namespace)}\b", sql, re.IGNORECASE):
+            _cache.invalidate(namespace)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    return _cache.stats()
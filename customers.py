@@ -0,0 +1,281 @@
+import argparse
+import sqlite3
+import string
+import sys
+import time
+
+import archive
+import db
+
+# Search results shown for one query
+SEARCH_LIMIT = 20
+# Upper bound for prefix ranges: sorts after every string starting with the prefix
+PREFIX_END = chr(0x10FFFF)
+
+# Folds a customer's sales or feedback into their row. Names follow the
+# latest purchase; feedback only names customers who have not bought yet.
+SALES_UPSERT = '''
+ON CONFLICT (email) DO UPDATE SET
+    name = CASE WHEN excluded.last_purchase >= COALESCE(last_purchase, '')
+                THEN COALESCE(excluded.name, name) ELSE name END,
+    name_key = CASE WHEN excluded.last_purchase >= COALESCE(last_purchase, '')
+                    THEN COALESCE(excluded.name_key, name_key) ELSE name_key END,
+    orders = orders + excluded.orders,
+    units = units + excluded.units,
+    lifetime_value = lifetime_value + excluded.lifetime_value,
+    last_purchase = MAX(COALESCE(last_purchase, ''), excluded.last_purchase)
+'''
+FEEDBACK_UPSERT = '''
+ON CONFLICT (email) DO UPDATE SET
+    name = COALESCE(name, excluded.name),
+    name_key = COALESCE(name_key, excluded.name_key),
+    ratings = ratings + excluded.ratings,
+    rating_sum = rating_sum + excluded.rating_sum,
+    last_feedback = MAX(COALESCE(last_feedback, ''), excluded.last_feedback)
+'''
+
+# Trigger bodies: add the new row, subtract the old one. Rows without an
+# email have no customer.
+ADD_SALE = f'''
+        INSERT INTO customers (email, name, name_key, orders, units, lifetime_value, last_purchase)
+        SELECT lower(trim(NEW.customer_email)), NULLIF(trim(NEW.customer_name), ''),
+               NULLIF(lower(trim(NEW.customer_name)), ''), 1, NEW.quantity, NEW.total_price, NEW.sale_date
+        WHERE trim(COALESCE(NEW.customer_email, '')) != ''
+        {SALES_UPSERT};
+'''
+REMOVE_SALE = '''
+        UPDATE customers SET
+            orders = orders - 1,
+            units = units - OLD.quantity,
+            lifetime_value = lifetime_value - OLD.total_price
+        WHERE email = lower(trim(OLD.customer_email));
+'''
+ADD_FEEDBACK = f'''
+        INSERT INTO customers (email, name, name_key, ratings, rating_sum, last_feedback)
+        SELECT lower(trim(NEW.customer_email)), NULLIF(trim(NEW.customer_name), ''),
+               NULLIF(lower(trim(NEW.customer_name)), ''), 1, NEW.rating, NEW.created_at
+        WHERE trim(COALESCE(NEW.customer_email, '')) != ''
+        {FEEDBACK_UPSERT};
+'''
+REMOVE_FEEDBACK = '''
+        UPDATE customers SET
+            ratings = ratings - 1,
+            rating_sum = rating_sum - OLD.rating
+        WHERE email = lower(trim(OLD.customer_email));
+'''
+
+# Per-customer sales totals of one sales table; with a single max() the
+# bare name column comes from the customer's latest sale
+SALES_BY_CUSTOMER = '''
+SELECT lower(trim(customer_email)), NULLIF(trim(customer_name), ''), NULLIF(lower(trim(customer_name)), ''),
+       COUNT(*), SUM(quantity), SUM(total_price), MAX(sale_date)
+FROM {table}
+WHERE trim(COALESCE(customer_email, '')) != ''
+GROUP BY lower(trim(customer_email))
+'''
+
+# SQLite's lower() folds ASCII letters only and trim() strips spaces only;
+# keys built here must match the ones the triggers store
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+CUSTOMER_COLUMNS = ("id", "email", "name", "orders", "units", "lifetime_value", "last_purchase", "ratings",
+                    "rating_sum", "last_feedback")
+
+
+def create_customer_tables(c):
+    """
+    One row per normalized email (trimmed, lower case) with the customer's
+    sales and feedback totals, kept current by triggers on both tables, and
+    backfilled from existing rows, archived sales included. Also indexes
+    sales and feedback by normalized email for the order history.
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER PRIMARY KEY,
+        email TEXT NOT NULL,
+        name TEXT,
+        name_key TEXT,
+        orders INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        lifetime_value REAL NOT NULL DEFAULT 0,
+        last_purchase TIMESTAMP,
+        ratings INTEGER NOT NULL DEFAULT 0,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        last_feedback TIMESTAMP
+    )
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_email ON customers (email)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_name_key ON customers (name_key)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_lifetime_value ON customers (lifetime_value)")
+    # Per-customer history; queries must repeat the normalized email expression
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer_date ON sales (lower(trim(customer_email)), sale_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_feedback_customer_date "
+              "ON feedback (lower(trim(customer_email)), created_at)")
+
+    # Rows the archive rollover moves out still count towards the totals
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS sales_customer_ai AFTER INSERT ON sales BEGIN {ADD_SALE} END")
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS sales_customer_ad AFTER DELETE ON sales
+    WHEN NOT EXISTS (SELECT 1 FROM maintenance WHERE name = 'archiving')
+    BEGIN {REMOVE_SALE} END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS sales_customer_au
+    AFTER UPDATE OF quantity, total_price, customer_name, customer_email, sale_date ON sales BEGIN
+        {REMOVE_SALE}
+        {ADD_SALE}
+    END
+    ''')
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS feedback_customer_ai AFTER INSERT ON feedback BEGIN {ADD_FEEDBACK} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS feedback_customer_ad AFTER DELETE ON feedback BEGIN {REMOVE_FEEDBACK} END")
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS feedback_customer_au
+    AFTER UPDATE OF customer_name, customer_email, rating ON feedback BEGIN
+        {REMOVE_FEEDBACK}
+        {ADD_FEEDBACK}
+    END
+    ''')
+
+    rebuild_customers(c)
+
+
+def rebuild_customers(c):
+    """
+    Recompute every customer row from sales, archived months first, and
+    feedback. A deleted sale is subtracted by its trigger but leaves
+    last_purchase as it was until the next rebuild.
+    """
+    c.execute("DELETE FROM customers")
+    insert_sales = ("INSERT INTO customers (email, name, name_key, orders, units, lifetime_value, last_purchase) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)" + SALES_UPSERT)
+    # Read through their own connections: attaching is not allowed inside
+    # the migration's transaction
+    for partition in archive.partitions(c):
+        if partition["bytes"] is None:
+            continue
+        source = sqlite3.connect(f"file:{partition['path']}?mode=ro", uri=True)
+        try:
+            rows = source.execute(SALES_BY_CUSTOMER.format(table="sales")).fetchall()
+        finally:
+            source.close()
+        c.executemany(insert_sales, rows)
+    c.execute('''
+    INSERT INTO customers (email, name, name_key, orders, units, lifetime_value, last_purchase)
+    ''' + SALES_BY_CUSTOMER.format(table="main.sales") + SALES_UPSERT)
+    c.execute('''
+    INSERT INTO customers (email, name, name_key, ratings, rating_sum, last_feedback)
+    SELECT lower(trim(customer_email)), NULLIF(trim(customer_name), ''), NULLIF(lower(trim(customer_name)), ''),
+           COUNT(*), SUM(rating), MAX(created_at)
+    FROM feedback
+    WHERE trim(COALESCE(customer_email, '')) != ''
+    GROUP BY lower(trim(customer_email))
+    ''' + FEEDBACK_UPSERT)
+
+
+def normalize_email(email):
+    return (email or "").strip(" ").translate(ASCII_LOWER)
+
+
+def _customer(row):
+    customer = dict(zip(CUSTOMER_COLUMNS, row))
+    customer["average_rating"] = customer["rating_sum"] / customer["ratings"] if customer["ratings"] else None
+    return customer
+
+
+def search(conn, term, limit=SEARCH_LIMIT):
+    """
+    Customers whose email or name starts with `term` (case-insensitive),
+    highest lifetime value first; both are range scans on an index
+    """
+    key = " ".join((term or "").split()).translate(ASCII_LOWER)
+    if not key:
+        return []
+    columns = ", ".join(CUSTOMER_COLUMNS)
+    rows = conn.execute(f'''
+    SELECT {columns} FROM customers
+    WHERE (email >= ?1 AND email < ?2) OR (name_key >= ?1 AND name_key < ?2)
+    ORDER BY lifetime_value DESC
+    LIMIT ?3
+    ''', (key, key + PREFIX_END, limit)).fetchall()
+    return [_customer(row) for row in rows]
+
+
+def top_customers(conn, limit=SEARCH_LIMIT):
+    """
+    Highest lifetime value first, read in order from its index
+    """
+    columns = ", ".join(CUSTOMER_COLUMNS)
+    rows = conn.execute(f"SELECT {columns} FROM customers ORDER BY lifetime_value DESC LIMIT ?",
+                        (limit,)).fetchall()
+    return [_customer(row) for row in rows]
+
+
+def customer(conn, email):
+    """
+    One customer by email, in any case or spacing; None when unknown
+    """
+    columns = ", ".join(CUSTOMER_COLUMNS)
+    row = conn.execute(f"SELECT {columns} FROM customers WHERE email = ?", (normalize_email(email),)).fetchone()
+    return _customer(row) if row else None
+
+
+def recent_orders(conn, email, limit=SEARCH_LIMIT):
+    """
+    A customer's latest sales in the hot file, newest first, read backwards
+    from the (customer, date) expression index on sales
+    """
+    rows = conn.execute('''
+    SELECT s.id, s.sale_date, s.product_id, p.name, s.quantity, s.total_price
+    FROM sales s
+    LEFT JOIN products p ON p.id = s.product_id
+    WHERE lower(trim(s.customer_email)) = ?
+    ORDER BY s.sale_date DESC
+    LIMIT ?
+    ''', (normalize_email(email), limit)).fetchall()
+    keys = ("id", "sale_date", "product_id", "product", "quantity", "total_price")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def recent_feedback(conn, email, limit=SEARCH_LIMIT):
+    """
+    A customer's latest feedback, newest first
+    """
+    rows = conn.execute('''
+    SELECT f.id, f.created_at, f.product_id, p.name, f.rating, f.comments
+    FROM feedback f
+    LEFT JOIN products p ON p.id = f.product_id
+    WHERE lower(trim(f.customer_email)) = ?
+    ORDER BY f.created_at DESC
+    LIMIT ?
+    ''', (normalize_email(email), limit)).fetchall()
+    keys = ("id", "created_at", "product_id", "product", "rating", "comments")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the customer index from sales and feedback")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            started = time.perf_counter()
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rebuild_customers(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            count = conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+    finally:
+        pool.close()
+    print(f"Rebuilt {count:,} customers in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import profiler
+
+# Connection settings (overridable through the environment)
+DB_PATH = os.environ.get("CRM_DB_PATH", "crm.db")
+POOL_SIZE = int(os.environ.get("CRM_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.environ.get("CRM_DB_BUSY_TIMEOUT_MS", "5000"))
+POOL_WAIT_TIMEOUT = float(os.environ.get("CRM_DB_POOL_WAIT_TIMEOUT", "30"))
+
+# PRAGMAs applied to every new connection, in order
+CONNECTION_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("temp_store", "MEMORY"),
+    ("cache_size", "-16000"),
+]
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections shared by all script threads.
+
+    A thread that already holds a connection gets the same one back when it
+    asks again, so nested data functions share one connection and one
+    transaction. A read_only pool opens its connections with mode=ro, so
+    SQLite itself refuses any write made through them; an immutable pool
+    also skips all locking and change detection, for files nothing writes.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE, busy_timeout_ms=BUSY_TIMEOUT_MS,
+                 pragmas=None, wait_timeout=POOL_WAIT_TIMEOUT, read_only=False, immutable=False):
+        self.path = path
+        self.read_only = read_only or immutable
+        self.immutable = immutable
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pragmas = CONNECTION_PRAGMAS if pragmas is None else pragmas
+        self.wait_timeout = wait_timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all = []
+        self._closed = False
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "reentrant": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+        }
+
+    def _connect(self):
+        factory = profiler.ProfiledConnection if profiler.ENABLED else sqlite3.Connection
+        if self.read_only:
+            conn = sqlite3.connect(
+                f"{Path(self.path).absolute().as_uri()}?mode=ro{'&immutable=1' if self.immutable else ''}",
+                uri=True,
+                timeout=self.busy_timeout_ms / 1000.0,
+                check_same_thread=False,
+                factory=factory,
+            )
+        else:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000.0,
+                check_same_thread=False,
+                factory=factory,
+            )
+        if profiler.ENABLED:
+            profiler.instrument(conn)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        for name, value in self.pragmas:
+            # The journal mode is a property of the file; read-only
+            # connections can't change it
+            if self.read_only and name == "journal_mode":
+                continue
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            with self._lock:
+                self._stats["reentrant"] += 1
+            return held
+
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["hits"] += 1
+        except queue.Empty:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                create = len(self._all) < self.size
+                if create:
+                    # Reserve the slot before connecting outside the lock
+                    self._all.append(None)
+                    self._stats["misses"] += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._all.remove(None)
+                    raise
+                with self._lock:
+                    self._all[self._all.index(None)] = conn
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.wait_timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.wait_timeout}s"
+                    )
+                waited = time.perf_counter() - started
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["waits"] += 1
+                    self._stats["wait_time_total"] += waited
+                    self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        if getattr(self._local, "conn", None) is not conn:
+            raise RuntimeError("Connection released by a thread that does not hold it")
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection; the outermost borrower commits on success and
+        rolls back on error.
+        """
+        conn = self.acquire()
+        outermost = self._local.depth == 1
+        try:
+            yield conn
+            if outermost and conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if outermost and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = len([c for c in self._all if c is not None])
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_read_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_read_pool():
+    global _read_pool
+    if _read_pool is None:
+        with _pool_lock:
+            if _read_pool is None:
+                _read_pool = ConnectionPool(read_only=True)
+    return _read_pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+def read_connection():
+    return get_read_pool().connection()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def check_no_transaction(conn):
+    """
+    For functions that commit their own work: raise rather than commit a
+    transaction the caller left open
+    """
+    if conn.in_transaction:
+        raise RuntimeError("This commits its own transactions; commit or roll back the open one first")
+
+
+def begin_immediate(conn):
+    check_no_transaction(conn)
+    conn.execute("BEGIN IMMEDIATE")
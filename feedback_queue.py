@@ -0,0 +1,346 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+import cache
+import db
+
+# Write-behind settings (overridable through the environment)
+QUEUE_SIZE = int(os.environ.get("CRM_FEEDBACK_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.environ.get("CRM_FEEDBACK_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.environ.get("CRM_FEEDBACK_FLUSH_INTERVAL", "0.2"))
+ENQUEUE_TIMEOUT = float(os.environ.get("CRM_FEEDBACK_ENQUEUE_TIMEOUT", "2"))
+# Each process spills to SPILL_FILE.<pid>
+SPILL_FILE = os.environ.get("CRM_FEEDBACK_SPILL_FILE", "feedback_spill.jsonl")
+SPILL_FSYNC = os.environ.get("CRM_FEEDBACK_SPILL_FSYNC", "1") == "1"
+# Attempts at committing a batch that the database rejects before its rows
+# are written one by one; rows it still rejects go to the dead-letter file.
+# Lock and busy errors are retried with backoff for as long as they last.
+MAX_RETRIES = int(os.environ.get("CRM_FEEDBACK_MAX_RETRIES", "3"))
+RETRY_DELAY = float(os.environ.get("CRM_FEEDBACK_RETRY_DELAY", "0.1"))
+MAX_RETRY_DELAY = float(os.environ.get("CRM_FEEDBACK_MAX_RETRY_DELAY", "5"))
+DEAD_LETTER_FILE = os.environ.get("CRM_FEEDBACK_DEAD_LETTER_FILE", "feedback_dead_letter.jsonl")
+
+INSERT_FEEDBACK = '''
+INSERT OR IGNORE INTO feedback
+    (submission_id, customer_name, customer_email, product_id, rating, comments, created_at)
+VALUES (:submission_id, :customer_name, :customer_email, :product_id, :rating, :comments, :created_at)
+'''
+
+
+# Errors caused by the row itself (a failed constraint, a missing value or
+# one SQLite can't bind); anything else, like a locked database, is worth
+# retrying
+REJECTED_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def add_submission_ids(c):
+    """
+    Give feedback rows an optional client-side id so replays are idempotent
+    """
+    columns = [row[1] for row in c.execute("PRAGMA table_info(feedback)")]
+    if "submission_id" not in columns:
+        c.execute("ALTER TABLE feedback ADD COLUMN submission_id TEXT")
+    c.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_feedback_submission_id
+    ON feedback (submission_id) WHERE submission_id IS NOT NULL
+    ''')
+
+
+class FeedbackWriter:
+    """
+    Single background thread that drains a bounded queue of feedback rows and
+    commits them in micro-batches. Every row is appended to this process's
+    spill file before it is queued, and the file is truncated once
+    everything in it has been committed. The file stays locked while the
+    process runs; on start-up, spill files nobody holds are replayed and
+    removed. A batch the database keeps rejecting is written row by row,
+    and rows it still rejects go to a dead-letter file.
+    """
+
+    def __init__(self, pool=None, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, spill_file=SPILL_FILE, fsync=SPILL_FSYNC,
+                 max_retries=MAX_RETRIES, dead_letter_file=DEAD_LETTER_FILE, retry_delay=RETRY_DELAY,
+                 max_retry_delay=MAX_RETRY_DELAY):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_file = spill_file
+        self.spill_path = f"{spill_file}.{os.getpid()}"
+        self.fsync = fsync
+        self.max_retries = max_retries
+        self.dead_letter_file = dead_letter_file
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._spill = None
+        self._uncommitted = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "committed": 0,
+            "rejected": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dead_lettered": 0,
+            "replayed": 0,
+            "max_depth": 0,
+            "commit_time_total": 0.0,
+            "commit_time_max": 0.0,
+            "last_commit_time": 0.0,
+        }
+
+    def _connection(self):
+        return (self.pool or db.get_pool()).connection()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._spill = open(self.spill_path, "a", encoding="utf-8")
+        fcntl.flock(self._spill, fcntl.LOCK_EX)
+        self._replay_spills()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, customer_name, customer_email, product_id, rating, comments, timeout=ENQUEUE_TIMEOUT):
+        """
+        Queue one submission; blocks up to `timeout` seconds while the queue
+        is full, then raises QueueFull
+        """
+        record = {
+            "submission_id": uuid.uuid4().hex,
+            "customer_name": customer_name,
+            "customer_email": customer_email,
+            "product_id": product_id,
+            "rating": rating,
+            "comments": comments,
+            # UTC, like the column's CURRENT_TIMESTAMP default
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        }
+        # Durable before the writer thread can see it, so a commit never
+        # runs ahead of the spill file's count of uncommitted rows
+        self._spill_record(record)
+        try:
+            self._queue.put(record, timeout=timeout)
+        except queue.Full:
+            self._unspill(record)
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise QueueFull("Feedback queue is full, please try again shortly")
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+        return record["submission_id"]
+
+    def _append(self, f, record):
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _spill_record(self, record):
+        with self._spill_lock:
+            self._append(self._spill, record)
+            self._uncommitted += 1
+
+    def _unspill(self, record):
+        # Other rows may have been appended since, so the line stays and a
+        # cancellation after it keeps the replay from inserting it
+        with self._spill_lock:
+            self._append(self._spill, {"cancelled": record["submission_id"]})
+            self._uncommitted -= 1
+
+    def _replay_spills(self):
+        # Files of processes that are still running stay locked; the one
+        # without a pid suffix comes from versions with a shared file
+        for path in [self.spill_file] + sorted(glob.glob(glob.escape(self.spill_file) + ".*")):
+            if path == self.spill_path:
+                continue
+            try:
+                f = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if self._replay(f) is None:
+                    return
+                # Unlinked while still locked: a process that opened it
+                # meanwhile replays the same rows, which the submission ids
+                # turn into no-ops
+                os.unlink(path)
+
+    def _replay(self, f):
+        records = []
+        cancelled = set()
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line from a crash mid-write was never acknowledged
+                continue
+            if "cancelled" in record:
+                cancelled.add(record["cancelled"])
+            else:
+                records.append(record)
+        records = [record for record in records if record["submission_id"] not in cancelled]
+        if records:
+            if self._write(records) is None:
+                return None
+            cache.invalidate("metrics")
+        with self._stats_lock:
+            self._stats["replayed"] += len(records)
+        return len(records)
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _write(self, batch):
+        """
+        Commit a batch. Rejected batches are retried up to max_retries times
+        and then written row by row, moving the rows the database refuses to
+        the dead-letter file; other errors are retried until they clear.
+        Returns the rows committed, or None when stopping before the batch
+        was written.
+        """
+        rejections = 0
+        delay = self.retry_delay
+        while True:
+            try:
+                with self._connection() as conn:
+                    conn.executemany(INSERT_FEEDBACK, batch)
+                return len(batch)
+            except REJECTED_ROW_ERRORS:
+                rejections += 1
+            except Exception:
+                # Locked or busy; the rows stay in the spill file meanwhile
+                pass
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+            if rejections >= self.max_retries:
+                break
+            if self._stop.is_set():
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+        # One bad row must not hold up the rest of the batch
+        written = 0
+        for record in batch:
+            result = self._write_row(record)
+            if result is None:
+                return None
+            written += result
+        return written
+
+    def _write_row(self, record):
+        # 1 when committed, 0 when dead-lettered, None when stopping
+        delay = self.retry_delay
+        while True:
+            try:
+                with self._connection() as conn:
+                    conn.execute(INSERT_FEEDBACK, record)
+                return 1
+            except REJECTED_ROW_ERRORS as e:
+                with self._spill_lock:
+                    with open(self.dead_letter_file, "a", encoding="utf-8") as f:
+                        self._append(f, dict(record, error=str(e)))
+                with self._stats_lock:
+                    self._stats["dead_lettered"] += 1
+                return 0
+            except Exception:
+                if self._stop.is_set():
+                    return None
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        written = self._write(batch)
+        if written is None:
+            return
+        elapsed = time.perf_counter() - started
+        cache.invalidate("metrics")
+
+        with self._stats_lock:
+            self._stats["committed"] += written
+            self._stats["batches"] += 1
+            self._stats["commit_time_total"] += elapsed
+            self._stats["commit_time_max"] = max(self._stats["commit_time_max"], elapsed)
+            self._stats["last_commit_time"] = elapsed
+        with self._spill_lock:
+            self._uncommitted -= len(batch)
+            if self._uncommitted <= 0 and self._queue.empty():
+                self._uncommitted = 0
+                self._spill.truncate(0)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["depth"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        stats["commit_time_avg"] = stats["commit_time_total"] / stats["batches"] if stats["batches"] else 0.0
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = FeedbackWriter()
+                writer.start()
+                _writer = writer
+    return _writer
+
+
+def submit(customer_name, customer_email, product_id, rating, comments):
+    return get_writer().submit(customer_name, customer_email, product_id, rating, comments)
+
+
+def stats():
+    return get_writer().stats()
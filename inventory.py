@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+from datetime import date, datetime
+
+import db
+import metrics
+
+# Take a new snapshot once this many log rows arrived since the last one
+SNAPSHOT_EVERY = int(os.environ.get("CRM_INVENTORY_SNAPSHOT_EVERY", "10000"))
+
+
+def create_ledger(c):
+    """
+    Opening balances, the running per-product ledger, snapshots and the
+    low-stock alert feed. Every product gets an opening balance when it is
+    inserted; existing products open at their current stock_quantity.
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_opening (
+        product_id INTEGER PRIMARY KEY,
+        quantity INTEGER NOT NULL,
+        opened_at TIMESTAMP NOT NULL
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_levels (
+        product_id INTEGER PRIMARY KEY,
+        quantity INTEGER NOT NULL
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_replay_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    c.execute("INSERT OR IGNORE INTO inventory_replay_state (name, value) VALUES ('last_log_id', 0)")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_snapshots (
+        id INTEGER PRIMARY KEY,
+        as_of TIMESTAMP NOT NULL,
+        last_log_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_as_of ON inventory_snapshots (as_of)")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_snapshot_levels (
+        snapshot_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, product_id)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_alerts (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        threshold INTEGER NOT NULL,
+        log_id INTEGER NOT NULL,
+        log_date TIMESTAMP,
+        raised_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS inventory_opening_ai AFTER INSERT ON products BEGIN
+        INSERT OR IGNORE INTO inventory_opening (product_id, quantity, opened_at)
+        VALUES (new.id, new.stock_quantity, COALESCE(new.created_at, CURRENT_TIMESTAMP));
+    END
+    ''')
+    # Existing products open no later than their first logged movement
+    c.execute('''
+    INSERT OR IGNORE INTO inventory_opening (product_id, quantity, opened_at)
+    SELECT p.id, p.stock_quantity,
+           COALESCE(MIN(COALESCE(p.created_at, CURRENT_TIMESTAMP), MIN(l.log_date)),
+                    p.created_at, CURRENT_TIMESTAMP)
+    FROM products p
+    LEFT JOIN inventory_log l ON l.product_id = p.id
+    GROUP BY p.id
+    ''')
+
+
+def _timestamp(value):
+    if value is None:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return f"{value.isoformat()} 23:59:59"
+    return datetime.fromisoformat(str(value)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def replay(conn=None, threshold=metrics.LOW_STOCK_THRESHOLD):
+    """
+    Apply inventory_log rows added since the last replay to the running
+    ledger, in log id order, raising an alert for every movement that takes
+    a product from above the threshold to at or below it. Takes a snapshot
+    when enough rows have accumulated. Returns the number of rows applied.
+    `conn` must not have a transaction open.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return replay(conn, threshold)
+
+    db.begin_immediate(conn)
+    try:
+        last = conn.execute("SELECT value FROM inventory_replay_state WHERE name = 'last_log_id'").fetchone()[0]
+        newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_log").fetchone()[0]
+
+        # Products opened since the last replay start from their opening balance
+        conn.execute('''
+        INSERT OR IGNORE INTO inventory_levels (product_id, quantity)
+        SELECT product_id, quantity FROM inventory_opening
+        ''')
+
+        if newest > last:
+            conn.execute('''
+            WITH moves AS (
+                SELECT l.id, l.product_id, l.quantity_change, l.log_date,
+                       COALESCE(v.quantity, 0)
+                       + SUM(l.quantity_change) OVER (PARTITION BY l.product_id ORDER BY l.id
+                                                  ROWS UNBOUNDED PRECEDING) AS level
+                FROM inventory_log l
+                LEFT JOIN inventory_levels v ON v.product_id = l.product_id
+                WHERE l.id > ? AND l.id <= ?
+            )
+            INSERT INTO inventory_alerts (product_id, level, threshold, log_id, log_date)
+            SELECT product_id, level, ?, id, log_date
+            FROM moves
+            WHERE level <= ? AND level - quantity_change > ?
+            ORDER BY id
+            ''', (last, newest, threshold, threshold, threshold))
+            conn.execute('''
+            INSERT INTO inventory_levels (product_id, quantity)
+            SELECT product_id, SUM(quantity_change)
+            FROM inventory_log
+            WHERE id > ? AND id <= ?
+            GROUP BY product_id
+            ON CONFLICT (product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (last, newest)).rowcount
+            conn.execute("UPDATE inventory_replay_state SET value = ? WHERE name = 'last_log_id'", (newest,))
+
+        since_snapshot = newest - conn.execute(
+            "SELECT COALESCE(MAX(last_log_id), 0) FROM inventory_snapshots").fetchone()[0]
+        if since_snapshot >= SNAPSHOT_EVERY:
+            _write_snapshot(conn, _timestamp(None))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return max(newest - last, 0)
+
+
+def _levels_as_of(conn, as_of, product_id=None, log_table="inventory_log"):
+    # Latest snapshot at or before as_of, plus movements dated after it and
+    # rows that arrived after it was taken but are dated before it
+    only = "AND product_id = :product_id" if product_id is not None else ""
+    params = {"as_of": as_of, "product_id": product_id}
+    snapshot = conn.execute('''
+    SELECT id, as_of, last_log_id FROM inventory_snapshots
+    WHERE as_of <= ? ORDER BY as_of DESC, id DESC LIMIT 1
+    ''', (as_of,)).fetchone()
+
+    if snapshot is None:
+        sql = f'''
+        SELECT product_id, SUM(quantity) FROM (
+            SELECT product_id, quantity FROM inventory_opening WHERE opened_at <= :as_of {only}
+            UNION ALL
+            SELECT product_id, quantity_change FROM {log_table} WHERE log_date <= :as_of {only}
+        ) GROUP BY product_id
+        '''
+    else:
+        params.update({"snapshot_id": snapshot[0], "taken_as_of": snapshot[1], "last_log_id": snapshot[2]})
+        sql = f'''
+        SELECT product_id, SUM(quantity) FROM (
+            SELECT product_id, quantity FROM inventory_snapshot_levels
+            WHERE snapshot_id = :snapshot_id {only}
+            UNION ALL
+            SELECT product_id, quantity FROM inventory_opening
+            WHERE opened_at <= :as_of {only}
+              AND product_id NOT IN (SELECT product_id FROM inventory_snapshot_levels
+                                     WHERE snapshot_id = :snapshot_id)
+            UNION ALL
+            SELECT product_id, quantity_change FROM {log_table}
+            WHERE log_date > :taken_as_of AND log_date <= :as_of {only}
+            UNION ALL
+            SELECT product_id, quantity_change FROM {log_table}
+            WHERE id > :last_log_id AND log_date <= :taken_as_of {only}
+        ) GROUP BY product_id
+        '''
+    return dict(conn.execute(sql, params).fetchall())
+
+
+def _write_snapshot(conn, as_of):
+    levels = _levels_as_of(conn, as_of)
+    newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_log").fetchone()[0]
+    snapshot_id = conn.execute("INSERT INTO inventory_snapshots (as_of, last_log_id) VALUES (?, ?)",
+                               (as_of, newest)).lastrowid
+    conn.executemany(
+        "INSERT INTO inventory_snapshot_levels (snapshot_id, product_id, quantity) VALUES (?, ?, ?)",
+        [(snapshot_id, product_id, quantity) for product_id, quantity in levels.items()])
+    return snapshot_id
+
+
+def snapshot(conn=None, as_of=None):
+    """
+    Record every product's stock level as of a point in time (default now).
+    `conn` must not have a transaction open.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return snapshot(conn, as_of)
+
+    db.begin_immediate(conn)
+    try:
+        snapshot_id = _write_snapshot(conn, _timestamp(as_of))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return snapshot_id
+
+
+def stock_as_of(conn, as_of=None, product_id=None):
+    """
+    Stock on hand per product at a point in time, from the opening balances
+    and inventory_log. A date means the end of that day. Returns
+    {product_id: quantity}.
+    """
+    # archive builds on this module, so it is imported only where needed
+    import archive
+
+    as_of = _timestamp(as_of)
+    horizon = archive.archived_until(conn)
+    if horizon is None or as_of >= horizon:
+        return _levels_as_of(conn, as_of, product_id)
+    # Archived month: the rollover leaves a snapshot at its start, so only
+    # that month's archive is attached
+    with archive.history(conn, as_of, as_of):
+        return _levels_as_of(conn, as_of, product_id, log_table="inventory_log_history")
+
+
+def reconcile(conn=None):
+    """
+    Compare the ledger with products.stock_quantity after replaying new log
+    rows. Returns the products whose two figures differ. Like replay, needs
+    a connection outside any transaction.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return reconcile(conn)
+
+    replay(conn)
+    rows = conn.execute('''
+    SELECT p.id, p.name, p.stock_quantity, COALESCE(v.quantity, 0) AS ledger
+    FROM products p
+    LEFT JOIN inventory_levels v ON v.product_id = p.id
+    WHERE p.stock_quantity IS NOT COALESCE(v.quantity, 0)
+    ORDER BY ABS(p.stock_quantity - COALESCE(v.quantity, 0)) DESC
+    ''').fetchall()
+    return [{"id": row[0], "name": row[1], "stock_quantity": row[2], "ledger": row[3],
+             "difference": row[2] - row[3]} for row in rows]
+
+
+def low_stock_alerts(conn, after_id=0, limit=50):
+    """
+    Newest low-stock alerts first; pass the highest id already seen as
+    after_id to read only new ones
+    """
+    rows = conn.execute('''
+    SELECT a.id, a.product_id, p.name, a.level, a.threshold, a.log_date, a.raised_at
+    FROM inventory_alerts a
+    LEFT JOIN products p ON p.id = a.product_id
+    WHERE a.id > ?
+    ORDER BY a.id DESC
+    LIMIT ?
+    ''', (after_id, limit)).fetchall()
+    keys = ("id", "product_id", "name", "level", "threshold", "log_date", "raised_at")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay inventory_log and reconcile stock levels")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    parser.add_argument("--snapshot", action="store_true", help="record a snapshot after replaying")
+    parser.add_argument("--as-of", help="print stock levels as of this date or timestamp")
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            applied = replay(conn)
+            print(f"Replayed {applied:,} inventory_log rows")
+            if args.snapshot:
+                print(f"Recorded snapshot {snapshot(conn)}")
+            if args.as_of:
+                for product_id, quantity in sorted(stock_as_of(conn, args.as_of).items()):
+                    print(f"{product_id:>8} {quantity:>10}")
+            drift = reconcile(conn)
+    finally:
+        pool.close()
+
+    for row in drift:
+        print(f"DRIFT  product {row['id']} ({row['name']}): stock_quantity {row['stock_quantity']}, "
+              f"ledger {row['ledger']} ({row['difference']:+d})")
+    print(f"{len(drift)} products differ from the ledger")
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
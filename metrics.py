@@ -0,0 +1,247 @@
+import os
+from datetime import date, timedelta
+
+# Products at or below this stock level count as low stock
+LOW_STOCK_THRESHOLD = int(os.environ.get("CRM_LOW_STOCK_THRESHOLD", "10"))
+
+# Sales rollup trigger bodies: add the new row, subtract the old one. The
+# last sale is read back from the (product_id, sale_date) index, like the
+# rebuild does.
+ADD_SALE = '''
+        INSERT INTO sales_daily (day, product_id, units, revenue, orders)
+        VALUES (date(NEW.sale_date), NEW.product_id, NEW.quantity, NEW.total_price, 1)
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue,
+            orders = orders + 1;
+        INSERT INTO product_sales_summary (product_id, units, revenue, orders, last_sale)
+        VALUES (NEW.product_id, NEW.quantity, NEW.total_price, 1, NEW.sale_date)
+        ON CONFLICT (product_id) DO UPDATE SET
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue,
+            orders = orders + 1,
+            last_sale = MAX(COALESCE(last_sale, ''), excluded.last_sale);
+        UPDATE metric_totals SET value = value + NEW.total_price WHERE name = 'revenue';
+        UPDATE metric_totals SET value = value + NEW.quantity WHERE name = 'units';
+        UPDATE metric_totals SET value = value + 1 WHERE name = 'orders';
+'''
+REMOVE_SALE = '''
+        UPDATE sales_daily SET
+            units = units - OLD.quantity,
+            revenue = revenue - OLD.total_price,
+            orders = orders - 1
+        WHERE day = date(OLD.sale_date) AND product_id = OLD.product_id;
+        UPDATE product_sales_summary SET
+            units = units - OLD.quantity,
+            revenue = revenue - OLD.total_price,
+            orders = orders - 1,
+            last_sale = (SELECT MAX(sale_date) FROM sales WHERE product_id = OLD.product_id)
+        WHERE product_id = OLD.product_id;
+        UPDATE metric_totals SET value = value - OLD.total_price WHERE name = 'revenue';
+        UPDATE metric_totals SET value = value - OLD.quantity WHERE name = 'units';
+        UPDATE metric_totals SET value = value - 1 WHERE name = 'orders';
+'''
+
+
+def create_rollups(c):
+    """
+    Create the sales and feedback summary tables, the triggers that keep them
+    current on every write, and backfill them from existing rows
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        units INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_id)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS product_sales_summary (
+        product_id INTEGER PRIMARY KEY,
+        units INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        last_sale TIMESTAMP
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS feedback_summary (
+        product_id INTEGER PRIMARY KEY,
+        ratings INTEGER NOT NULL DEFAULT 0,
+        rating_sum INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    # Whole-database totals, one row per metric
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS metric_totals (
+        name TEXT PRIMARY KEY,
+        value REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_product_sales_summary_revenue ON product_sales_summary (revenue)")
+
+    create_sale_triggers(c)
+    create_product_count(c)
+
+    # Feedback rollups
+    add_feedback = '''
+        INSERT INTO feedback_summary (product_id, ratings, rating_sum)
+        VALUES (COALESCE(NEW.product_id, 0), 1, NEW.rating)
+        ON CONFLICT (product_id) DO UPDATE SET
+            ratings = ratings + 1,
+            rating_sum = rating_sum + excluded.rating_sum;
+        UPDATE metric_totals SET value = value + 1 WHERE name = 'feedback_count';
+        UPDATE metric_totals SET value = value + NEW.rating WHERE name = 'rating_sum';
+    '''
+    remove_feedback = '''
+        UPDATE feedback_summary SET
+            ratings = ratings - 1,
+            rating_sum = rating_sum - OLD.rating
+        WHERE product_id = COALESCE(OLD.product_id, 0);
+        UPDATE metric_totals SET value = value - 1 WHERE name = 'feedback_count';
+        UPDATE metric_totals SET value = value - OLD.rating WHERE name = 'rating_sum';
+    '''
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS feedback_rollup_ai AFTER INSERT ON feedback BEGIN {add_feedback} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS feedback_rollup_ad AFTER DELETE ON feedback BEGIN {remove_feedback} END")
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS feedback_rollup_au
+    AFTER UPDATE OF product_id, rating ON feedback BEGIN
+        {remove_feedback}
+        {add_feedback}
+    END
+    ''')
+
+    rebuild_rollups(c)
+
+
+def create_sale_triggers(c):
+    """
+    (Re)create the sales rollup triggers from ADD_SALE and REMOVE_SALE
+    """
+    for name in ("sales_rollup_ai", "sales_rollup_ad", "sales_rollup_au"):
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+    c.execute(f"CREATE TRIGGER sales_rollup_ai AFTER INSERT ON sales BEGIN {ADD_SALE} END")
+    c.execute(f"CREATE TRIGGER sales_rollup_ad AFTER DELETE ON sales BEGIN {REMOVE_SALE} END")
+    c.execute(f'''
+    CREATE TRIGGER sales_rollup_au
+    AFTER UPDATE OF product_id, quantity, total_price, sale_date ON sales BEGIN
+        {REMOVE_SALE}
+        {ADD_SALE}
+    END
+    ''')
+
+
+def create_product_count(c):
+    """
+    Keep the number of products in metric_totals with triggers on products
+    """
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_count_ai AFTER INSERT ON products BEGIN
+        UPDATE metric_totals SET value = value + 1 WHERE name = 'products';
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_count_ad AFTER DELETE ON products BEGIN
+        UPDATE metric_totals SET value = value - 1 WHERE name = 'products';
+    END
+    ''')
+    c.execute("INSERT OR REPLACE INTO metric_totals (name, value) SELECT 'products', COUNT(*) FROM products")
+
+
+def rebuild_rollups(c):
+    """
+    Recompute every summary table from the base tables
+    """
+    c.execute("DELETE FROM sales_daily")
+    c.execute('''
+    INSERT INTO sales_daily (day, product_id, units, revenue, orders)
+    SELECT date(sale_date), product_id, SUM(quantity), SUM(total_price), COUNT(*)
+    FROM sales GROUP BY date(sale_date), product_id
+    ''')
+    c.execute("DELETE FROM product_sales_summary")
+    c.execute('''
+    INSERT INTO product_sales_summary (product_id, units, revenue, orders, last_sale)
+    SELECT product_id, SUM(quantity), SUM(total_price), COUNT(*), MAX(sale_date)
+    FROM sales GROUP BY product_id
+    ''')
+    c.execute("DELETE FROM feedback_summary")
+    c.execute('''
+    INSERT INTO feedback_summary (product_id, ratings, rating_sum)
+    SELECT COALESCE(product_id, 0), COUNT(*), SUM(rating)
+    FROM feedback GROUP BY COALESCE(product_id, 0)
+    ''')
+    c.execute("DELETE FROM metric_totals")
+    c.execute('''
+    INSERT INTO metric_totals (name, value)
+    SELECT 'revenue', COALESCE(SUM(revenue), 0) FROM product_sales_summary
+    UNION ALL SELECT 'units', COALESCE(SUM(units), 0) FROM product_sales_summary
+    UNION ALL SELECT 'orders', COALESCE(SUM(orders), 0) FROM product_sales_summary
+    UNION ALL SELECT 'feedback_count', COALESCE(SUM(ratings), 0) FROM feedback_summary
+    UNION ALL SELECT 'rating_sum', COALESCE(SUM(rating_sum), 0) FROM feedback_summary
+    UNION ALL SELECT 'products', COUNT(*) FROM products
+    ''')
+
+
+def summary(conn, low_stock_threshold=LOW_STOCK_THRESHOLD):
+    """
+    Headline dashboard numbers, read from the rollups
+    """
+    totals = dict(conn.execute("SELECT name, value FROM metric_totals"))
+    feedback_count = int(totals.get("feedback_count", 0))
+    low_stock = conn.execute(
+        "SELECT COUNT(*) FROM products WHERE stock_quantity <= ?", (low_stock_threshold,)
+    ).fetchone()[0]
+    return {
+        "products": int(totals.get("products", 0)),
+        "revenue": totals.get("revenue", 0.0),
+        "units": int(totals.get("units", 0)),
+        "orders": int(totals.get("orders", 0)),
+        "feedback_count": feedback_count,
+        "average_rating": totals.get("rating_sum", 0) / feedback_count if feedback_count else None,
+        "low_stock": low_stock,
+    }
+
+
+def top_products(conn, limit=5, by="revenue"):
+    # CROSS JOIN pins the summary as the outer loop so the LIMIT walks its index
+    if by not in ("revenue", "units", "orders"):
+        raise ValueError(f"Unknown ranking column: {by}")
+    rows = conn.execute(f'''
+    SELECT p.id, p.name, p.category, s.units, s.revenue, s.orders
+    FROM product_sales_summary s
+    CROSS JOIN products p ON p.id = s.product_id
+    WHERE s.orders > 0
+    ORDER BY s.{by} DESC
+    LIMIT ?
+    ''', (limit,)).fetchall()
+    keys = ("id", "name", "category", "units", "revenue", "orders")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def daily_revenue(conn, days=30, today=None):
+    """
+    Revenue and units per day over the last `days` days
+    """
+    start = ((today or date.today()) - timedelta(days=days - 1)).isoformat()
+    rows = conn.execute('''
+    SELECT day, SUM(revenue), SUM(units), SUM(orders)
+    FROM sales_daily
+    WHERE day >= ?
+    GROUP BY day
+    ORDER BY day
+    ''', (start,)).fetchall()
+    return [{"day": row[0], "revenue": row[1], "units": row[2], "orders": row[3]} for row in rows]
+
+
+def low_stock_products(conn, threshold=LOW_STOCK_THRESHOLD, limit=10):
+    rows = conn.execute('''
+    SELECT id, name, category, stock_quantity
+    FROM products
+    WHERE stock_quantity <= ?
+    ORDER BY stock_quantity
+    LIMIT ?
+    ''', (threshold, limit)).fetchall()
+    return [dict(zip(("id", "name", "category", "stock_quantity"), row)) for row in rows]
@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import sys
+
+import archive
+import auth
+import customers
+import db
+import feedback_queue
+import inventory
+import metrics
+import recommend
+import search
+import sentiment
+import table_stats
+
+# Ordered schema migrations. Each step runs once per database, in its own
+# transaction, and is recorded in the schema_version table.
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return register
+
+
+@migration(1, "initial schema")
+def _initial_schema(c):
+    # Create users table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Create products table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        category TEXT,
+        price REAL NOT NULL,
+        stock_quantity INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Create feedback table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY,
+        customer_name TEXT NOT NULL,
+        customer_email TEXT NOT NULL,
+        product_id INTEGER,
+        rating INTEGER NOT NULL,
+        comments TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+    # Create sales table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        total_price REAL NOT NULL,
+        customer_name TEXT,
+        customer_email TEXT,
+        sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+    # Create inventory_log table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_log (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        quantity_change INTEGER NOT NULL,
+        reason TEXT,
+        log_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+
+@migration(2, "default admin user")
+def _default_admin(c):
+    c.execute("SELECT 1 FROM users WHERE username = 'admin'")
+    if not c.fetchone():
+        hashed_password = hashlib.sha256("password".encode()).hexdigest()
+        c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                  ("admin", hashed_password, "admin"))
+
+
+@migration(3, "sample catalog data")
+def _sample_data(c):
+    c.execute("SELECT 1 FROM products LIMIT 1")
+    if c.fetchone():
+        return
+
+    sample_products = [
+        ("Laptop Pro", "High-performance laptop for professionals", "Electronics", 1299.99, 50),
+        ("Office Chair", "Ergonomic office chair", "Furniture", 249.99, 100),
+        ("CRM Software Premium", "Enterprise CRM solution", "Software", 499.99, 999),
+        ("Business Phone", "Professional business phone system", "Electronics", 299.99, 75),
+        ("Marketing Services", "Digital marketing service package", "Services", 999.99, 999),
+        ("Desk Organizer", "Premium desk organizer set", "Office Supplies", 49.99, 200),
+        ("Conference Table", "Large conference room table", "Furniture", 899.99, 20),
+        ("Wireless Headset", "Professional wireless headset", "Electronics", 129.99, 150),
+        ("Project Management Tool", "Cloud-based project management software", "Software", 299.99, 999),
+        ("Customer Support Package", "Premium customer support service", "Services", 799.99, 999)
+    ]
+    c.executemany("INSERT INTO products (name, description, category, price, stock_quantity) VALUES (?, ?, ?, ?, ?)",
+                  sample_products)
+
+    # Insert sample sales data
+    sample_sales = [
+        (1, 2, 2599.98, "John Smith", "john@example.com", "2025-03-15 09:30:00"),
+        (3, 1, 499.99, "Sarah Johnson", "sarah@example.com", "2025-03-16 14:20:00"),
+        (2, 4, 999.96, "Michael Brown", "michael@example.com", "2025-03-18 11:45:00"),
+        (5, 1, 999.99, "Emma Wilson", "emma@example.com", "2025-03-20 16:30:00"),
+        (8, 2, 259.98, "David Lee", "david@example.com", "2025-03-22 10:15:00"),
+        (4, 1, 299.99, "Lisa Wang", "lisa@example.com", "2025-03-25 13:40:00"),
+        (7, 1, 899.99, "Robert Garcia", "robert@example.com", "2025-03-28 15:55:00")
+    ]
+    c.executemany("INSERT INTO sales (product_id, quantity, total_price, customer_name, customer_email, sale_date) VALUES (?, ?, ?, ?, ?, ?)",
+                  sample_sales)
+
+    # Insert sample inventory log data
+    sample_inventory_logs = [
+        (1, -2, "Sale to John Smith", "2025-03-15 09:30:00"),
+        (3, -1, "Sale to Sarah Johnson", "2025-03-16 14:20:00"),
+        (6, 50, "Restocked inventory", "2025-03-17 08:00:00"),
+        (2, -4, "Sale to Michael Brown", "2025-03-18 11:45:00"),
+        (5, -1, "Sale to Emma Wilson", "2025-03-20 16:30:00"),
+        (8, -2, "Sale to David Lee", "2025-03-22 10:15:00"),
+        (4, -1, "Sale to Lisa Wang", "2025-03-25 13:40:00"),
+        (7, -1, "Sale to Robert Garcia", "2025-03-28 15:55:00"),
+        (9, 100, "Restocked inventory", "2025-04-01 09:00:00"),
+        (2, 25, "Restocked inventory", "2025-04-02 10:30:00")
+    ]
+    c.executemany("INSERT INTO inventory_log (product_id, quantity_change, reason, log_date) VALUES (?, ?, ?, ?)",
+                  sample_inventory_logs)
+
+
+# Secondary indexes managed by the schema code: (name, table, columns)
+INDEXES = [
+    ("idx_products_category", "products", "category"),
+    ("idx_products_stock_quantity", "products", "stock_quantity"),
+    ("idx_sales_product_date", "sales", "product_id, sale_date"),
+    ("idx_sales_sale_date", "sales", "sale_date"),
+    ("idx_feedback_product_id", "feedback", "product_id"),
+    ("idx_inventory_log_product_date", "inventory_log", "product_id, log_date"),
+    ("idx_inventory_log_log_date", "inventory_log", "log_date"),
+]
+
+
+def ensure_indexes(c):
+    for name, table, columns in INDEXES:
+        c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def drop_indexes(c):
+    for name, _, _ in INDEXES:
+        c.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def missing_indexes(conn):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    return [index for index in INDEXES if index[0] not in existing]
+
+
+@migration(4, "foreign key and date indexes")
+def _managed_indexes(c):
+    ensure_indexes(c)
+    # Give the planner statistics for the new indexes
+    c.execute("ANALYZE")
+
+
+@migration(5, "product full-text search")
+def _products_fts(c):
+    # Without FTS5 compiled in, product search keeps using LIKE
+    if search.fts5_available(c.connection):
+        search.create_products_fts(c)
+
+
+@migration(6, "sales and feedback rollups")
+def _rollups(c):
+    ensure_indexes(c)
+    metrics.create_rollups(c)
+
+
+@migration(7, "feedback submission ids")
+def _feedback_submission_ids(c):
+    feedback_queue.add_submission_ids(c)
+
+
+@migration(8, "table statistics")
+def _table_stats(c):
+    table_stats.create_stats_table(c)
+
+
+@migration(9, "inventory ledger")
+def _inventory_ledger(c):
+    inventory.create_ledger(c)
+
+
+@migration(10, "archive partitions")
+def _archive_partitions(c):
+    archive.create_archive_catalog(c)
+
+
+@migration(11, "feedback sentiment")
+def _feedback_sentiment(c):
+    sentiment.create_sentiment_tables(c)
+
+
+@migration(12, "product neighbors")
+def _product_neighbors(c):
+    recommend.create_neighbor_tables(c)
+
+
+@migration(13, "customer index")
+def _customer_index(c):
+    customers.create_customer_tables(c)
+
+
+@migration(14, "session revocations")
+def _session_revocations(c):
+    auth.create_revocation_table(c)
+
+
+@migration(15, "product count and last sale rollups")
+def _rollup_triggers(c):
+    metrics.create_sale_triggers(c)
+    # Put back the archiving guard on the delete trigger
+    archive.create_archive_catalog(c)
+    metrics.create_product_count(c)
+
+
+@migration(16, "stored table sizes")
+def _table_sizes(c):
+    table_stats.create_stats_table(c)
+
+
+def _ensure_version_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [step for step in MIGRATIONS if step[0] > version]
+
+
+def migrate(conn=None):
+    """
+    Apply every pending migration and return the list of versions applied
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return migrate(conn)
+
+    if not pending_migrations(conn):
+        return []
+
+    applied = []
+    for version, name, func in MIGRATIONS:
+        # Take the write lock before re-checking so concurrent processes
+        # starting up together apply each step exactly once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _ensure_version_table(conn)
+            done = conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone()
+            if not done:
+                func(conn.cursor())
+                conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply CRM database schema migrations")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    parser.add_argument("--status", action="store_true", help="list pending migrations without applying them")
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            if args.status:
+                pending = pending_migrations(conn)
+                print(f"Current schema version: {current_version(conn)}")
+                for version, name, _ in pending:
+                    print(f"  pending: {version:>3}  {name}")
+                if not pending:
+                    print("Schema is up to date.")
+                return 0
+
+            applied = migrate(conn)
+            for version, name, _ in MIGRATIONS:
+                if version in applied:
+                    print(f"  applied: {version:>3}  {name}")
+            print(f"Schema version: {current_version(conn)}")
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+import bisect
+import collections
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Profiler settings (overridable through the environment). SQL statement
+# timing wraps every cursor, so it is off unless CRM_PROFILE=1.
+ENABLED = os.environ.get("CRM_PROFILE", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("CRM_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.environ.get("CRM_SLOW_QUERY_LOG", "")
+SAMPLE_SIZE = 1024
+SLOW_LOG_SIZE = 200
+MAX_STATEMENTS = 500
+
+# Histogram bucket upper bounds in seconds, for the Prometheus export
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(sql):
+    """
+    Collapse whitespace and replace literals with ? so statements that only
+    differ in their values share one histogram
+    """
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip().rstrip(";")
+
+
+class Histogram:
+    """
+    Latency distribution: fixed buckets plus a bounded sample of recent
+    observations for percentiles
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sample = collections.deque(maxlen=SAMPLE_SIZE)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sample.append(seconds)
+
+    def percentile(self, p):
+        if not self.sample:
+            return 0.0
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Profiler:
+    """
+    Process-wide timings for SQL statements, data functions and page reruns
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.traced = collections.Counter()
+            self.functions = {}
+            self.pages = {}
+            self.page_sql = collections.Counter()
+            self.page_statements = collections.Counter()
+            self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+            self.examples = {}
+            self.started = time.time()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            if table is self.statements and len(table) >= MAX_STATEMENTS:
+                key = "(other statements)"
+                histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = Histogram()
+        return histogram
+
+    def set_page(self, page):
+        self._local.page = page
+
+    def current_page(self):
+        return getattr(self._local, "page", None)
+
+    def begin_rerun(self, page, fragment=None, started=None):
+        """
+        Start timing a script run on this thread, or with `fragment` a rerun
+        of just that fragment (recorded as "page/fragment"), and counting
+        the SQL statements it executes
+        """
+        key = page if fragment is None else f"{page}/{fragment}"
+        self._local.page = key
+        self._local.rerun = {"page": key, "statements": 0,
+                             "started": time.perf_counter() if started is None else started}
+
+    def in_rerun(self):
+        return getattr(self._local, "rerun", None) is not None
+
+    def rerun_stats(self):
+        """
+        {page, seconds, statements} of the run in progress so far
+        """
+        rerun = self._local.rerun
+        return {"page": rerun["page"], "seconds": time.perf_counter() - rerun["started"],
+                "statements": rerun["statements"]}
+
+    def end_rerun(self):
+        """
+        Record the run in progress with the page timings; returns its stats
+        """
+        if not self.in_rerun():
+            return None
+        stats = self.rerun_stats()
+        self._local.rerun = None
+        with self._lock:
+            self._histogram(self.pages, stats["page"]).observe(stats["seconds"])
+            self.page_statements[stats["page"]] += stats["statements"]
+        return stats
+
+    def trace(self, sql):
+        # sqlite3 trace callback: sees every statement SQLite runs, including
+        # trigger bodies ("-- TRIGGER name") and executescript() statements
+        if getattr(self._local, "bulk", None) is not None and not sql.startswith(("--", "BEGIN")):
+            # One executemany() row with its values expanded into the SQL;
+            # normalizing each would defeat the cache, so only count it
+            self._local.bulk_rows += 1
+            return
+        self.count_traced(sql)
+
+    def count_traced(self, sql, count=1):
+        key = normalize(sql)
+        with self._lock:
+            if key not in self.traced and len(self.traced) >= MAX_STATEMENTS:
+                key = "(other statements)"
+            self.traced[key] += count
+
+    def begin_bulk(self, sql):
+        self._local.bulk = sql
+        self._local.bulk_rows = 0
+
+    def end_bulk(self):
+        sql, rows = self._local.bulk, self._local.bulk_rows
+        self._local.bulk = None
+        if rows:
+            self.count_traced(sql, rows)
+
+    def begin_function(self, name):
+        """
+        Mark the outermost data function running on this thread; returns
+        False when one is already running
+        """
+        if getattr(self._local, "function", None) is not None:
+            return False
+        self._local.function = name
+        return True
+
+    def end_function(self):
+        self._local.function = None
+
+    def record_statement(self, sql, seconds, parameters=None):
+        key = normalize(sql)
+        page = self.current_page()
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None:
+            rerun["statements"] += 1
+        function = getattr(self._local, "function", None)
+        with self._lock:
+            self._histogram(self.statements, key).observe(seconds)
+            # Keep the first call of each query a data function makes, with
+            # its parameters, for the query plan audit
+            if (function and key not in self.examples and len(self.examples) < MAX_STATEMENTS
+                    and key.upper().startswith(("SELECT", "WITH"))):
+                self.examples[key] = (function, sql, parameters)
+            if page:
+                self.page_sql[page] += seconds
+            slow = seconds * 1000 >= self.slow_query_ms
+            if slow:
+                entry = {
+                    "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "ms": round(seconds * 1000, 3),
+                    "page": page,
+                    "sql": _SPACE.sub(" ", sql).strip(),
+                }
+                self.slow.appendleft(entry)
+        if slow and self.slow_query_log:
+            with open(self.slow_query_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def record_function(self, name, seconds):
+        with self._lock:
+            self._histogram(self.functions, name).observe(seconds)
+
+    def record_page(self, page, seconds):
+        with self._lock:
+            self._histogram(self.pages, page).observe(seconds)
+
+    def queries(self):
+        """
+        {name: (sql, parameters)} of the queries data functions have run,
+        named after the function and the normalized statement
+        """
+        with self._lock:
+            examples = list(self.examples.items())
+        return {f"{function}: {key}": (sql, parameters) for key, (function, sql, parameters) in examples}
+
+    def snapshot(self):
+        with self._lock:
+            statements = [
+                dict(statement=key, traced=self.traced.get(key, 0), **histogram.summary())
+                for key, histogram in self.statements.items()
+            ]
+            functions = [dict(function=key, **h.summary()) for key, h in self.functions.items()]
+            pages = [
+                dict(page=key, sql_total=self.page_sql.get(key, 0.0), statements=self.page_statements.get(key, 0),
+                     **h.summary())
+                for key, h in self.pages.items()
+            ]
+            slow = list(self.slow)
+            traced_total = sum(self.traced.values())
+        statements.sort(key=lambda row: row["total"], reverse=True)
+        functions.sort(key=lambda row: row["total"], reverse=True)
+        pages.sort(key=lambda row: row["total"], reverse=True)
+        return {
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "slow_query_ms": self.slow_query_ms,
+            "traced_statements": traced_total,
+            "statements": statements,
+            "functions": functions,
+            "pages": pages,
+            "slow_queries": slow,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition format, one histogram family per kind
+        """
+        lines = []
+        with self._lock:
+            families = [
+                ("crm_sql_statement_duration_seconds", "Execution time of SQL statements", "statement",
+                 self.statements),
+                ("crm_data_function_duration_seconds", "Wall time of data-access functions", "function",
+                 self.functions),
+                ("crm_page_rerun_duration_seconds", "Wall time of Streamlit page reruns", "page",
+                 self.pages),
+            ]
+            for name, help_text, label, table in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in table.items():
+                    value = _label(key)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.buckets):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label}="{value}",le="{bound:g}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+            lines.append("# HELP crm_page_sql_statements_total SQL statements executed by page reruns")
+            lines.append("# TYPE crm_page_sql_statements_total counter")
+            for key, count in self.page_statements.items():
+                lines.append(f'crm_page_sql_statements_total{{page="{_label(key)}"}} {count}')
+            lines.append("# HELP crm_slow_queries_logged Slow statements currently in the log")
+            lines.append("# TYPE crm_slow_queries_logged gauge")
+            lines.append(f"crm_slow_queries_logged {len(self.slow)}")
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_profiler = Profiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that times execute() and executemany(). The time covers
+    preparing the statement and stepping to the first row; fetches made
+    afterwards are counted by the enclosing data function's timing.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _profiler.record_statement(sql, time.perf_counter() - started, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        _profiler.begin_bulk(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _profiler.end_bulk()
+            _profiler.record_statement(sql, time.perf_counter() - started)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including the ones behind the execute()
+    shortcuts, are ProfiledCursors
+    """
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def instrument(conn):
+    """
+    Hook the trace callback up to a new connection
+    """
+    conn.set_trace_callback(_profiler.trace)
+    return conn
+
+
+def timed(func):
+    """
+    Record the wall time of a data function under its name
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outermost = _profiler.begin_function(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if outermost:
+                _profiler.end_function()
+            _profiler.record_function(func.__name__, time.perf_counter() - started)
+    return wrapper
+
+
+def set_page(page):
+    _profiler.set_page(page)
+
+
+def record_page(page, seconds):
+    _profiler.record_page(page, seconds)
+
+
+def begin_rerun(page, fragment=None, started=None):
+    _profiler.begin_rerun(page, fragment, started)
+
+
+def in_rerun():
+    return _profiler.in_rerun()
+
+
+def rerun_stats():
+    return _profiler.rerun_stats()
+
+
+def end_rerun():
+    return _profiler.end_rerun()
+
+
+def queries():
+    return _profiler.queries()
+
+
+def snapshot():
+    return _profiler.snapshot()
+
+
+def reset():
+    _profiler.reset()
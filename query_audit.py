@@ -0,0 +1,264 @@
+import argparse
+import re
+import sys
+
+import db
+import migrations
+import profiler
+
+# The app's own SQL, with representative parameters, checked by the audit.
+# Data functions that add new statements should register them here; with
+# the profiler on, the queries data functions actually ran are audited too.
+APP_QUERIES = {
+    "authenticate": (
+        "SELECT id, password, role FROM users WHERE username = ?",
+        ("admin",),
+    ),
+    "get_products (category)": (
+        "SELECT * FROM products WHERE category = ?",
+        ("Electronics",),
+    ),
+    "get_products (search)": (
+        "SELECT p.* FROM products_fts JOIN products p ON p.id = products_fts.rowid "
+        "WHERE products_fts MATCH ? AND p.category = ? ORDER BY bm25(products_fts)",
+        ('"lap"*', "Electronics"),
+    ),
+    "get_product_by_id": (
+        "SELECT * FROM products WHERE id = ?",
+        (1,),
+    ),
+    "get_product_categories": (
+        "SELECT DISTINCT category FROM products",
+        (),
+    ),
+    "sales for product": (
+        "SELECT * FROM sales WHERE product_id = ?",
+        (1,),
+    ),
+    "sales in date range": (
+        "SELECT * FROM sales WHERE sale_date >= ? AND sale_date < ?",
+        ("2025-03-01", "2025-04-01"),
+    ),
+    "product sales in date range": (
+        "SELECT SUM(quantity), SUM(total_price) FROM sales "
+        "WHERE product_id = ? AND sale_date >= ? AND sale_date < ?",
+        (1, "2025-03-01", "2025-04-01"),
+    ),
+    "dashboard top products": (
+        "SELECT p.id, p.name FROM product_sales_summary s CROSS JOIN products p ON p.id = s.product_id "
+        "WHERE s.orders > 0 ORDER BY s.revenue DESC LIMIT ?",
+        (5,),
+    ),
+    "dashboard daily revenue": (
+        "SELECT day, SUM(revenue) FROM sales_daily WHERE day >= ? GROUP BY day ORDER BY day",
+        ("2025-03-01",),
+    ),
+    "dashboard low stock": (
+        "SELECT COUNT(*) FROM products WHERE stock_quantity <= ?",
+        (10,),
+    ),
+    "recent products": (
+        "SELECT * FROM products ORDER BY id DESC LIMIT ?",
+        (5,),
+    ),
+    "feedback for product": (
+        "SELECT rating, comments FROM feedback WHERE product_id = ?",
+        (1,),
+    ),
+    "inventory for product": (
+        "SELECT * FROM inventory_log WHERE product_id = ? ORDER BY log_date",
+        (1,),
+    ),
+    "inventory in date range": (
+        "SELECT * FROM inventory_log WHERE log_date >= ? AND log_date < ?",
+        ("2025-03-01", "2025-04-01"),
+    ),
+    "analytics extract": (
+        "SELECT id, product_id, quantity, total_price, customer_email, sale_date FROM sales "
+        "WHERE id > ? AND product_id IS NOT NULL ORDER BY id",
+        (0,),
+    ),
+    "inventory stock as of": (
+        "SELECT product_id, SUM(quantity) FROM ("
+        "SELECT product_id, quantity FROM inventory_snapshot_levels WHERE snapshot_id = :snapshot_id "
+        "UNION ALL SELECT product_id, quantity_change FROM inventory_log "
+        "WHERE log_date > :taken_as_of AND log_date <= :as_of) GROUP BY product_id",
+        {"snapshot_id": 1, "taken_as_of": "2025-03-01", "as_of": "2025-03-15"},
+    ),
+    "inventory snapshot before": (
+        "SELECT id, as_of, last_log_id FROM inventory_snapshots WHERE as_of <= ? ORDER BY as_of DESC, id DESC LIMIT 1",
+        ("2025-03-15",),
+    ),
+    "inventory reconciliation": (
+        "SELECT p.id, p.stock_quantity, COALESCE(v.quantity, 0) FROM products p "
+        "LEFT JOIN inventory_levels v ON v.product_id = p.id WHERE p.stock_quantity IS NOT COALESCE(v.quantity, 0)",
+        (),
+    ),
+    "low stock alerts": (
+        "SELECT a.id, p.name FROM inventory_alerts a LEFT JOIN products p ON p.id = a.product_id "
+        "WHERE a.id > ? ORDER BY a.id DESC LIMIT ?",
+        (0, 50),
+    ),
+    "archive partitions": (
+        "SELECT month, path FROM archive_partitions "
+        "WHERE (? IS NULL OR month >= substr(?, 1, 7)) AND (? IS NULL OR month <= substr(?, 1, 7)) ORDER BY month",
+        ("2025-01-01", "2025-01-01", "2025-03-31", "2025-03-31"),
+    ),
+    "unscored feedback": (
+        "SELECT COUNT(*) FROM feedback WHERE id > ?",
+        (0,),
+    ),
+    "product sentiment": (
+        "SELECT product_id, SUM(scored), SUM(compound_sum) FROM sentiment_summary WHERE product_id = ? "
+        "GROUP BY product_id",
+        (1,),
+    ),
+    "also bought": (
+        "SELECT n.neighbor_id, p.name, n.score FROM product_neighbors n JOIN products p ON p.id = n.neighbor_id "
+        "WHERE n.product_id IN (?) AND n.rank <= ? ORDER BY n.product_id, n.rank",
+        (1, 5),
+    ),
+    "new sales to recommend from": (
+        "SELECT DISTINCT lower(trim(s.customer_email)), s.product_id FROM sales s "
+        "WHERE s.id > ? AND s.id <= ? AND s.product_id IS NOT NULL",
+        (0, 1000),
+    ),
+    "customer search": (
+        "SELECT email, name FROM customers WHERE (email >= ?1 AND email < ?2) OR (name_key >= ?1 AND name_key < ?2) "
+        "ORDER BY lifetime_value DESC LIMIT ?3",
+        ("john", "john\U0010ffff", 20),
+    ),
+    "top customers": (
+        "SELECT email, name FROM customers ORDER BY lifetime_value DESC LIMIT ?",
+        (20,),
+    ),
+    "customer by email": (
+        "SELECT * FROM customers WHERE email = ?",
+        ("john@example.com",),
+    ),
+    "customer recent orders": (
+        "SELECT s.id, s.sale_date FROM sales s WHERE lower(trim(s.customer_email)) = ? ORDER BY s.sale_date DESC LIMIT ?",
+        ("john@example.com", 20),
+    ),
+    "customer recent feedback": (
+        "SELECT f.id, f.created_at FROM feedback f WHERE lower(trim(f.customer_email)) = ? "
+        "ORDER BY f.created_at DESC LIMIT ?",
+        ("john@example.com", 20),
+    ),
+}
+
+# Queries allowed to scan: each reads a table whose size is bounded, or
+# stops after a LIMIT the plan doesn't show
+BOUNDED_SCANS = {
+    # Walks rowid order and stops at the LIMIT
+    "recent products",
+    # One pass over products' category index; cached until products change
+    "get_product_categories",
+    # Compares every product with the ledger by design
+    "inventory reconciliation",
+    # One catalog row per archived month
+    "archive partitions",
+}
+
+
+def explain(conn, sql, params=()):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[3] for row in rows]
+
+
+def derived_tables(plan):
+    # Subqueries and CTEs the plan builds as co-routines or materializes;
+    # scanning one reads the intermediate result, not a table
+    return {detail.split(" ", 1)[1] for detail in plan if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+
+
+def has_limit(sql):
+    return re.search(r"\bLIMIT\b", sql, re.IGNORECASE) is not None
+
+
+def is_full_scan(detail, derived=(), limited=False):
+    # "SCAN products" reads every row, and so does "SCAN ... USING [COVERING]
+    # INDEX" unless a LIMIT stops the ordered index walk early. "SCAN CONSTANT
+    # ROW" has no table behind it, and an FTS5 virtual table scan with an M
+    # (MATCH) constraint is an index lookup. SQLite's own schema and
+    # statistics tables have no indexes to use.
+    if not detail.startswith("SCAN ") or "CONSTANT ROW" in detail:
+        return False
+    table = detail.split()[1]
+    if table.startswith(("sqlite_", "dbstat")) or table in derived:
+        return False
+    if "VIRTUAL TABLE INDEX" in detail:
+        return ":M" not in detail
+    return "USING" not in detail or not limited
+
+
+def audit(conn=None, queries=None):
+    """
+    Run EXPLAIN QUERY PLAN over the app's queries, registered and profiled,
+    and flag full table scans
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return audit(conn, queries)
+
+    if queries is None:
+        registered = {profiler.normalize(sql) for sql, _ in APP_QUERIES.values()}
+        queries = dict(APP_QUERIES)
+        queries.update((name, query) for name, query in profiler.queries().items()
+                       if profiler.normalize(query[0]) not in registered)
+
+    results = []
+    for name, (sql, params) in queries.items():
+        try:
+            plan = explain(conn, sql, params)
+        except Exception as e:
+            results.append({"query": name, "sql": sql, "plan": [], "full_scans": [], "error": str(e)})
+            continue
+        results.append({
+            "query": name,
+            "sql": sql,
+            "plan": plan,
+            "full_scans": [] if name in BOUNDED_SCANS else
+                          [detail for detail in plan if is_full_scan(detail, derived_tables(plan), has_limit(sql))],
+            "error": None,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit the CRM's queries with EXPLAIN QUERY PLAN")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            for name, _, _ in migrations.missing_indexes(conn):
+                print(f"MISSING INDEX  {name}")
+            results = audit(conn)
+    finally:
+        pool.close()
+
+    flagged = 0
+    for result in results:
+        if result["error"]:
+            status = "ERROR"
+        elif result["full_scans"]:
+            status = "FULL SCAN"
+            flagged += 1
+        else:
+            status = "ok"
+        print(f"{status:<10} {result['query']}")
+        for detail in result["plan"]:
+            print(f"{'':<10}   {detail}")
+        if result["error"]:
+            print(f"{'':<10}   {result['error']}")
+    print(f"{flagged} of {len(results)} queries use a full table scan")
+    if not profiler.ENABLED:
+        print("Only the registered queries were checked; statements data functions run that are not in "
+              "APP_QUERIES are skipped unless CRM_PROFILE=1")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import collections
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import db
+import replica
+import streaming
+
+# Execution limits for ad-hoc SQL (overridable through the environment)
+QUERY_TIMEOUT = float(os.environ.get("CRM_QUERY_TIMEOUT", "30"))
+# Exports stream the whole result to disk, so they get longer
+EXPORT_TIMEOUT = float(os.environ.get("CRM_EXPORT_TIMEOUT", "300"))
+PROGRESS_STEP = int(os.environ.get("CRM_QUERY_PROGRESS_STEP", "1000"))
+HISTORY_SIZE = 50
+
+# Statuses recorded for each run
+OK = "ok"
+TIMED_OUT = "timed_out"
+CANCELLED = "cancelled"
+ERROR = "error"
+
+READ_KEYWORDS = ("SELECT", "WITH", "VALUES", "EXPLAIN")
+_LEADING = re.compile(r"^(\s+|--[^\n]*(\n|$)|/\*.*?\*/|\()+", re.S)
+
+
+def is_read_query(query):
+    """
+    True for statements that start like a query (after comments and
+    parentheses). These run on a mode=ro connection, so a write hidden in a
+    CTE fails instead of running.
+    """
+    words = _LEADING.sub("", query).split(None, 1)
+    return bool(words) and words[0].upper() in READ_KEYWORDS
+
+
+class QueryRun:
+    """
+    One execution of an ad-hoc statement on a worker thread. A progress
+    handler checks the deadline and the cancel flag every PROGRESS_STEP
+    virtual machine instructions and aborts the statement when either trips.
+    With export_path, a read-only result is streamed to that file (CSV or
+    Parquet) instead of being read into a DataFrame.
+    """
+
+    def __init__(self, query, max_rows=streaming.MAX_RESULT_ROWS, timeout=QUERY_TIMEOUT, export_path=None,
+                 export_format="csv"):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.export_path = export_path
+        self.export_format = export_format
+        self.read_only = is_read_query(query)
+        self.ticks = 0
+        self.started = None
+        self.finished = None
+        self.status = None
+        self.result = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"query-{self.id[:8]}", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def done(self):
+        return self._done.is_set()
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def _progress(self):
+        self.ticks += 1
+        if self._cancel.is_set():
+            return 1
+        if self.timeout and time.perf_counter() - self.started > self.timeout:
+            return 1
+        return 0
+
+    def _execute(self, conn):
+        conn.set_progress_handler(self._progress, PROGRESS_STEP)
+        try:
+            c = conn.cursor()
+            c.execute(self.query)
+            if self.export_path is not None:
+                written = streaming.write_file(c, self.export_path, self.export_format)
+                return {"row_count": written, "path": self.export_path}
+            if c.description is not None:
+                # Stream in chunks up to the row cap, straight into a DataFrame
+                results, truncated = streaming.read_frame(c, max_rows=self.max_rows)
+                return {"results": results, "row_count": len(results), "truncated": truncated}
+            return {"row_count": c.rowcount}
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def _run(self):
+        try:
+            if self.export_path is not None and not self.read_only:
+                raise ValueError("Only queries can be exported")
+            connection = replica.report_connection if self.read_only else db.connection
+            with connection() as conn:
+                result = self._execute(conn)
+            self.status = OK
+            result["success"] = True
+        except sqlite3.OperationalError as e:
+            if str(e) == "interrupted":
+                self.status = CANCELLED if self._cancel.is_set() else TIMED_OUT
+                message = ("Query cancelled" if self.status == CANCELLED
+                           else f"Query exceeded the {self.timeout:g}s time limit")
+            else:
+                self.status = ERROR
+                message = str(e)
+            result = {"success": False, "error": message}
+        except Exception as e:
+            self.status = ERROR
+            result = {"success": False, "error": str(e)}
+        finally:
+            self.finished = time.perf_counter()
+            _runs.pop(self.id, None)
+
+        result.update({
+            "status": self.status,
+            "read_only": self.read_only,
+            "elapsed": self.elapsed(),
+            "vm_steps": self.ticks * PROGRESS_STEP,
+        })
+        self.result = result
+        with _lock:
+            _history.appendleft({
+                "query": self.query,
+                "read_only": self.read_only,
+                "status": self.status,
+                "elapsed": result["elapsed"],
+                "vm_steps": result["vm_steps"],
+                "rows_returned": result.get("row_count") if "results" in result or "path" in result else None,
+                "rows_affected": result.get("row_count") if not ("results" in result or "path" in result) else None,
+            })
+        self._done.set()
+
+
+_runs = {}
+_history = collections.deque(maxlen=HISTORY_SIZE)
+_lock = threading.Lock()
+
+
+def start(query, max_rows=streaming.MAX_RESULT_ROWS, timeout=QUERY_TIMEOUT):
+    run = QueryRun(query, max_rows, timeout)
+    _runs[run.id] = run
+    return run.start()
+
+
+def start_export(query, path, fmt="csv", timeout=EXPORT_TIMEOUT):
+    """
+    Stream a query's full result to `path` under the time limit and Cancel
+    """
+    run = QueryRun(query, timeout=timeout, export_path=path, export_format=fmt)
+    _runs[run.id] = run
+    return run.start()
+
+
+def execute(query, max_rows=streaming.MAX_RESULT_ROWS, timeout=QUERY_TIMEOUT):
+    run = start(query, max_rows, timeout)
+    run.wait()
+    return run.result
+
+
+def cancel(run_id):
+    """
+    Stop a running statement by id; returns False if it already finished
+    """
+    run = _runs.get(run_id)
+    if run is None:
+        return False
+    run.cancel()
+    return True
+
+
+def history():
+    with _lock:
+        return list(_history)
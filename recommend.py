@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import archive
+import db
+
+# Recommendation settings (overridable through the environment)
+TOP_K = int(os.environ.get("CRM_RECOMMEND_TOP_K", "10"))
+# Customers two products must share before one is suggested for the other
+MIN_CUSTOMERS = int(os.environ.get("CRM_RECOMMEND_MIN_CUSTOMERS", "2"))
+# Products whose similarity rows are multiplied out together
+BLOCK_SIZE = 256
+
+NEW_PAIRS = '''
+SELECT DISTINCT lower(trim(s.customer_email)), s.product_id
+FROM {table} s
+WHERE s.id > ? AND s.id <= ? AND s.product_id IS NOT NULL AND trim(COALESCE(s.customer_email, '')) != '' {unseen}
+'''
+UNSEEN = '''
+  AND NOT EXISTS (SELECT 1 FROM customer_products cp
+                  WHERE cp.customer = lower(trim(s.customer_email)) AND cp.product_id = s.product_id)
+'''
+
+
+def create_neighbor_tables(c):
+    """
+    Who bought what (one row per customer and product), the persisted
+    top-k neighbor lists and the high-water mark on sales.id
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS customer_products (
+        customer TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        PRIMARY KEY (customer, product_id)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS product_neighbors (
+        product_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        customers INTEGER NOT NULL,
+        PRIMARY KEY (product_id, rank)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS recommend_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    c.execute("INSERT OR IGNORE INTO recommend_state (name, value) VALUES ('last_sale_id', 0)")
+
+
+class Interactions:
+    """
+    Binary customer x product purchase matrix, held in memory and extended
+    with the pairs each refresh adds to customer_products. Matches the
+    table as of sale id `last_sale_id`; reloaded when another process has
+    moved the table on.
+    """
+
+    def __init__(self):
+        # numpy and scipy load with the first matrix; the neighbor list
+        # lookups below don't need them
+        import numpy as np
+
+        self.last_sale_id = None
+        self._customers = {}
+        self._rows = np.empty(0, dtype="int32")
+        self._cols = np.empty(0, dtype="int32")
+        self._matrix = None
+
+    def load(self, conn, last_sale_id):
+        self.extend(conn.execute("SELECT customer, product_id FROM customer_products").fetchall())
+        self.last_sale_id = last_sale_id
+
+    def _codes(self, customers):
+        import numpy as np
+
+        codes = self._customers
+        return np.fromiter((codes.setdefault(customer, len(codes)) for customer in customers),
+                           dtype="int32", count=len(customers))
+
+    def extend(self, pairs):
+        """
+        Add (customer, product_id) pairs; returns their customer codes
+        """
+        import numpy as np
+
+        if not pairs:
+            return np.empty(0, dtype="int32")
+        rows = self._codes([pair[0] for pair in pairs])
+        self._rows = np.concatenate([self._rows, rows])
+        self._cols = np.concatenate([self._cols, np.fromiter((pair[1] for pair in pairs), dtype="int32",
+                                                             count=len(pairs))])
+        self._matrix = None
+        return rows
+
+    def copy(self):
+        other = Interactions()
+        other.last_sale_id = self.last_sale_id
+        other._customers = dict(self._customers)
+        other._rows, other._cols = self._rows, self._cols
+        return other
+
+    def products(self):
+        return self._cols
+
+    def matrix(self):
+        import numpy as np
+        from scipy import sparse
+
+        if self._matrix is None:
+            shape = (len(self._customers), int(self._cols.max()) + 1 if len(self._cols) else 0)
+            self._matrix = sparse.csr_matrix((np.ones(len(self._rows), dtype="float32"),
+                                              (self._rows, self._cols)), shape=shape)
+        return self._matrix
+
+    def stats(self):
+        return {"customers": len(self._customers), "interactions": len(self._rows),
+                "last_sale_id": self.last_sale_id}
+
+
+def top_neighbors(matrix, products, top_k=TOP_K, min_customers=MIN_CUSTOMERS):
+    """
+    Cosine item-item neighbors for the given products over a binary
+    customer x product matrix, keeping the top_k per product among those
+    sharing at least min_customers customers. Returns rows of
+    (product_id, rank, neighbor_id, score, customers).
+    """
+    import numpy as np
+
+    columns = matrix.tocsc()
+    buyers = np.asarray(columns.sum(axis=0)).ravel()
+    norms = np.sqrt(buyers)
+    rows = []
+    for start in range(0, len(products), BLOCK_SIZE):
+        block = products[start:start + BLOCK_SIZE]
+        # Co-purchase counts for the block against every product
+        counts = (columns[:, block].T @ columns).tocsr()
+        for offset, product_id in enumerate(block):
+            begin, end = counts.indptr[offset], counts.indptr[offset + 1]
+            neighbors = counts.indices[begin:end]
+            shared = counts.data[begin:end]
+            keep = (neighbors != product_id) & (shared >= min_customers)
+            neighbors, shared = neighbors[keep], shared[keep]
+            if not len(neighbors):
+                continue
+            scores = shared / (norms[product_id] * norms[neighbors])
+            if len(scores) > top_k:
+                candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+                neighbors, shared, scores = neighbors[candidates], shared[candidates], scores[candidates]
+            # Highest score first; ties go to the product bought together more
+            order = np.lexsort((neighbors, -shared, -scores))
+            rows.extend((int(product_id), rank, int(neighbors[i]), float(scores[i]), int(shared[i]))
+                        for rank, i in enumerate(order, start=1))
+    return rows
+
+
+_interactions = None
+_interactions_lock = threading.Lock()
+
+
+def _new_pairs(conn, last, newest, full):
+    # Pairs bought in sales (last, newest]; a full build reads every sale,
+    # archived months included, and skips the check against customer_products
+    unseen = "" if full else UNSEEN
+    pairs = []
+    if full:
+        for partition in archive.partitions(conn):
+            with archive.attached(conn, [partition]) as aliases:
+                pairs.extend(conn.execute(NEW_PAIRS.format(table=f"{aliases[0]}.sales", unseen=unseen),
+                                          (last, newest)).fetchall())
+    pairs.extend(conn.execute(NEW_PAIRS.format(table="main.sales", unseen=unseen), (last, newest)).fetchall())
+    # The same pair can come from several files; key order makes the
+    # inserts into customer_products append-only
+    return sorted(set(pairs))
+
+
+def refresh(conn=None, full=False, top_k=TOP_K, min_customers=MIN_CUSTOMERS):
+    """
+    Fold sales added since the last run into customer_products and
+    recompute the neighbor lists of the products they touch: the products
+    bought, and everything else their customers bought. Other lists keep
+    their scores until the next full rebuild, which also drops purchases
+    whose sales were deleted. Returns (pairs_added, lists_updated).
+    `conn` must not have a transaction open.
+    """
+    global _interactions
+    import numpy as np
+
+    if conn is None:
+        with db.connection() as conn:
+            return refresh(conn, full, top_k, min_customers)
+
+    db.check_no_transaction(conn)
+    with _interactions_lock:
+        while True:
+            last = conn.execute("SELECT value FROM recommend_state WHERE name = 'last_sale_id'").fetchone()[0]
+            newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+            if not full and newest <= last:
+                return 0, 0
+
+            # Work on a copy; the shared matrix only moves on after the commit
+            if full:
+                working = Interactions()
+            else:
+                if _interactions is None or _interactions.last_sale_id != last:
+                    _interactions = Interactions()
+                    _interactions.load(conn, last)
+                working = _interactions.copy()
+            pairs = _new_pairs(conn, 0 if full else last, newest, full)
+            codes = working.extend(pairs)
+            matrix = working.matrix()
+
+            if full:
+                products = np.unique(working.products())
+            else:
+                bought = np.fromiter((pair[1] for pair in pairs), dtype="int32", count=len(pairs))
+                products = np.unique(np.concatenate([bought, matrix[np.unique(codes)].indices.astype("int32")]))
+            rows = top_neighbors(matrix, products, top_k, min_customers)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute("SELECT value FROM recommend_state WHERE name = 'last_sale_id'").fetchone()[0]
+                if current != last:
+                    # Another process refreshed meanwhile; start over from its mark
+                    conn.rollback()
+                    continue
+                if full:
+                    conn.execute("DELETE FROM customer_products")
+                    conn.execute("DELETE FROM product_neighbors")
+                else:
+                    conn.executemany("DELETE FROM product_neighbors WHERE product_id = ?",
+                                     ((int(product_id),) for product_id in products))
+                conn.executemany("INSERT INTO customer_products (customer, product_id) VALUES (?, ?)", pairs)
+                conn.executemany('''
+                INSERT INTO product_neighbors (product_id, rank, neighbor_id, score, customers)
+                VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                conn.execute("UPDATE recommend_state SET value = ? WHERE name = 'last_sale_id'", (newest,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            working.last_sale_id = newest
+            _interactions = working
+            return len(pairs), len(products)
+
+
+def neighbors(conn, product_id, limit=TOP_K):
+    """
+    "Customers also bought" for one product, best first
+    """
+    return neighbors_for(conn, [product_id], limit).get(product_id, [])
+
+
+def neighbors_for(conn, product_ids, limit=TOP_K):
+    """
+    Neighbor lists for several products in one query on the primary key;
+    returns {product_id: [neighbor, ...]}
+    """
+    if not product_ids:
+        return {}
+    placeholders = ", ".join("?" * len(product_ids))
+    rows = conn.execute(f'''
+    SELECT n.product_id, n.neighbor_id, p.name, p.price, n.score, n.customers
+    FROM product_neighbors n
+    JOIN products p ON p.id = n.neighbor_id
+    WHERE n.product_id IN ({placeholders}) AND n.rank <= ?
+    ORDER BY n.product_id, n.rank
+    ''', (*product_ids, limit)).fetchall()
+    result = {}
+    for row in rows:
+        result.setdefault(row[0], []).append(
+            {"id": row[1], "name": row[2], "price": row[3], "score": row[4], "customers": row[5]})
+    return result
+
+
+def pending_sales(conn):
+    """
+    Sales not yet folded into the recommendations
+    """
+    last = conn.execute("SELECT value FROM recommend_state WHERE name = 'last_sale_id'").fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM sales WHERE id > ?", (last,)).fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the product co-purchase recommendations")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="rebuild from every sale, archives included")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--min-customers", type=int, default=MIN_CUSTOMERS)
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            started = time.perf_counter()
+            pairs, products = refresh(conn, args.full, args.top_k, args.min_customers)
+    finally:
+        pool.close()
+    print(f"Added {pairs:,} customer/product pairs and updated {products:,} neighbor lists "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
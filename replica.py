@@ -0,0 +1,225 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import cache
+import db
+
+# Storage mode (overridable through the environment):
+#   wal       reports read the primary through read-only connections
+#   snapshot  reports read a periodic copy made with the backup API
+STORAGE_MODE = os.environ.get("CRM_STORAGE_MODE", "wal")
+# Unset: beside the primary, so data/crm.db is copied to data/crm_snapshot.db
+SNAPSHOT_PATH = os.environ.get("CRM_SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL = float(os.environ.get("CRM_SNAPSHOT_INTERVAL", "300"))
+
+# Cached namespaces whose reads are served from the snapshot
+REPORT_NAMESPACES = ("metrics", "table_stats")
+
+
+def _default_path(db_path):
+    root, _ = os.path.splitext(db_path)
+    return f"{root}_snapshot.db"
+
+
+class Snapshotter:
+    """
+    Keeps a point-in-time copy of the primary database for reports.
+
+    A background thread copies the primary with Connection.backup() every
+    `interval` seconds into a temporary file, switches it to a rollback
+    journal and renames it over the snapshot. Readers use an immutable pool
+    on the snapshot, which is swapped for a new one after each copy; the old
+    pool's connections close as they are returned. A copy left by an
+    earlier process is reused only while it is younger than `interval`.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, interval=SNAPSHOT_INTERVAL, source_pool=None):
+        if path is None:
+            path = _default_path(source_pool.path if source_pool is not None else db.DB_PATH)
+        self.path = path
+        self.interval = interval
+        self.source_pool = source_pool
+        self.taken_at = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {
+            "snapshots": 0,
+            "failures": 0,
+            "last_error": None,
+            "last_duration": 0.0,
+            "bytes": 0,
+        }
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < interval:
+            # Reuse the copy left by the previous process until it is due;
+            # an older one is replaced before the first report reads it
+            self.taken_at = os.path.getmtime(path)
+            self._stats["bytes"] = os.path.getsize(path)
+            self._pool = self._open(path)
+
+    def _open(self, path):
+        return db.ConnectionPool(path, immutable=True)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="snapshotter", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request_refresh(self):
+        """
+        Ask the background thread for a new snapshot now
+        """
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            due = self.interval if self.taken_at is None else self.taken_at + self.interval - time.time()
+            if self.taken_at is not None and due > 0 and not self._wake.wait(due):
+                continue
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception:
+                # Counted in stats; readers keep the previous snapshot
+                self._wake.wait(min(self.interval, 60))
+
+    def refresh(self, if_missing=False):
+        """
+        Copy the primary into a new snapshot and point readers at it
+        """
+        with self._refresh_lock:
+            if if_missing and self._pool is not None:
+                return
+            started = time.time()
+            timer = time.perf_counter()
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with (self.source_pool or db.get_read_pool()).connection() as source:
+                    target = sqlite3.connect(temporary)
+                    try:
+                        # One step: the copy is a single consistent read
+                        # transaction, and WAL writers carry on meanwhile
+                        source.backup(target)
+                        target.execute("PRAGMA journal_mode = DELETE")
+                    finally:
+                        target.close()
+                os.replace(temporary, self.path)
+            except Exception as e:
+                with self._lock:
+                    self._stats["failures"] += 1
+                    self._stats["last_error"] = str(e)
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+
+            pool = self._open(self.path)
+            with self._lock:
+                previous, self._pool = self._pool, pool
+                self.taken_at = started
+                self._stats["snapshots"] += 1
+                self._stats["last_error"] = None
+                self._stats["last_duration"] = time.perf_counter() - timer
+                self._stats["bytes"] = os.path.getsize(self.path)
+            if previous is not None:
+                previous.close()
+            cache.invalidate(*REPORT_NAMESPACES)
+
+    @contextmanager
+    def connection(self):
+        while True:
+            with self._lock:
+                pool = self._pool
+            if pool is None:
+                # No snapshot yet: the first reader waits for one
+                self.refresh(if_missing=True)
+                continue
+            try:
+                conn = pool.acquire()
+            except RuntimeError:
+                # Replaced by a newer snapshot between lookup and acquire
+                continue
+            break
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    def staleness(self):
+        return None if self.taken_at is None else max(time.time() - self.taken_at, 0.0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["path"] = self.path
+        stats["interval"] = self.interval
+        stats["taken_at"] = self.taken_at
+        stats["staleness"] = self.staleness()
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+_snapshotter = None
+_snapshotter_lock = threading.Lock()
+
+
+def snapshot_enabled():
+    return STORAGE_MODE == "snapshot"
+
+
+def get_snapshotter():
+    global _snapshotter
+    if _snapshotter is None:
+        with _snapshotter_lock:
+            if _snapshotter is None:
+                snapshotter = Snapshotter()
+                snapshotter.start()
+                _snapshotter = snapshotter
+    return _snapshotter
+
+
+def report_connection():
+    """
+    Connection for reports and ad-hoc reads: the snapshot in snapshot mode,
+    otherwise a read-only connection to the primary
+    """
+    if snapshot_enabled():
+        return get_snapshotter().connection()
+    return db.read_connection()
+
+
+def staleness():
+    """
+    Age of the data reports see in seconds; 0 when they read the primary
+    and None before the first snapshot
+    """
+    if not snapshot_enabled():
+        return 0.0
+    return get_snapshotter().staleness()
+
+
+def request_refresh():
+    if snapshot_enabled():
+        get_snapshotter().request_refresh()
+
+
+def stats():
+    if not snapshot_enabled():
+        return {"mode": STORAGE_MODE}
+    return dict(get_snapshotter().stats(), mode=STORAGE_MODE)
@@ -0,0 +1,141 @@
+from datetime import datetime
+
+import cache
+import db
+
+# Per-line outcomes returned by record_sales()
+OK = "ok"
+INSUFFICIENT_STOCK = "insufficient_stock"
+UNKNOWN_PRODUCT = "unknown_product"
+INVALID_QUANTITY = "invalid_quantity"
+
+
+def _prepare_lines(conn):
+    conn.execute('''
+    CREATE TEMP TABLE IF NOT EXISTS sale_lines (
+        line_no INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        quantity INTEGER,
+        customer_name TEXT,
+        customer_email TEXT,
+        sale_date TIMESTAMP,
+        total_price REAL,
+        status TEXT,
+        sale_id INTEGER
+    )
+    ''')
+    conn.execute("DELETE FROM temp.sale_lines")
+
+
+def record_sales(batch, conn=None):
+    """
+    Record a batch of sales in one BEGIN IMMEDIATE transaction; `conn` must
+    not have a transaction open.
+
+    Each line is a dict with product_id, quantity and optionally
+    customer_name, customer_email, sale_date and total_price (defaults to
+    price * quantity). Accepted lines insert a sale and an inventory_log row
+    and decrement products.stock_quantity. Lines for the same product are
+    filled in order; once a line would oversell, it and every later line for
+    that product are rejected. Returns one result dict per line, in order.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return record_sales(batch, conn)
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for line_no, line in enumerate(batch):
+        try:
+            quantity = int(line.get("quantity"))
+            product_id = int(line.get("product_id"))
+        except (TypeError, ValueError):
+            quantity, product_id = None, None
+        rows.append((
+            line_no,
+            product_id,
+            quantity,
+            line.get("customer_name"),
+            line.get("customer_email"),
+            line.get("sale_date") or now,
+            line.get("total_price"),
+            INVALID_QUANTITY if quantity is None or quantity <= 0 else None,
+        ))
+
+    db.begin_immediate(conn)
+    try:
+        _prepare_lines(conn)
+        conn.executemany('''
+        INSERT INTO temp.sale_lines
+            (line_no, product_id, quantity, customer_name, customer_email, sale_date, total_price, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        # Running demand per product against the stock seen under the write lock
+        conn.execute(f'''
+        WITH demand AS (
+            SELECT l.line_no, p.id AS known, p.price, p.stock_quantity,
+                   SUM(l.quantity) OVER (PARTITION BY l.product_id ORDER BY l.line_no) AS cumulative
+            FROM temp.sale_lines l
+            LEFT JOIN products p ON p.id = l.product_id
+            WHERE l.status IS NULL
+        )
+        UPDATE temp.sale_lines SET
+            status = CASE
+                WHEN demand.known IS NULL THEN '{UNKNOWN_PRODUCT}'
+                WHEN demand.cumulative <= demand.stock_quantity THEN '{OK}'
+                ELSE '{INSUFFICIENT_STOCK}'
+            END,
+            total_price = COALESCE(sale_lines.total_price, ROUND(demand.price * sale_lines.quantity, 2))
+        FROM demand
+        WHERE demand.line_no = sale_lines.line_no
+        ''')
+
+        # Assign sale ids in line order so results can point at their rows
+        conn.execute(f'''
+        WITH numbered AS (
+            SELECT line_no, ROW_NUMBER() OVER (ORDER BY line_no) AS n
+            FROM temp.sale_lines WHERE status = '{OK}'
+        )
+        UPDATE temp.sale_lines
+        SET sale_id = (SELECT COALESCE(MAX(id), 0) FROM main.sales) + numbered.n
+        FROM numbered
+        WHERE numbered.line_no = sale_lines.line_no
+        ''')
+
+        conn.execute(f'''
+        INSERT INTO sales (id, product_id, quantity, total_price, customer_name, customer_email, sale_date)
+        SELECT sale_id, product_id, quantity, total_price, customer_name, customer_email, sale_date
+        FROM temp.sale_lines WHERE status = '{OK}' ORDER BY line_no
+        ''')
+        conn.execute(f'''
+        INSERT INTO inventory_log (product_id, quantity_change, reason, log_date)
+        SELECT product_id, -quantity,
+               CASE WHEN customer_name IS NULL THEN 'Sale' ELSE 'Sale to ' || customer_name END,
+               sale_date
+        FROM temp.sale_lines WHERE status = '{OK}' ORDER BY line_no
+        ''')
+        conn.execute(f'''
+        UPDATE products SET stock_quantity = stock_quantity - sold.quantity
+        FROM (
+            SELECT product_id, SUM(quantity) AS quantity
+            FROM temp.sale_lines WHERE status = '{OK}'
+            GROUP BY product_id
+        ) AS sold
+        WHERE products.id = sold.product_id
+        ''')
+
+        results = conn.execute('''
+        SELECT line_no, product_id, quantity, status, sale_id, total_price
+        FROM temp.sale_lines ORDER BY line_no
+        ''').fetchall()
+        conn.execute("DELETE FROM temp.sale_lines")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if any(row[3] == OK for row in results):
+        cache.invalidate("products", "metrics", "inventory_log")
+    keys = ("line", "product_id", "quantity", "status", "sale_id", "total_price")
+    return [dict(zip(keys, row)) for row in results]
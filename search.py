@@ -0,0 +1,133 @@
+import re
+import sqlite3
+
+# Relative bm25 weights of the indexed columns (name, description)
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_enabled(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def create_products_fts(c):
+    """
+    Create the products_fts index over products(name, description) and the
+    triggers that keep it in sync
+    """
+    c.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name,
+        description,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''')
+
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    ''')
+    # Only text edits touch the index; stock and price updates skip it
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    ''')
+
+    c.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def build_match(search_term):
+    """
+    Turn free text into an FTS5 query that prefix-matches every word, so
+    "lap pro" finds "Laptop Pro" while the user is still typing
+    """
+    tokens = _TOKEN.findall(search_term or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _match_clause(search_term, category):
+    match = build_match(search_term)
+    if match is None:
+        return None, None
+    where = "products_fts MATCH ?"
+    params = [match]
+    if category and category != "All":
+        where += " AND p.category = ?"
+        params.append(category)
+    return where, params
+
+
+def search_products(conn, search_term, category=None, limit=None, after_id=None, keyset=False):
+    """
+    Ranked product search; returns None when the FTS index can't serve the
+    request so the caller falls back to LIKE. With keyset=True results are
+    ordered by id and resume after after_id instead of being ranked.
+    """
+    where, params = _match_clause(search_term, category)
+    if where is None or not fts_enabled(conn):
+        return None
+
+    query = (
+        "SELECT p.* FROM products_fts "
+        "JOIN products p ON p.id = products_fts.rowid "
+        f"WHERE {where}"
+    )
+    if keyset:
+        if after_id is not None:
+            query += " AND p.id > ?"
+            params.append(after_id)
+        query += " ORDER BY p.id"
+    else:
+        query += f" ORDER BY bm25(products_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+    c.execute(query, params)
+    return [dict(row) for row in c.fetchall()]
+
+
+def count_products(conn, search_term, category=None):
+    where, params = _match_clause(search_term, category)
+    if where is None or not fts_enabled(conn):
+        return None
+
+    query = (
+        "SELECT COUNT(*) FROM products_fts "
+        "JOIN products p ON p.id = products_fts.rowid "
+        f"WHERE {where}"
+    )
+    return conn.execute(query, params).fetchone()[0]
@@ -0,0 +1,373 @@
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+
+import db
+
+# Scoring settings (overridable through the environment)
+BATCH_SIZE = int(os.environ.get("CRM_SENTIMENT_BATCH_SIZE", "20000"))
+
+# VADER's conventions: compound scores beyond +/-0.05 are positive/negative,
+# a negated word keeps -0.74 of its valence, and sums are normalized with
+# x / sqrt(x^2 + 15)
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+NEGATION_SCALAR = -0.74
+NORMALIZATION_ALPHA = 15
+
+# Topic keywords; a comment gets the topic with the most matches
+TOPICS = {
+    "quality": ["quality", "broke", "broken", "defective", "durable", "flimsy", "sturdy", "stopped", "works",
+                "working", "perfectly"],
+    "price": ["price", "priced", "overpriced", "expensive", "cheap", "cost", "value", "money", "worth"],
+    "delivery": ["delivery", "delivered", "shipping", "shipped", "arrived", "late", "damaged", "package",
+                 "packaging"],
+    "support": ["support", "service", "refund", "return", "warranty", "replacement", "staff", "help"],
+    "usability": ["easy", "difficult", "setup", "instructions", "manual", "design", "comfortable", "use"],
+}
+OTHER_TOPIC = "other"
+
+# Negated words are rewritten to "neg_<word>" before tokenizing
+TOKEN_PATTERN = r"[a-z_']+"
+# Removes a score and takes it out of the per-product, per-topic summary
+REMOVE_SCORE = '''
+        UPDATE sentiment_summary SET
+            scored = scored - 1,
+            compound_sum = compound_sum - s.compound,
+            positive = positive - (s.label = 'positive'),
+            neutral = neutral - (s.label = 'neutral'),
+            negative = negative - (s.label = 'negative')
+        FROM (SELECT product_id, topic, compound, label FROM feedback_sentiment WHERE feedback_id = OLD.id) AS s
+        WHERE sentiment_summary.product_id = s.product_id AND sentiment_summary.topic = s.topic;
+        DELETE FROM feedback_sentiment WHERE feedback_id = OLD.id;
+'''
+
+
+def create_sentiment_tables(c):
+    """
+    Scores per feedback row, totals per product and topic, the high-water
+    mark on feedback.id, and the queue of rows to rescore after their
+    comments change
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS feedback_sentiment (
+        feedback_id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        compound REAL NOT NULL,
+        label TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sentiment_summary (
+        product_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        scored INTEGER NOT NULL DEFAULT 0,
+        compound_sum REAL NOT NULL DEFAULT 0,
+        positive INTEGER NOT NULL DEFAULT 0,
+        neutral INTEGER NOT NULL DEFAULT 0,
+        negative INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (product_id, topic)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sentiment_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    c.execute("INSERT OR IGNORE INTO sentiment_state (name, value) VALUES ('last_feedback_id', 0)")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sentiment_pending (
+        feedback_id INTEGER PRIMARY KEY
+    )
+    ''')
+
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS feedback_sentiment_ad AFTER DELETE ON feedback BEGIN {REMOVE_SCORE} END")
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS feedback_sentiment_au
+    AFTER UPDATE OF product_id, comments ON feedback BEGIN
+        {REMOVE_SCORE}
+        INSERT OR IGNORE INTO sentiment_pending (feedback_id)
+        SELECT NEW.id WHERE NEW.id <= (SELECT value FROM sentiment_state WHERE name = 'last_feedback_id');
+    END
+    ''')
+
+
+class Scorer:
+    """
+    Lexicon sentiment and keyword topics for batches of comments.
+
+    The VADER lexicon is turned into one weight per vocabulary term, so a
+    batch is scored with a single sparse matrix product instead of running
+    the rule engine per comment. A negation marks the word after it, which
+    carries -0.74 of its valence; VADER's booster words, capitals and
+    punctuation emphasis are not modelled.
+    """
+
+    def __init__(self):
+        # Heavy imports, only needed by processes that score; pages that
+        # read the stored scores never load numpy, nltk or sklearn
+        import numpy as np
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        try:
+            analyzer = SentimentIntensityAnalyzer()
+        except LookupError:
+            raise RuntimeError("The VADER lexicon is not installed; run "
+                               "python -c \"import nltk; nltk.download('vader_lexicon')\" first") from None
+        lexicon = {word: valence for word, valence in analyzer.lexicon.items()
+                   if re.fullmatch(TOKEN_PATTERN, word)}
+        terms = dict(lexicon)
+        terms.update({"neg_" + word: valence * NEGATION_SCALAR for word, valence in lexicon.items()})
+        for words in TOPICS.values():
+            for word in words:
+                terms.setdefault(word, 0.0)
+                terms.setdefault("neg_" + word, 0.0)
+
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        self.weights = np.fromiter(terms.values(), dtype="float64", count=len(terms))
+        self.topics = np.array(list(TOPICS), dtype="object")
+        self.topic_matrix = np.zeros((len(terms), len(TOPICS)), dtype="float64")
+        for column, words in enumerate(TOPICS.values()):
+            self.topic_matrix[[vocabulary[prefix + word] for word in words for prefix in ("", "neg_")], column] = 1.0
+
+        negations = "|".join(re.escape(word) for word in sorted(VaderConstants.NEGATE, key=len, reverse=True))
+        self._negation = re.compile(rf"\b(?:{negations})\s+([a-z']+)")
+        self.vectorizer = CountVectorizer(vocabulary=vocabulary, token_pattern=TOKEN_PATTERN, lowercase=False)
+
+    def score(self, comments):
+        """
+        (compound, label, topic) arrays for a list of comment strings; topic
+        is "other" where no keyword matched
+        """
+        import numpy as np
+
+        texts = [self._negation.sub(r"neg_\1", text.lower()) for text in comments]
+        counts = self.vectorizer.transform(texts)
+        total = counts @ self.weights
+        compound = total / np.sqrt(total * total + NORMALIZATION_ALPHA)
+        label = np.where(compound >= POSITIVE_THRESHOLD, "positive",
+                         np.where(compound <= NEGATIVE_THRESHOLD, "negative", "neutral")).astype("object")
+        matches = counts @ self.topic_matrix
+        topic = np.where(matches.max(axis=1) > 0, self.topics[matches.argmax(axis=1)], OTHER_TOPIC)
+        return compound, label, topic
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer():
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = Scorer()
+    return _scorer
+
+
+def _write_scores(conn, ids, products, scores):
+    import numpy as np
+
+    compound, label, topic = scores
+    conn.executemany('''
+    INSERT INTO feedback_sentiment (feedback_id, product_id, compound, label, topic)
+    VALUES (?, ?, ?, ?, ?)
+    ''', zip(ids.tolist(), products.tolist(), compound.tolist(), label.tolist(), topic.tolist()))
+
+    # Per-product, per-topic totals for the batch, added to the summary in one pass
+    topics, topic_codes = np.unique(topic.astype("str"), return_inverse=True)
+    keys, inverse = np.unique(products * len(topics) + topic_codes, return_inverse=True)
+    totals = zip((keys // len(topics)).tolist(),
+                 topics[keys % len(topics)].tolist(),
+                 np.bincount(inverse).tolist(),
+                 np.bincount(inverse, weights=compound).tolist(),
+                 *(np.bincount(inverse, weights=label == name).astype("int64").tolist()
+                   for name in ("positive", "neutral", "negative")))
+    conn.executemany('''
+    INSERT INTO sentiment_summary (product_id, topic, scored, compound_sum, positive, neutral, negative)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (product_id, topic) DO UPDATE SET
+        scored = scored + excluded.scored,
+        compound_sum = compound_sum + excluded.compound_sum,
+        positive = positive + excluded.positive,
+        neutral = neutral + excluded.neutral,
+        negative = negative + excluded.negative
+    ''', totals)
+
+
+def _columns(rows):
+    import numpy as np
+
+    ids = np.array([row[0] for row in rows], dtype="int64")
+    products = np.array([row[1] for row in rows], dtype="int64")
+    # Blank comments are skipped but still move the high-water mark
+    scored = np.array([bool(row[2] and row[2].strip()) for row in rows], dtype=bool)
+    return ids, products, [row[2] for row in rows], scored
+
+
+def _score_rows(rows):
+    ids, products, comments, keep = _columns(rows)
+    if not keep.any():
+        return ids, products, keep, None
+    scores = get_scorer().score([text for text, flag in zip(comments, keep) if flag])
+    return ids, products, keep, scores
+
+
+def _score_pending(conn, batch_size):
+    import numpy as np
+
+    # Rows whose comments changed after they were scored
+    scored = 0
+    while True:
+        rows = conn.execute('''
+        SELECT f.id, COALESCE(f.product_id, 0), f.comments
+        FROM sentiment_pending p JOIN feedback f ON f.id = p.feedback_id
+        ORDER BY p.feedback_id LIMIT ?
+        ''', (batch_size,)).fetchall()
+        if not rows:
+            conn.execute("DELETE FROM sentiment_pending WHERE feedback_id NOT IN (SELECT id FROM feedback)")
+            conn.commit()
+            return scored
+        ids, products, keep, scores = _score_rows(rows)
+
+        db.begin_immediate(conn)
+        try:
+            # Only rows still queued: another run may have scored them meanwhile
+            claimed = np.array([conn.execute("DELETE FROM sentiment_pending WHERE feedback_id = ?",
+                                             (feedback_id,)).rowcount == 1 for feedback_id in ids.tolist()])
+            if scores is not None:
+                mask = claimed[keep]
+                _write_scores(conn, ids[keep][mask], products[keep][mask],
+                              tuple(column[mask] for column in scores))
+                scored += int(mask.sum())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def score_new(conn=None, batch_size=BATCH_SIZE):
+    """
+    Score feedback rows added since the last run, in batches of
+    `batch_size`, plus rows queued for rescoring. Each batch is scored
+    before the write lock is taken and committed with the advanced
+    high-water mark. Returns the number of comments scored. `conn` must
+    not have a transaction open.
+    """
+    if conn is None:
+        with db.connection() as conn:
+            return score_new(conn, batch_size)
+
+    db.check_no_transaction(conn)
+    scored = _score_pending(conn, batch_size)
+    while True:
+        last = conn.execute("SELECT value FROM sentiment_state WHERE name = 'last_feedback_id'").fetchone()[0]
+        rows = conn.execute('''
+        SELECT id, COALESCE(product_id, 0), comments FROM feedback
+        WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last, batch_size)).fetchall()
+        if not rows:
+            conn.commit()
+            return scored
+        ids, products, keep, scores = _score_rows(rows)
+
+        db.begin_immediate(conn)
+        try:
+            current = conn.execute(
+                "SELECT value FROM sentiment_state WHERE name = 'last_feedback_id'").fetchone()[0]
+            if current != last:
+                # Another run got there first; read on from its mark
+                conn.rollback()
+                continue
+            if scores is not None:
+                _write_scores(conn, ids[keep], products[keep], scores)
+                scored += int(keep.sum())
+            conn.execute("UPDATE sentiment_state SET value = ? WHERE name = 'last_feedback_id'",
+                         (int(ids[-1]),))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def unscored(conn):
+    """
+    Feedback rows waiting to be scored
+    """
+    last = conn.execute("SELECT value FROM sentiment_state WHERE name = 'last_feedback_id'").fetchone()[0]
+    new = conn.execute("SELECT COUNT(*) FROM feedback WHERE id > ?", (last,)).fetchone()[0]
+    return new + conn.execute("SELECT COUNT(*) FROM sentiment_pending").fetchone()[0]
+
+
+def product_sentiment(conn, product_id=None, limit=None, order="asc"):
+    """
+    Average compound score and label counts per product from the stored
+    totals, lowest average first (order="desc" for highest first)
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order: {order}")
+    only = "WHERE product_id = :product_id" if product_id is not None else ""
+    rows = conn.execute(f'''
+    SELECT s.product_id, p.name, s.scored, s.compound_sum / s.scored, s.positive, s.neutral, s.negative
+    FROM (
+        SELECT product_id, SUM(scored) AS scored, SUM(compound_sum) AS compound_sum,
+               SUM(positive) AS positive, SUM(neutral) AS neutral, SUM(negative) AS negative
+        FROM sentiment_summary {only}
+        GROUP BY product_id
+    ) s
+    LEFT JOIN products p ON p.id = s.product_id
+    WHERE s.scored > 0
+    ORDER BY s.compound_sum / s.scored {order}
+    LIMIT :limit
+    ''', {"product_id": product_id, "limit": -1 if limit is None else limit}).fetchall()
+    keys = ("product_id", "name", "scored", "average", "positive", "neutral", "negative")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def topic_breakdown(conn, product_id=None):
+    """
+    Comments and average compound score per topic, overall or for one
+    product, from the stored totals
+    """
+    only = "WHERE product_id = ?" if product_id is not None else ""
+    rows = conn.execute(f'''
+    SELECT topic, SUM(scored), SUM(compound_sum) / SUM(scored)
+    FROM sentiment_summary {only}
+    GROUP BY topic
+    HAVING SUM(scored) > 0
+    ORDER BY 2 DESC
+    ''', () if product_id is None else (product_id,)).fetchall()
+    return [{"topic": row[0], "comments": row[1], "average": row[2]} for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score new feedback comments for sentiment and topic")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            started = time.perf_counter()
+            get_scorer()
+            loaded = time.perf_counter() - started
+            scored = score_new(conn, args.batch_size)
+            elapsed = time.perf_counter() - started - loaded
+    finally:
+        pool.close()
+
+    rate = f" ({scored / elapsed:,.0f} comments/s)" if scored and elapsed else ""
+    print(f"Loaded the lexicon in {loaded:.2f}s; scored {scored:,} comments in {elapsed:.2f}s{rate}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+import views
+
+# Cold start budget (overridable through the environment): a fresh process
+# should run the app script and paint the login page within this time
+FIRST_PAINT_TARGET_MS = float(os.environ.get("CRM_FIRST_PAINT_TARGET_MS", "500"))
+# Libraries only some pages need; the login page must load none of them
+HEAVY_MODULES = ("pandas", "numpy", "scipy", "sklearn", "nltk", "matplotlib", "pyarrow")
+# Already loaded by the time the server runs the app script, so left out
+# of the per-page import times
+PRELOADED = ("streamlit",)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+SUBPROCESS_TIMEOUT = 300
+
+# One line of `python -X importtime` output: self and cumulative
+# microseconds, then the module name indented two spaces per level
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)\s*$")
+
+FIRST_PAINT_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+loaded = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[3]))
+if sys.argv[2] != "login":
+    import auth
+    at.session_state.session_token = auth.issue_token({"id": 1, "username": "admin", "role": "admin"})
+    at.session_state.logged_in = True
+    at.session_state.username = "admin"
+    at.session_state.role = "admin"
+    at.session_state.page = sys.argv[2]
+at.run()
+painted = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": (loaded - started) * 1000,
+    "first_paint_ms": (painted - loaded) * 1000,
+    "errors": [str(e.message) for e in at.exception],
+    "modules": sorted(name for name in sys.modules if "." not in name),
+}))
+'''
+
+
+def _run(args):
+    result = subprocess.run([sys.executable, *args], cwd=APP_DIR, capture_output=True, text=True,
+                            timeout=SUBPROCESS_TIMEOUT)
+    if result.returncode:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit status {result.returncode}")
+    return result
+
+
+def import_times(module, preload=PRELOADED):
+    """
+    Import `module` in a fresh interpreter under -X importtime. Returns one
+    row per module it loaded, in load order: module, depth (0 for its
+    direct imports), self_ms and cumulative_ms. Modules pulled in by
+    `preload`, imported first, are left out.
+    """
+    statements = "; ".join(f"import {name}" for name in (*preload, module))
+    rows = []
+    for line in _run(["-X", "importtime", "-c", statements]).stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            rows.append({
+                "module": match.group(4),
+                "depth": len(match.group(3)) // 2,
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+            })
+    # Children are printed before their parent, so everything up to the
+    # last preloaded top-level line belongs to the preload
+    cut = 0
+    for i, row in enumerate(rows):
+        if row["depth"] == 0 and row["module"] in preload:
+            cut = i + 1
+    return rows[cut:]
+
+
+def packages(rows):
+    """
+    Import time per top-level package, slowest first: {package, ms, modules}
+    """
+    totals = {}
+    for row in rows:
+        package = totals.setdefault(row["module"].split(".")[0], {"ms": 0.0, "modules": 0})
+        package["ms"] += row["self_ms"]
+        package["modules"] += 1
+    return sorted(({"package": name, **total} for name, total in totals.items()),
+                  key=lambda package: -package["ms"])
+
+
+def page_imports(pages=views.PAGES):
+    """
+    For each page, the cost of importing its module into a server that has
+    only loaded streamlit: {page, import_ms, modules, heavy}
+    """
+    report = []
+    for page in pages:
+        rows = import_times(views.module_name(page))
+        loaded = {row["module"].split(".")[0] for row in rows}
+        report.append({
+            "page": page,
+            "import_ms": sum(row["cumulative_ms"] for row in rows if row["depth"] == 0),
+            "modules": len(rows),
+            "heavy": sorted(loaded.intersection(HEAVY_MODULES)),
+        })
+    return report
+
+
+def first_paint(page="login", timeout=120):
+    """
+    Run the app script once in a fresh process, through AppTest, and time
+    it: migrations, imports and rendering of `page` (other pages as an
+    admin). streamlit_ms is the time to load Streamlit itself, which the
+    server has already paid for. Also returns script errors and the heavy
+    libraries that ended up loaded.
+    """
+    output = _run(["-c", FIRST_PAINT_SCRIPT, APP_PATH, page, str(timeout)]).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["page"] = page
+    result["heavy"] = sorted(set(result.pop("modules")).intersection(HEAVY_MODULES))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the app's cold start: import times per page and "
+                                                 "time to first paint")
+    parser.add_argument("--pages", nargs="+", choices=views.PAGES, default=views.PAGES)
+    parser.add_argument("--module", help="also break down the imports of this module by package")
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the breakdown")
+    args = parser.parse_args(argv)
+
+    print(f"{'page':<14} {'import ms':>10} {'modules':>8}  heavy libraries")
+    for row in page_imports(args.pages):
+        print(f"{row['page']:<14} {row['import_ms']:>10.1f} {row['modules']:>8}  {', '.join(row['heavy']) or '-'}")
+
+    if args.module:
+        print()
+        print(f"{'package':<24} {'ms':>9} {'modules':>8}")
+        for package in packages(import_times(args.module))[:args.top]:
+            print(f"{package['package']:<24} {package['ms']:>9.1f} {package['modules']:>8}")
+
+    paint = first_paint("login")
+    print()
+    print(f"Login page first paint {paint['first_paint_ms']:.0f} ms (target {FIRST_PAINT_TARGET_MS:.0f} ms), "
+          f"after {paint['streamlit_ms']:.0f} ms loading Streamlit")
+    failed = False
+    if paint["errors"]:
+        print(f"Login page raised: {paint['errors'][0]}")
+        failed = True
+    if paint["heavy"]:
+        print(f"Login page loaded {', '.join(paint['heavy'])}")
+        failed = True
+    if paint["first_paint_ms"] > FIRST_PAINT_TARGET_MS:
+        print("Over the first paint target")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+
+import db
+import replica
+
+# Result streaming limits (overridable through the environment)
+CHUNK_SIZE = int(os.environ.get("CRM_RESULT_CHUNK_SIZE", "5000"))
+MAX_RESULT_ROWS = int(os.environ.get("CRM_MAX_RESULT_ROWS", "100000"))
+# Largest export offered as a browser download, which Streamlit serves from memory
+MAX_DOWNLOAD_BYTES = int(os.environ.get("CRM_MAX_DOWNLOAD_MB", "200")) * 2 ** 20
+
+
+def iter_chunks(cursor, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of row tuples from an executed cursor, chunk_size at a time
+    """
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def column_names(cursor):
+    return [col[0] for col in cursor.description or []]
+
+
+def read_frame(cursor, max_rows=MAX_RESULT_ROWS, chunk_size=CHUNK_SIZE):
+    """
+    Build a DataFrame from an executed cursor one chunk at a time, stopping
+    at max_rows. Returns (frame, truncated).
+    """
+    import pandas as pd
+
+    columns = column_names(cursor)
+    frames = []
+    fetched = 0
+    truncated = False
+    for rows in iter_chunks(cursor, chunk_size):
+        if max_rows is not None and fetched + len(rows) > max_rows:
+            rows = rows[:max_rows - fetched]
+            truncated = True
+        frames.append(pd.DataFrame.from_records(rows, columns=columns))
+        fetched += len(rows)
+        if truncated:
+            break
+    # One more row past the cap also means the result was cut short
+    if not truncated and max_rows is not None and fetched == max_rows:
+        truncated = cursor.fetchone() is not None
+
+    if not frames:
+        return pd.DataFrame(columns=columns), truncated
+    if len(frames) == 1:
+        return frames[0], truncated
+    return pd.concat(frames, ignore_index=True), truncated
+
+
+def write_csv(cursor, out, chunk_size=CHUNK_SIZE):
+    """
+    Stream an executed cursor to a text file object as CSV; returns the
+    number of rows written
+    """
+    writer = csv.writer(out)
+    writer.writerow(column_names(cursor))
+    written = 0
+    for rows in iter_chunks(cursor, chunk_size):
+        writer.writerows(rows)
+        written += len(rows)
+    return written
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def write_parquet(cursor, path, chunk_size=CHUNK_SIZE):
+    """
+    Stream an executed cursor to a Parquet file, one row group per chunk;
+    needs pyarrow. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = column_names(cursor)
+    writer = None
+    written = 0
+    try:
+        for rows in iter_chunks(cursor, chunk_size):
+            table = pa.table(dict(zip(columns, map(list, zip(*rows)))))
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            written += len(rows)
+        if writer is None:
+            pq.write_table(pa.table({name: pa.array([], pa.null()) for name in columns}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def export_query(query, path, fmt="csv", conn=None, chunk_size=CHUNK_SIZE):
+    """
+    Run a query and stream its full result to a CSV or Parquet file without
+    holding the result in memory
+    """
+    if conn is None:
+        with replica.report_connection() as conn:
+            return export_query(query, path, fmt, conn, chunk_size)
+
+    return write_file(conn.execute(query), path, fmt, chunk_size)
+
+
+def write_file(cursor, path, fmt="csv", chunk_size=CHUNK_SIZE):
+    """
+    Stream an executed cursor to a CSV or Parquet file; returns the number
+    of rows written
+    """
+    if fmt == "parquet":
+        return write_parquet(cursor, path, chunk_size)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        return write_csv(cursor, out, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a query result to CSV or Parquet")
+    parser.add_argument("query")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--db", default=db.DB_PATH, help="path to the SQLite database (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    pool = db.ConnectionPool(args.db, size=1)
+    try:
+        with pool.connection() as conn:
+            written = export_query(args.query, args.output, args.format, conn)
+    finally:
+        pool.close()
+    print(f"Wrote {written} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import time
+
+# Sampling limits for on-demand statistics (overridable through the environment)
+SAMPLE_ROWS = int(os.environ.get("CRM_STATS_SAMPLE_ROWS", "100000"))
+ANALYSIS_LIMIT = int(os.environ.get("CRM_STATS_ANALYSIS_LIMIT", "1000"))
+
+# Exact row counts kept by the rollup triggers (see metrics.create_rollups)
+TRIGGER_COUNTS = {
+    "products": "products",
+    "sales": "orders",
+    "feedback": "feedback_count",
+}
+# Counters that also cover rows moved to archive files, and the
+# archive_partitions column holding those rows (see archive.py)
+ARCHIVED_COUNTS = {
+    "sales": "sales_rows",
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_stats_table(c):
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS table_column_stats (
+        table_name TEXT NOT NULL,
+        column_name TEXT NOT NULL,
+        distinct_count INTEGER,
+        null_fraction REAL,
+        sampled_rows INTEGER NOT NULL,
+        analyzed_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (table_name, column_name)
+    ) WITHOUT ROWID
+    ''')
+    # Sizes on disk as of the last analyze_table(); measuring walks every page
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS table_sizes (
+        table_name TEXT PRIMARY KEY,
+        table_bytes INTEGER NOT NULL,
+        table_pages INTEGER NOT NULL,
+        index_bytes INTEGER NOT NULL,
+        index_pages INTEGER NOT NULL,
+        measured_at TIMESTAMP NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def row_estimate(conn, table):
+    """
+    Row count without scanning the table. Returns (rows, source), trying a
+    trigger-maintained counter, then sqlite_stat1 from the last ANALYZE, then
+    max(rowid) as an upper bound. rows is None when nothing cheap is known.
+    """
+    name = TRIGGER_COUNTS.get(table)
+    if name and _has_table(conn, "metric_totals"):
+        row = conn.execute("SELECT value FROM metric_totals WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            archived = ARCHIVED_COUNTS.get(table)
+            if archived and _has_table(conn, "archive_partitions"):
+                moved = conn.execute(f"SELECT COALESCE(SUM({archived}), 0) FROM archive_partitions").fetchone()[0]
+                return int(row[0]) - moved, "exact (trigger counter less archived rows)"
+            return int(row[0]), "exact (trigger counter)"
+
+    if _has_table(conn, "sqlite_stat1"):
+        # Every entry starts with the row count; partial indexes report fewer
+        rows = [row[0] for row in conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table,))]
+        counts = [int(stat.split()[0]) for stat in rows if stat]
+        if counts:
+            return max(counts), "estimate (ANALYZE)"
+
+    try:
+        row = conn.execute(f"SELECT MAX(rowid) FROM {_quote(table)}").fetchone()
+    except sqlite3.OperationalError:
+        # WITHOUT ROWID table
+        return None, "unknown"
+    return (row[0] or 0), "upper bound (max rowid)"
+
+
+def index_cardinality(conn, table):
+    """
+    Distinct-value estimates for the leading column of each index, from
+    sqlite_stat1
+    """
+    if not _has_table(conn, "sqlite_stat1"):
+        return {}
+    estimates = {}
+    for index, stat in conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ? AND idx IS NOT NULL",
+                                    (table,)):
+        parts = stat.split()
+        if len(parts) < 2 or int(parts[1]) == 0:
+            continue
+        info = conn.execute(f"PRAGMA index_info({_quote(index)})").fetchone()
+        if info is None or info[2] is None:
+            continue
+        estimates.setdefault(info[2], int(parts[0]) // int(parts[1]))
+    return estimates
+
+
+def dbstat_available(conn):
+    try:
+        conn.execute("SELECT 1 FROM dbstat LIMIT 1").fetchall()
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def table_size(conn, table):
+    """
+    Bytes and pages used by the table and by its indexes, via dbstat;
+    None without the dbstat virtual table. Reads every page of the table
+    and its indexes, so pages show stored_size() instead.
+    """
+    if not dbstat_available(conn):
+        return None
+    indexes = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))]
+    sizes = {}
+    for name in [table] + indexes:
+        row = conn.execute("SELECT pgsize, pageno FROM dbstat WHERE name = ? AND aggregate = TRUE",
+                           (name,)).fetchone()
+        sizes[name] = (row[0] or 0, row[1] or 0) if row else (0, 0)
+    return {
+        "table_bytes": sizes[table][0],
+        "table_pages": sizes[table][1],
+        "index_bytes": sum(sizes[name][0] for name in indexes),
+        "index_pages": sum(sizes[name][1] for name in indexes),
+    }
+
+
+def stored_size(conn, table):
+    """
+    The size analyze_table() last measured, with measured_at; None if it
+    has not been measured
+    """
+    if not _has_table(conn, "table_sizes"):
+        return None
+    row = conn.execute('''
+    SELECT table_bytes, table_pages, index_bytes, index_pages, measured_at
+    FROM table_sizes WHERE table_name = ?
+    ''', (table,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("table_bytes", "table_pages", "index_bytes", "index_pages", "measured_at"), row))
+
+
+def column_stats(conn, table, rows=None):
+    """
+    Per-column distinct counts and null fractions. Sampled figures from the
+    last analyze_table() are used where present, otherwise index estimates;
+    a single-column primary key has as many distinct values as `rows`.
+    """
+    columns = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    stored = {}
+    if _has_table(conn, "table_column_stats"):
+        for row in conn.execute('''
+        SELECT column_name, distinct_count, null_fraction, sampled_rows, analyzed_at
+        FROM table_column_stats WHERE table_name = ?
+        ''', (table,)):
+            stored[row[0]] = row[1:]
+    from_indexes = index_cardinality(conn, table)
+    primary_key = [column[1] for column in columns if column[5]]
+
+    result = []
+    for column in columns:
+        name = column[1]
+        if name in stored:
+            distinct, null_fraction, sampled, analyzed_at = stored[name]
+            source = f"sample of {sampled:,} rows, {analyzed_at}"
+        elif primary_key == [name] and rows is not None:
+            distinct, null_fraction, source = rows, 0.0, "primary key"
+        elif name in from_indexes:
+            distinct, null_fraction, source = from_indexes[name], None, "index statistics"
+        else:
+            distinct, null_fraction, source = None, None, None
+        result.append({"column": name, "distinct": distinct, "null_fraction": null_fraction, "source": source})
+    return result
+
+
+def analyze_table(conn, table, sample_rows=SAMPLE_ROWS):
+    """
+    Refresh sqlite_stat1 for the table with a bounded ANALYZE, store
+    sampled distinct counts and null fractions for every column, and
+    measure the table's size on disk
+    """
+    quoted = _quote(table)
+    conn.execute(f"PRAGMA analysis_limit = {int(ANALYSIS_LIMIT)}")
+    conn.execute(f"ANALYZE {quoted}")
+
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({quoted})")]
+    if not columns:
+        return []
+    expressions = ["COUNT(*)"]
+    for name in columns:
+        expressions.append(f"COUNT(DISTINCT {_quote(name)})")
+        expressions.append(f"SUM({_quote(name)} IS NULL)")
+    row = conn.execute(
+        f"SELECT {', '.join(expressions)} FROM (SELECT * FROM {quoted} LIMIT ?)", (sample_rows,)
+    ).fetchone()
+
+    sampled = row[0]
+    analyzed_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    stats = []
+    for i, name in enumerate(columns):
+        distinct, nulls = row[1 + 2 * i], row[2 + 2 * i] or 0
+        stats.append((table, name, distinct, nulls / sampled if sampled else 0.0, sampled, analyzed_at))
+    conn.executemany('''
+    INSERT OR REPLACE INTO table_column_stats
+        (table_name, column_name, distinct_count, null_fraction, sampled_rows, analyzed_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', stats)
+
+    size = table_size(conn, table)
+    if size is not None:
+        conn.execute('''
+        INSERT OR REPLACE INTO table_sizes
+            (table_name, table_bytes, table_pages, index_bytes, index_pages, measured_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (table, size["table_bytes"], size["table_pages"], size["index_bytes"], size["index_pages"],
+              analyzed_at))
+    return stats
+
+
+def table_summary(conn, table):
+    rows, source = row_estimate(conn, table)
+    return {
+        "rows": rows,
+        "rows_source": source,
+        "size": stored_size(conn, table),
+        "columns": column_stats(conn, table, rows),
+    }
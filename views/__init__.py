@@ -0,0 +1,80 @@
+import functools
+import importlib
+import os
+
+import streamlit as st
+
+import profiler
+
+# Pages as stored in st.session_state.page; each one lives in its own
+# module, views/<page>_page.py, imported the first time it is shown so a
+# session only loads the libraries of the pages it visits
+PAGES = ["login", "dashboard", "analytics", "products", "feedback", "database", "customers", "record_sales",
+         "import", "inventory", "performance"]
+
+# Show each run's time and SQL statement count under the page and under
+# every fragment rerun; a diagnostic, off unless CRM_SHOW_RERUN_STATS=1
+SHOW_RERUN_STATS = os.environ.get("CRM_SHOW_RERUN_STATS", "0") == "1"
+# Pause in typing after which search boxes apply their text (overridable
+# through the environment)
+SEARCH_DEBOUNCE = os.environ.get("CRM_SEARCH_DEBOUNCE", "300ms")
+
+
+def module_name(page):
+    return f"views.{page}_page"
+
+
+def count_run(scope):
+    """
+    Count a script run ("script") or fragment rerun ("fragment") for this
+    session; returns the session's counts
+    """
+    counts = st.session_state.setdefault("rerun_counts", {"script": 0, "fragment": 0})
+    counts[scope] += 1
+    return counts
+
+
+def show_rerun_stats(stats, label):
+    if not SHOW_RERUN_STATS:
+        return
+    counts = st.session_state.get("rerun_counts", {"script": 0, "fragment": 0})
+    # Statements are only counted while the profiler times them
+    statements = f", {stats['statements']:,} SQL statements" if profiler.ENABLED else ""
+    st.caption(f"{label}: {stats['seconds'] * 1000:,.0f} ms{statements} | "
+               f"this session: {counts['script']:,} script runs, {counts['fragment']:,} fragment reruns")
+
+
+def render(page):
+    """
+    Import the page's module (once per process) and draw the page
+    """
+    module = importlib.import_module(module_name(page))
+    try:
+        module.render()
+    except BaseException:
+        # st.rerun() and st.stop() end the script run here too; close it so
+        # the next fragment rerun on this thread is counted as its own run
+        profiler.end_rerun()
+        raise
+
+
+def fragment(func):
+    """
+    st.fragment for a unit of a page: a widget inside it reruns only this
+    function, with the arguments it was last called with. Those reruns are
+    timed on their own, as "<page>/<function>", with their SQL statements.
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        if profiler.in_rerun():
+            # Drawn by a full script run, which does the counting
+            return func(*args, **kwargs)
+        profiler.begin_rerun(st.session_state.get("page"), func.__name__)
+        try:
+            count_run("fragment")
+            result = func(*args, **kwargs)
+            show_rerun_stats(profiler.rerun_stats(), "Section rerun")
+            return result
+        finally:
+            profiler.end_rerun()
+    return st.fragment(run)
@@ -0,0 +1,57 @@
+import streamlit as st
+
+import analytics
+from views import fragment
+from views.data import show_staleness
+
+
+def render():
+    st.title("Sales Analytics")
+    
+    # Incremental: only sales added since the last visit are read
+    extract = analytics.get_extract()
+    extract.refresh()
+    sales_frame = extract.frame()
+    extract_stats = extract.stats()
+    st.caption(f"{extract_stats['rows']:,} sales in memory "
+               f"({extract_stats['memory_bytes'] / 2 ** 20:,.1f} MiB); last refresh read "
+               f"{extract_stats['last_refresh']['rows']:,} rows in "
+               f"{extract_stats['last_refresh']['seconds'] * 1000:.0f} ms")
+    show_staleness()
+    
+    if sales_frame.empty:
+        st.info("No sales recorded yet.")
+    else:
+        # Each chart reruns alone when its control changes, on the frame
+        # this script run refreshed
+        category_revenue_chart(sales_frame)
+        daily_revenue_chart(sales_frame)
+        
+        st.subheader("Product Velocity (last 30 days)")
+        velocity = analytics.product_velocity(sales_frame, extract.products, days=30)
+        st.dataframe(velocity.head(50).round(2))
+        
+        st.subheader("Monthly Cohort Retention")
+        retention = analytics.cohort_retention(sales_frame)
+        if retention.empty:
+            st.info("No customer emails recorded on sales yet.")
+        else:
+            retention.index = retention.index.astype(str)
+            months = retention.columns[1:]
+            retention[months] = (retention[months] * 100).round(1)
+            retention.columns = ["customers"] + [f"month {col} %" for col in months]
+            st.dataframe(retention)
+
+
+@fragment
+def category_revenue_chart(sales_frame):
+    st.subheader("Revenue by Category")
+    period = st.selectbox("Period", list(analytics.PERIODS), index=2)
+    st.bar_chart(analytics.revenue_by_category(sales_frame, period))
+
+
+@fragment
+def daily_revenue_chart(sales_frame):
+    st.subheader("Daily Revenue")
+    window = st.number_input("Moving average window (days)", min_value=1, max_value=90, value=7)
+    st.line_chart(analytics.moving_average(sales_frame, int(window)))
@@ -0,0 +1,81 @@
+import streamlit as st
+
+import customers
+from views import SEARCH_DEBOUNCE, fragment
+from views.data import get_customer, get_top_customers, search_customers
+
+# Columns of the search results table
+RESULT_COLUMNS = ("name", "email", "orders", "lifetime_value", "last_purchase", "average_rating")
+
+
+def render():
+    st.title("Customers")
+
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to view customers. Admin privileges required.")
+    else:
+        st.markdown("""
+        Customers are matched on their email, ignoring case and surrounding spaces, across sales and
+        feedback. Lifetime value, orders and ratings are kept current as sales and feedback are
+        recorded, and include archived months.
+        """)
+        customer_lookup()
+
+
+@fragment
+def customer_lookup():
+    # Typing and picking a customer rerun only this section
+    search_term = st.text_input("Search by email or name", type="search", live=SEARCH_DEBOUNCE,
+                                placeholder="Start of an email address or name")
+    if search_term.strip():
+        matches = search_customers(search_term)
+        more = "+" if len(matches) == customers.SEARCH_LIMIT else ""
+        st.markdown(f"### Matching Customers ({len(matches)}{more})")
+    else:
+        matches = get_top_customers()
+        st.markdown("### Top Customers by Lifetime Value")
+
+    if not matches:
+        st.info("No customers found matching your search.")
+        return
+
+    st.dataframe([{column: match[column] for column in RESULT_COLUMNS} for match in matches],
+                 hide_index=True)
+
+    emails = [match['email'] for match in matches]
+    names = {match['email']: match['name'] for match in matches}
+    selected_email = st.selectbox("Customer", emails,
+                                  format_func=lambda email: f"{names[email] or 'Unnamed'} <{email}>")
+    customer = get_customer(selected_email)
+    if customer is None:
+        st.warning("This customer no longer exists.")
+        return
+    show_customer(customer)
+
+
+def show_customer(customer):
+    st.markdown(f"### {customer['name'] or customer['email']}")
+    st.caption(customer['email'])
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Lifetime Value", f"${customer['lifetime_value']:,.2f}")
+    col2.metric("Orders", f"{customer['orders']:,}")
+    col3.metric("Last Purchase", (customer['last_purchase'] or "Never")[:10])
+    average_rating = customer['average_rating']
+    col4.metric("Average Rating", f"{average_rating:.2f} / 5 ({customer['ratings']:,})" if average_rating
+                else "No ratings")
+
+    st.subheader("Recent Orders")
+    orders = customer['recent_orders']
+    if orders:
+        st.dataframe(orders, hide_index=True)
+    # Orders moved to archive files count in the totals but are not listed
+    if customer['orders'] > len(orders) and len(orders) < customers.SEARCH_LIMIT:
+        st.caption(f"{customer['orders'] - len(orders):,} older orders are in archived months.")
+    elif not orders:
+        st.info("No orders yet.")
+
+    st.subheader("Recent Feedback")
+    if customer['recent_feedback']:
+        st.dataframe(customer['recent_feedback'], hide_index=True)
+    else:
+        st.info("No feedback yet.")
@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import streamlit as st
+
+import metrics
+from views.data import (count_unscored_feedback, get_dashboard_metrics, get_product_sentiment,
+                        get_recent_products, get_top_products, get_topic_breakdown, score_feedback,
+                        show_staleness)
+
+
+def render():
+    st.title("Dashboard")
+    
+    # Display date and welcome message
+    current_date = datetime.now().strftime("%B %d, %Y")
+    st.markdown(f"### Today: {current_date}")
+    st.markdown(f"### Welcome back, {st.session_state.username}!")
+    
+    # Key metrics (read from the rollup tables)
+    dashboard_metrics = get_dashboard_metrics()
+    show_staleness()
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric(label="Total Products", value=dashboard_metrics['products'])
+    
+    with col2:
+        st.metric(label="Customer Feedback", value=dashboard_metrics['feedback_count'])
+    
+    with col3:
+        st.metric(label="User Role", value=st.session_state.role.capitalize() if st.session_state.role else "Guest")
+    
+    col4, col5, col6, col7 = st.columns(4)
+    
+    with col4:
+        st.metric(label="Revenue", value=f"${dashboard_metrics['revenue']:,.2f}")
+    
+    with col5:
+        st.metric(label="Units Sold", value=f"{dashboard_metrics['units']:,}")
+    
+    with col6:
+        average_rating = dashboard_metrics['average_rating']
+        st.metric(label="Average Rating", value=f"{average_rating:.2f} / 5" if average_rating else "No ratings")
+    
+    with col7:
+        st.metric(label=f"Low Stock (≤ {metrics.LOW_STOCK_THRESHOLD})", value=dashboard_metrics['low_stock'])
+    
+    # Top sellers
+    top_sellers = get_top_products(5)
+    if top_sellers:
+        st.markdown("### Top Products by Revenue")
+        for rank, product in enumerate(top_sellers, start=1):
+            st.markdown(f"{rank}. **{product['name']}** ({product['category']}) - "
+                        f"${product['revenue']:,.2f} from {product['units']} units")
+    
+    # Customer sentiment from the scored feedback comments
+    st.markdown("### Customer Sentiment")
+    sentiment_col1, sentiment_col2 = st.columns(2)
+    with sentiment_col1:
+        st.markdown("**Lowest Sentiment Products**")
+        for product in get_product_sentiment(5):
+            st.markdown(f"- **{product['name']}**: {product['average']:+.2f} over {product['scored']} comments "
+                        f"({product['negative']} negative)")
+    with sentiment_col2:
+        st.markdown("**Topics**")
+        for topic in get_topic_breakdown():
+            st.markdown(f"- {topic['topic'].capitalize()}: {topic['comments']:,} comments, "
+                        f"average {topic['average']:+.2f}")
+    if st.session_state.role == 'admin':
+        unscored_feedback = count_unscored_feedback()
+        st.caption(f"{unscored_feedback:,} feedback comments waiting to be scored")
+        if unscored_feedback and st.button("Score New Feedback"):
+            try:
+                scored = score_feedback()
+            except Exception as e:
+                st.error(f"Scoring failed: {str(e)}")
+            else:
+                st.success(f"Scored {scored:,} comments")
+                st.rerun()
+
+    # Quick links
+    st.markdown("### Quick Links")
+    quick_col1, quick_col2 = st.columns(2)
+    
+    with quick_col1:
+        if st.button("Search Products"):
+            st.session_state.page = 'products'
+            st.rerun()
+    
+    with quick_col2:
+        if st.button("Submit Feedback"):
+            st.session_state.page = 'feedback'
+            st.rerun()
+    
+    # Recent products
+    st.markdown("### Recent Products")
+    products = get_recent_products(5)  # Get 5 most recent products
+    
+    for product in products:
+        st.markdown(f"""
+        **{product['name']}** - ${product['price']:.2f}  
+        {product['description']}  
+        Category: {product['category']} | Stock: {product['stock_quantity']}
+        """)
+        st.markdown("---")
@@ -0,0 +1,405 @@
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import streamlit as st
+
+import archive
+import auth
+import cache
+import customers
+import db
+import feedback_queue
+import inventory
+import metrics
+import profiler
+import query_guard
+import recommend
+import replica
+import search
+import sentiment
+import startup
+import streaming
+import table_stats
+
+# User Authentication Functions
+@profiler.timed
+def verify_password(username, password):
+    # One indexed lookup returns the user and role; old hashes are upgraded on success
+    return auth.authenticate(username, password)
+
+@profiler.timed
+def username_exists(username):
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username,))
+        count = c.fetchone()[0]
+    
+    return count > 0
+
+@profiler.timed
+def register_user(username, password, role="customer"):
+    if username_exists(username):
+        return False, "Username already exists. Please choose a different username."
+    
+    hashed_password = auth.hash_password(password)
+    
+    try:
+        with db.connection() as conn:
+            conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, hashed_password, role)
+            )
+        return True, "Registration successful! Please log in."
+    except Exception as e:
+        return False, f"Registration failed: {str(e)}"
+
+# Product Functions
+def _product_filter(search_term, category):
+    clauses = []
+    params = []
+    
+    if search_term:
+        clauses.append("(name LIKE ? OR description LIKE ?)")
+        params.extend([f"%{search_term}%", f"%{search_term}%"])
+    if category and category != "All":
+        clauses.append("category = ?")
+        params.append(category)
+    
+    return clauses, params
+
+@profiler.timed
+@cache.cached("products")
+def get_products(search_term=None, category=None, after_id=None, limit=None):
+    # With a limit, results are one keyset page: ordered by id, resuming after the cursor
+    paged = limit is not None
+    
+    # Full-text search when the FTS5 index exists (ranked unless paging)
+    if search_term:
+        with db.connection() as conn:
+            products = search.search_products(conn, search_term, category,
+                                              limit=limit, after_id=after_id, keyset=paged)
+        if products is not None:
+            return products
+    
+    clauses, params = _product_filter(search_term, category)
+    if paged and after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    
+    query = "SELECT * FROM products"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    if paged:
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+    
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        c.execute(query, params)
+        products = [dict(row) for row in c.fetchall()]
+    
+    return products
+
+@profiler.timed
+@cache.cached("products")
+def count_products(search_term=None, category=None):
+    if search_term:
+        with db.connection() as conn:
+            count = search.count_products(conn, search_term, category)
+        if count is not None:
+            return count
+    
+    clauses, params = _product_filter(search_term, category)
+    if not clauses:
+        # Kept current by the products count triggers, so no index walk
+        with db.connection() as conn:
+            return int(conn.execute("SELECT value FROM metric_totals WHERE name = 'products'").fetchone()[0])
+    query = "SELECT COUNT(*) FROM products"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    
+    with db.connection() as conn:
+        count = conn.execute(query, params).fetchone()[0]
+    
+    return count
+
+@profiler.timed
+@cache.cached("products")
+def get_product_categories():
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT category FROM products")
+        categories = [row[0] for row in c.fetchall()]
+    
+    return categories
+
+@profiler.timed
+@cache.cached("products")
+def get_product_by_id(product_id):
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        c.execute("SELECT * FROM products WHERE id = ?", (product_id,))
+        product = c.fetchone()
+        # Precomputed "customers also bought" list, one primary key lookup
+        also_bought = recommend.neighbors(conn, product_id, 5) if product else []
+    
+    return dict(product, also_bought=also_bought) if product else None
+
+@profiler.timed
+@cache.cached("product_neighbors")
+def get_also_bought(product_ids, limit=3):
+    # Neighbor lists for a page of products in one query
+    with db.connection() as conn:
+        return recommend.neighbors_for(conn, list(product_ids), limit)
+
+@profiler.timed
+def count_pending_recommendation_sales():
+    with db.read_connection() as conn:
+        return recommend.pending_sales(conn)
+
+@profiler.timed
+def refresh_recommendations(full=False):
+    # Only sales recorded since the last refresh are read, unless full
+    with db.connection() as conn:
+        result = recommend.refresh(conn, full=full)
+    cache.invalidate("products", "product_neighbors")
+    return result
+
+@profiler.timed
+@cache.cached("products")
+def get_recent_products(limit=5):
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        c.execute("SELECT * FROM products ORDER BY id DESC LIMIT ?", (limit,))
+        products = [dict(row) for row in c.fetchall()]
+    
+    return products
+
+# Dashboard Functions (served from the rollup tables, via the reporting connection)
+@profiler.timed
+@cache.cached("metrics", ttl=60)
+def get_dashboard_metrics():
+    with replica.report_connection() as conn:
+        return metrics.summary(conn)
+
+@profiler.timed
+@cache.cached("metrics", ttl=60)
+def get_top_products(limit=5):
+    with replica.report_connection() as conn:
+        return metrics.top_products(conn, limit)
+
+def show_staleness():
+    # In snapshot mode reports lag the primary; say by how much
+    if not replica.snapshot_enabled():
+        return
+    age = replica.staleness()
+    if age is None:
+        st.caption("Reporting snapshot not taken yet")
+    else:
+        taken_at = datetime.fromtimestamp(time.time() - age).strftime("%H:%M:%S")
+        st.caption(f"Reporting snapshot from {taken_at} ({age / 60:.0f} min old); "
+                   "recent changes may not be shown yet")
+
+# Inventory Functions (ledger replayed from inventory_log)
+@profiler.timed
+def get_inventory_reconciliation():
+    # Applies only the log rows added since the last replay
+    with db.connection() as conn:
+        return inventory.reconcile(conn)
+
+@profiler.timed
+def get_low_stock_alerts(limit=50):
+    with db.connection() as conn:
+        return inventory.low_stock_alerts(conn, limit=limit)
+
+@profiler.timed
+@cache.cached("inventory_log", ttl=60)
+def get_stock_as_of(as_of, product_id=None):
+    with db.read_connection() as conn:
+        return inventory.stock_as_of(conn, as_of, product_id)
+
+# Sentiment Functions (served from the stored scores)
+@profiler.timed
+@cache.cached("feedback_sentiment", ttl=60)
+def get_product_sentiment(limit=5, order="asc"):
+    with replica.report_connection() as conn:
+        return sentiment.product_sentiment(conn, limit=limit, order=order)
+
+@profiler.timed
+@cache.cached("feedback_sentiment", ttl=60)
+def get_topic_breakdown():
+    with replica.report_connection() as conn:
+        return sentiment.topic_breakdown(conn)
+
+@profiler.timed
+def count_unscored_feedback():
+    with db.read_connection() as conn:
+        return sentiment.unscored(conn)
+
+@profiler.timed
+def score_feedback():
+    # Only feedback added or edited since the last run is scored
+    with db.connection() as conn:
+        scored = sentiment.score_new(conn)
+    cache.invalidate("feedback_sentiment")
+    replica.request_refresh()
+    return scored
+
+# Customer Functions (one indexed row per customer, kept current by triggers)
+@profiler.timed
+def search_customers(term, limit=customers.SEARCH_LIMIT):
+    with db.read_connection() as conn:
+        return customers.search(conn, term, limit)
+
+@profiler.timed
+def get_top_customers(limit=customers.SEARCH_LIMIT):
+    with db.read_connection() as conn:
+        return customers.top_customers(conn, limit)
+
+@profiler.timed
+def get_customer(email, limit=customers.SEARCH_LIMIT):
+    # Precomputed totals, then the latest orders and feedback, each read
+    # from the customer's end of an index
+    with db.read_connection() as conn:
+        customer = customers.customer(conn, email)
+        if customer is None:
+            return None
+        return dict(customer, recent_orders=customers.recent_orders(conn, email, limit),
+                    recent_feedback=customers.recent_feedback(conn, email, limit))
+
+# Startup Functions
+@profiler.timed
+def profile_startup():
+    # Fresh interpreters: import time of every page's module, then the
+    # login page's first paint
+    return {"pages": startup.page_imports(), "first_paint": startup.first_paint("login")}
+
+# Feedback Functions
+@profiler.timed
+def submit_feedback(customer_name, customer_email, product_id, rating, comments):
+    # Queued for the background writer, which commits in batches and
+    # invalidates the metrics cache; False means the queue stayed full
+    try:
+        feedback_queue.submit(customer_name, customer_email, product_id, rating, comments)
+    except feedback_queue.QueueFull:
+        return False
+    return True
+
+# Database Explorer Functions
+@profiler.timed
+def get_tables():
+    with replica.report_connection() as conn:
+        c = conn.cursor()
+        
+        # Get list of tables
+        c.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        tables = [row[0] for row in c.fetchall()]
+    
+    return tables
+
+@profiler.timed
+@cache.cached("table_stats", ttl=60)
+def get_table_info(table_name):
+    with replica.report_connection() as conn:
+        c = conn.cursor()
+        
+        # Get table info (columns)
+        c.execute(f"PRAGMA table_info({table_name});")
+        columns = c.fetchall()
+        
+        # Get first 5 rows
+        c.execute(f"SELECT * FROM {table_name} LIMIT 5;")
+        sample_data = c.fetchall()
+        
+        # Row estimate, sizes and column statistics without scanning the table
+        stats = table_stats.table_summary(conn, table_name)
+    
+    return {"columns": columns, "sample_data": sample_data, "row_count": stats['rows'],
+            "row_count_source": stats['rows_source'], "size": stats['size'], "column_stats": stats['columns']}
+
+@profiler.timed
+def analyze_table(table_name):
+    with db.connection() as conn:
+        table_stats.analyze_table(conn, table_name)
+    cache.invalidate("table_stats")
+    replica.request_refresh()
+
+@profiler.timed
+@cache.cached("archive_partitions", ttl=60)
+def get_archive_partitions():
+    # Archived months with the catalog's row counts and their file sizes,
+    # and the hot tables with their counters and last measured sizes
+    with replica.report_connection() as conn:
+        partitions = archive.partitions(conn)
+        hot = {table: (table_stats.row_estimate(conn, table)[0], table_stats.stored_size(conn, table))
+               for table in archive.TABLES}
+    return partitions, hot
+
+@profiler.timed
+def roll_over_archives():
+    with db.connection() as conn:
+        archived = archive.rollover(conn)
+    cache.invalidate("inventory_log", "table_stats")
+    replica.request_refresh()
+    return archived
+
+def _wait_for(run):
+    # Poll so the script stays responsive and Cancel can stop the statement
+    st.button("Cancel Query", key=f"cancel_{run.id}", on_click=query_guard.cancel, args=(run.id,))
+    status = st.empty()
+    while not run.wait(0.25):
+        status.caption(f"Running for {run.elapsed():.1f}s...")
+    status.empty()
+    return run.result
+
+@profiler.timed
+def execute_query(query, max_rows=streaming.MAX_RESULT_ROWS):
+    # Runs on a worker thread under a time limit; queries use a read-only
+    # connection
+    result = _wait_for(query_guard.start(query, max_rows))
+
+    if result['success'] and not result['read_only']:
+        # Drop cached reads of any table the write touched, and the dashboard rollups
+        cache.invalidate_for_sql(query)
+        cache.invalidate("metrics", "table_stats")
+        replica.request_refresh()
+    return result
+
+def export_download(query, key):
+    # Stream the full result to a private temporary file under the query
+    # time limit, then offer it for download. Streamlit holds a download in
+    # memory, so files over the cap are refused rather than served.
+    formats = ["csv", "parquet"] if streaming.parquet_available() else ["csv"]
+    fmt = st.selectbox("Export format", formats, key=f"{key}_format")
+    if st.button("Export Full Result", key=f"{key}_export"):
+        fd, path = tempfile.mkstemp(prefix="crm_export_", suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            result = _wait_for(query_guard.start_export(query, path, fmt))
+            if not result['success']:
+                st.error(f"Export failed: {result['error']}")
+                return
+            size = os.path.getsize(path)
+            limit = streaming.MAX_DOWNLOAD_BYTES
+            if size > limit:
+                st.error(f"The export is {size / 2 ** 20:,.1f} MiB, over the {limit / 2 ** 20:,.0f} MiB "
+                         "download limit. Narrow the query, or export it on the server with "
+                         "`python streaming.py QUERY OUTPUT`.")
+                return
+            with open(path, "rb") as export_file:
+                data = export_file.read()
+        finally:
+            os.remove(path)
+        st.download_button(
+            f"Download {fmt.upper()} ({result['row_count']} rows)",
+            data,
+            file_name=f"{key}.{fmt}",
+            mime="text/csv" if fmt == "csv" else "application/octet-stream",
+            key=f"{key}_download",
+        )
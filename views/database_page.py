@@ -0,0 +1,383 @@
+import streamlit as st
+import pandas as pd
+
+import archive
+import cache
+import db
+import feedback_queue
+import migrations
+import profiler
+import query_audit
+import query_guard
+import recommend
+import replica
+import streaming
+from views import fragment
+from views.data import (analyze_table, count_pending_recommendation_sales, execute_query, export_download,
+                        get_archive_partitions, get_table_info, get_tables, refresh_recommendations,
+                        roll_over_archives, show_staleness)
+
+
+def render():
+    st.title("Database Explorer")
+    
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to access the database explorer. Admin privileges required.")
+    else:
+        # Get the database tables
+        tables = get_tables()
+        show_staleness()
+
+        # Connection pool counters
+        with st.expander("Connection Pool Statistics"):
+            pool_stats = db.pool_stats()
+            stat_col1, stat_col2, stat_col3, stat_col4 = st.columns(4)
+            stat_col1.metric("Pool Hits", pool_stats['hits'])
+            stat_col2.metric("Pool Misses", pool_stats['misses'])
+            stat_col3.metric("Waits", pool_stats['waits'])
+            stat_col4.metric("Avg Wait (ms)", f"{pool_stats['wait_time_avg'] * 1000:.2f}")
+            st.markdown(
+                f"**Open connections:** {pool_stats['open']} / {pool_stats['size']} "
+                f"({pool_stats['in_use']} in use) | "
+                f"**Max wait:** {pool_stats['wait_time_max'] * 1000:.2f} ms | "
+                f"**Timeouts:** {pool_stats['timeouts']}"
+            )
+
+        # Catalog read cache counters
+        with st.expander("Cache Statistics"):
+            cache_statistics()
+
+        # Storage mode and the reporting snapshot
+        with st.expander("Storage Mode"):
+            storage_mode()
+
+        # Closed months moved out of the hot database file
+        with st.expander("Archive Partitions"):
+            archive_partitions()
+
+        # "Customers also bought" neighbor lists
+        with st.expander("Recommendations"):
+            recommendations()
+
+        # Write-behind feedback queue
+        with st.expander("Feedback Queue"):
+            queue_stats = feedback_queue.stats()
+            queue_col1, queue_col2, queue_col3, queue_col4 = st.columns(4)
+            queue_col1.metric("Queue Depth", f"{queue_stats['depth']} / {queue_stats['capacity']}")
+            queue_col2.metric("Committed", queue_stats['committed'])
+            queue_col3.metric("Rejected", queue_stats['rejected'])
+            queue_col4.metric("Avg Commit (ms)", f"{queue_stats['commit_time_avg'] * 1000:.2f}")
+            st.markdown(
+                f"**Writer running:** {'yes' if queue_stats['running'] else 'no'} | "
+                f"**Max depth:** {queue_stats['max_depth']} | "
+                f"**Batches:** {queue_stats['batches']} | "
+                f"**Max commit:** {queue_stats['commit_time_max'] * 1000:.2f} ms | "
+                f"**Failed batches:** {queue_stats['failed_batches']} | "
+                f"**Dead-lettered:** {queue_stats['dead_lettered']} | "
+                f"**Replayed from spill file:** {queue_stats['replayed']}"
+            )
+
+        # EXPLAIN QUERY PLAN audit of the app's own queries
+        with st.expander("Query Plan Audit"):
+            query_plan_audit()
+
+        # Two tabs for exploring tables and running custom queries
+        db_tab1, db_tab2 = st.tabs(["Explore Tables", "Run Custom Queries"])
+        
+        with db_tab1:
+            table_explorer(tables)
+        
+        with db_tab2:
+            query_runner()
+
+
+@fragment
+def cache_statistics():
+    cache_stats = cache.stats()
+    cache_col1, cache_col2, cache_col3, cache_col4 = st.columns(4)
+    cache_col1.metric("Cache Hits", cache_stats['hits'])
+    cache_col2.metric("Cache Misses", cache_stats['misses'])
+    cache_col3.metric("Evictions", cache_stats['evictions'] + cache_stats['expirations'])
+    cache_col4.metric("Hit Ratio", f"{cache_stats['hit_ratio']:.0%}")
+    st.markdown(
+        f"**Entries:** {cache_stats['size']} / {cache_stats['maxsize']} | "
+        f"**LRU evictions:** {cache_stats['evictions']} | "
+        f"**TTL expirations:** {cache_stats['expirations']} | "
+        f"**Invalidations:** {cache_stats['invalidations']}"
+    )
+    st.button("Clear Cache", on_click=cache.clear)
+
+
+@fragment
+def storage_mode():
+    # Drawn above the refresh button, once any refresh it asked for is done
+    stats_area = st.container()
+    if replica.snapshot_enabled() and st.button("Refresh Snapshot Now"):
+        try:
+            replica.get_snapshotter().refresh()
+        except Exception as e:
+            st.error(f"Snapshot failed: {str(e)}")
+    with stats_area:
+        storage_stats = replica.stats()
+        show_storage_stats(storage_stats)
+
+
+def show_storage_stats(storage_stats):
+    if storage_stats['mode'] != "snapshot":
+        st.markdown(f"**Mode:** {storage_stats['mode']} | Reports and read-only queries use "
+                    "read-only connections to the primary database.")
+    else:
+        storage_col1, storage_col2, storage_col3, storage_col4 = st.columns(4)
+        age = storage_stats['staleness']
+        storage_col1.metric("Snapshot Age", "none" if age is None else f"{age:,.0f} s")
+        storage_col2.metric("Snapshots Taken", storage_stats['snapshots'])
+        storage_col3.metric("Last Copy (ms)", f"{storage_stats['last_duration'] * 1000:,.0f}")
+        storage_col4.metric("Size (MiB)", f"{storage_stats['bytes'] / 2 ** 20:,.1f}")
+        st.markdown(
+            f"**Mode:** snapshot | **File:** {storage_stats['path']} | "
+            f"**Interval:** {storage_stats['interval']:,.0f} s | "
+            f"**Failures:** {storage_stats['failures']}"
+            + (f" | **Last error:** {storage_stats['last_error']}" if storage_stats['last_error'] else "")
+        )
+
+
+@fragment
+def archive_partitions():
+    partitions, hot = get_archive_partitions()
+    hot_rows = []
+    for table, (rows, size) in hot.items():
+        hot_rows.append({
+            "Partition": f"{table} (hot)",
+            "Rows": rows,
+            "Size (MiB)": None if size is None else (size['table_bytes'] + size['index_bytes']) / 2 ** 20,
+        })
+    archived_rows = [
+        {
+            "Partition": partition['month'],
+            "Rows": partition['sales_rows'] + partition['inventory_log_rows'],
+            "Size (MiB)": None if partition['bytes'] is None else partition['bytes'] / 2 ** 20,
+        }
+        for partition in partitions
+    ]
+    st.dataframe(pd.DataFrame(hot_rows + archived_rows), hide_index=True)
+    st.markdown(
+        f"**Archived months:** {len(partitions)} | "
+        f"**Kept hot:** the current month and {archive.KEEP_MONTHS} closed months | "
+        f"**Directory:** {archive.ARCHIVE_DIR}"
+    )
+    if st.button("Roll Over Closed Months"):
+        try:
+            archived = roll_over_archives()
+        except Exception as e:
+            st.error(f"Rollover failed: {str(e)}")
+        else:
+            st.success(f"Archived {len(archived)} months")
+            # Row counts and sizes elsewhere on the page change too
+            st.rerun()
+
+
+@fragment
+def recommendations():
+    pending_recommendation_sales = count_pending_recommendation_sales()
+    st.markdown(f"**Sales not yet in the recommendations:** {pending_recommendation_sales:,} | "
+                f"**Neighbors per product:** {recommend.TOP_K} | "
+                f"**Minimum shared customers:** {recommend.MIN_CUSTOMERS}")
+    update_col, rebuild_col = st.columns(2)
+    with update_col:
+        update_recommendations = st.button("Update Recommendations", disabled=not pending_recommendation_sales)
+    with rebuild_col:
+        rebuild_recommendations = st.button("Rebuild Recommendations")
+    if update_recommendations or rebuild_recommendations:
+        try:
+            pairs, lists = refresh_recommendations(full=rebuild_recommendations)
+        except Exception as e:
+            st.error(f"Recommendation update failed: {str(e)}")
+        else:
+            st.success(f"Added {pairs:,} customer/product pairs and updated {lists:,} neighbor lists")
+
+
+@fragment
+def query_plan_audit():
+    if profiler.ENABLED:
+        st.caption("Covers the registered queries, plus every query data functions have run since the profiler "
+                   "started collecting.")
+    else:
+        st.caption("Covers the registered queries only. Statements data functions run that are not registered "
+                   "are skipped unless the app runs with CRM_PROFILE=1.")
+    if st.button("Run Audit"):
+        with db.connection() as conn:
+            missing = migrations.missing_indexes(conn)
+        audit_results = query_audit.audit()
+        for name, table, columns in missing:
+            st.warning(f"Missing index {name} on {table} ({columns})")
+        flagged = [r for r in audit_results if r['full_scans'] or r['error']]
+        if flagged:
+            st.warning(f"{len(flagged)} of {len(audit_results)} queries use a full table scan")
+        else:
+            st.success(f"All {len(audit_results)} queries use an index")
+        st.dataframe(pd.DataFrame([
+            {
+                "Query": r['query'],
+                "Full Scan": "⚠" if r['full_scans'] else "",
+                "Plan": r['error'] or "; ".join(r['plan']),
+            }
+            for r in audit_results
+        ]))
+
+
+@fragment
+def table_explorer(tables):
+    st.subheader("Database Tables")
+
+    # Select a table to explore
+    selected_table = st.selectbox("Select a table to explore", tables)
+
+    if selected_table:
+        # Get table information
+        table_info = get_table_info(selected_table)
+
+        # Display table stats
+        row_count = table_info['row_count']
+        st.markdown(f"**Rows:** {'n/a' if row_count is None else f'{row_count:,}'} "
+                    f"({table_info['row_count_source']})")
+        if table_info['size']:
+            size = table_info['size']
+            st.markdown(f"**On disk:** {size['table_bytes'] / 1024:,.0f} KiB in {size['table_pages']:,} pages, "
+                        f"plus {size['index_bytes'] / 1024:,.0f} KiB of indexes (measured {size['measured_at']})")
+        else:
+            st.caption("Refresh Statistics to measure the size on disk.")
+
+        stats_col1, stats_col2 = st.columns(2)
+        if stats_col1.button("Exact Count"):
+            count_result = execute_query(f"SELECT COUNT(*) AS row_count FROM {selected_table};")
+            if count_result['success']:
+                st.markdown(f"**Exact rows:** {int(count_result['results'].iloc[0, 0]):,} "
+                            f"({count_result['elapsed'] * 1000:.0f} ms)")
+            else:
+                st.error(f"Error counting rows: {count_result['error']}")
+        stats_col2.button("Refresh Statistics", on_click=analyze_table, args=(selected_table,))
+
+        # Display table schema
+        st.markdown("### Table Schema")
+        schema_data = []
+        for col, col_stats in zip(table_info['columns'], table_info['column_stats']):
+            schema_data.append({
+                "Column ID": col[0],
+                "Name": col[1],
+                "Type": col[2],
+                "NotNull": "✓" if col[3] else "",
+                "Default Value": col[4] if col[4] is not None else "",
+                "Primary Key": "✓" if col[5] else "",
+                "Distinct": col_stats['distinct'],
+                "Null %": None if col_stats['null_fraction'] is None else round(col_stats['null_fraction'] * 100, 1),
+                "Statistics From": col_stats['source'] or "",
+            })
+
+        st.dataframe(pd.DataFrame(schema_data))
+
+        # Display sample data
+        st.markdown("### Sample Data (First 5 rows)")
+
+        # Create a DataFrame from sample data
+        if table_info['sample_data']:
+            column_names = [col[1] for col in table_info['columns']]
+            df = pd.DataFrame(table_info['sample_data'], columns=column_names)
+            st.dataframe(df)
+        else:
+            st.info("No data in this table.")
+
+        # Button to view all data
+        if st.button("View All Data"):
+            query_result = execute_query(f"SELECT * FROM {selected_table};")
+
+            if query_result['success']:
+                st.dataframe(query_result['results'])
+                st.markdown(f"Total rows: {query_result['row_count']}")
+                if query_result['truncated']:
+                    st.warning(f"Showing the first {query_result['row_count']} rows only. "
+                               "Export the table to get every row.")
+            else:
+                st.error(f"Error executing query: {query_result['error']}")
+
+        # Export the whole table without loading it into memory
+        export_download(f"SELECT * FROM {selected_table};", selected_table)
+
+
+@fragment
+def query_runner():
+    st.subheader("Run SQL Queries")
+
+    # SQL query input
+    st.markdown("""
+    Enter your SQL query below. Be careful with UPDATE, DELETE, and INSERT operations.
+
+    Examples:
+    ```sql
+    -- Get all products with price > $300
+    SELECT * FROM products WHERE price > 300;
+
+    -- Count products by category
+    SELECT category, COUNT(*) as count FROM products GROUP BY category;
+
+    -- Join products and feedback
+    SELECT p.name, f.rating, f.comments 
+    FROM feedback f 
+    JOIN products p ON f.product_id = p.id;
+    ```
+    """)
+
+    query = st.text_area("SQL Query", height=150)
+
+    # Run query button
+    if st.button("Run Query"):
+        if not query:
+            st.error("Please enter a SQL query.")
+        else:
+            # Confirm destructive operations
+            if any(op in query.upper() for op in ["UPDATE", "DELETE", "DROP", "TRUNCATE"]):
+                confirm = st.checkbox("I confirm I want to run this query that may modify or delete data")
+                if not confirm:
+                    st.warning("Please confirm the operation to proceed with data modification.")
+                    return
+
+            # Execute the query
+            query_result = execute_query(query)
+
+            if query_result['success']:
+                if 'results' in query_result:
+                    # For SELECT queries
+                    if not query_result['results'].empty:
+                        st.dataframe(query_result['results'])
+                    else:
+                        st.info("Query executed successfully, but returned no results.")
+                    st.markdown(f"Rows returned: {query_result['row_count']}")
+                    if query_result['truncated']:
+                        st.warning(f"Result truncated at {query_result['row_count']} rows. "
+                                   "Use the export below to download every row.")
+                else:
+                    # For non-SELECT queries
+                    st.success(f"Query executed successfully. Rows affected: {query_result['row_count']}")
+            else:
+                st.error(f"Error executing query: {query_result['error']}")
+            st.caption(
+                f"{query_result['elapsed'] * 1000:.1f} ms | "
+                f"~{query_result['vm_steps']:,} VM steps | "
+                f"{'read-only connection' if query_result['read_only'] else 'read-write connection'}"
+            )
+
+    # Limits and the last few runs
+    with st.expander("Query History"):
+        st.markdown(
+            f"Statements stop after **{query_guard.QUERY_TIMEOUT:g}s** and results are capped at "
+            f"**{streaming.MAX_RESULT_ROWS:,}** rows. SELECT, WITH, VALUES and EXPLAIN run on a "
+            "read-only connection."
+        )
+        runs = query_guard.history()
+        if runs:
+            st.dataframe(pd.DataFrame(runs))
+        else:
+            st.info("No queries run yet.")
+
+    # Stream the full result of a SELECT to a file
+    if query and query_guard.is_read_query(query):
+        export_download(query, "query_result")
@@ -0,0 +1,66 @@
+import streamlit as st
+
+from views import fragment
+from views.data import get_product_by_id, get_products, submit_feedback
+
+
+def render():
+    st.title("Customer Feedback")
+    
+    # Get selected product if any
+    selected_product = None
+    if 'selected_product_id' in st.session_state:
+        selected_product = get_product_by_id(st.session_state.selected_product_id)
+    # The product list is only offered without a preselected product
+    products = None if selected_product else get_products()
+    
+    feedback_form(selected_product, products)
+
+
+@fragment
+def feedback_form(selected_product, products):
+    # Submitting reruns just the form
+    with st.form("feedback_form"):
+        st.markdown("### Submit Feedback")
+        
+        customer_name = st.text_input("Your Name")
+        customer_email = st.text_input("Your Email")
+        
+        # Product selection
+        if selected_product:
+            st.markdown(f"**Selected Product:** {selected_product['name']}")
+            if selected_product['also_bought']:
+                st.caption("Customers also bought: " +
+                           ", ".join(neighbor['name'] for neighbor in selected_product['also_bought']))
+            product_id = selected_product['id']
+        else:
+            product_options = ["-- Select a product --"] + [f"{p['id']}: {p['name']}" for p in products]
+            product_selection = st.selectbox("Product", product_options)
+            
+            if product_selection == "-- Select a product --":
+                product_id = None
+            else:
+                product_id = int(product_selection.split(":")[0])
+        
+        # Rating
+        rating = st.slider("Rating", 1, 5, 5)
+        
+        # Comments
+        comments = st.text_area("Comments")
+        
+        submit_button = st.form_submit_button("Submit Feedback")
+        
+        if submit_button:
+            if not customer_name or not customer_email:
+                st.error("Please provide your name and email.")
+            elif not product_id:
+                st.error("Please select a product.")
+            else:
+                success = submit_feedback(customer_name, customer_email, product_id, rating, comments)
+                if success:
+                    st.success("Thank you for your feedback!")
+                    # Clear selected product
+                    if 'selected_product_id' in st.session_state:
+                        del st.session_state.selected_product_id
+                else:
+                    st.error("We're receiving a lot of feedback right now. Please try again in a moment.")
@@ -0,0 +1,52 @@
+import streamlit as st
+import pandas as pd
+
+import bulk_import
+from views import fragment
+
+
+def render():
+    st.title("Bulk Import")
+    
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to import data. Admin privileges required.")
+    else:
+        st.markdown("""
+        Upload a CSV or Parquet file whose header row matches the target table's columns.
+        
+        - **products**: name, description, category, price, stock_quantity (optional id to update existing rows)
+        - **sales**: product_id, quantity, total_price, customer_name, customer_email, sale_date
+        - **inventory_log**: product_id, quantity_change, reason, log_date
+        
+        Sales and inventory movements also update product stock, and each sale is recorded in the inventory log.
+        """)
+        
+        import_form()
+
+
+@fragment
+def import_form():
+    import_table = st.selectbox("Target table", bulk_import.TABLES)
+    import_file = st.file_uploader("Data file", type=["csv", "parquet"])
+    chunk_size = st.number_input("Rows per transaction", min_value=1000, max_value=1000000,
+                                 value=bulk_import.CHUNK_SIZE, step=10000)
+
+    if st.button("Import") and import_file is not None:
+        progress_text = st.empty()
+
+        def show_progress(report):
+            progress_text.text(f"{report['rows_read']:,} rows read, {report['rows_imported']:,} imported, "
+                               f"{report['rows_rejected']:,} rejected")
+
+        try:
+            report = bulk_import.import_file(import_file, import_table, chunk_size=int(chunk_size),
+                                             progress=show_progress)
+        except Exception as e:
+            st.error(f"Import failed: {str(e)}")
+        else:
+            st.success(f"Imported {report['rows_imported']:,} of {report['rows_read']:,} rows into "
+                       f"{report['table']} in {report['elapsed']:.1f}s "
+                       f"({report['rows_per_sec']:,.0f} rows/s)")
+            if report['rows_rejected']:
+                st.warning(f"{report['rows_rejected']:,} rows were rejected")
+                st.dataframe(pd.DataFrame(report['errors']))
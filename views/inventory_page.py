@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+
+import metrics
+from views import fragment
+from views.data import get_inventory_reconciliation, get_low_stock_alerts, get_stock_as_of
+
+
+def render():
+    st.title("Inventory")
+    
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to view inventory. Admin privileges required.")
+    else:
+        st.markdown("""
+        Stock levels are replayed from the inventory log, starting from each product's opening
+        balance. The reconciliation lists products whose recorded stock quantity no longer matches
+        the log.
+        """)
+        
+        drift = get_inventory_reconciliation()
+        alerts = get_low_stock_alerts()
+        inv_col1, inv_col2 = st.columns(2)
+        inv_col1.metric("Products Out of Balance", len(drift))
+        inv_col2.metric(f"Low-Stock Alerts (≤ {metrics.LOW_STOCK_THRESHOLD})", len(alerts))
+        
+        st.subheader("Reconciliation")
+        if drift:
+            st.dataframe(pd.DataFrame(drift).set_index("id"))
+        else:
+            st.success("Every product's stock quantity matches the inventory log.")
+        
+        st.subheader("Low-Stock Alerts")
+        if alerts:
+            st.dataframe(pd.DataFrame(alerts).set_index("id"))
+        else:
+            st.info("No product has dropped to the low-stock threshold yet.")
+        
+        stock_as_of()
+
+
+@fragment
+def stock_as_of():
+    # Changing the date or product reruns only this section
+    st.subheader("Stock As Of")
+    as_of_col1, as_of_col2 = st.columns(2)
+    as_of_date = as_of_col1.date_input("Date", value=datetime.now().date())
+    as_of_product = as_of_col2.number_input("Product ID (0 for all)", min_value=0, value=0, step=1)
+    levels = get_stock_as_of(as_of_date, int(as_of_product) or None)
+    if levels:
+        st.dataframe(pd.DataFrame(sorted(levels.items()), columns=["product_id", "quantity"])
+                     .set_index("product_id"))
+    else:
+        st.info("No stock recorded by that date.")
@@ -0,0 +1,93 @@
+import streamlit as st
+
+import auth
+from views import fragment
+from views.data import register_user, verify_password
+
+
+def render():
+    st.title("Welcome to the Sales CRM System")
+    
+    # Create tabs for login and registration
+    login_tab, register_tab = st.tabs(["Login", "Register"])
+    
+    with login_tab:
+        col1, col2 = st.columns([1, 1])
+        
+        with col1:
+            st.markdown("""
+            ### Welcome Back
+            
+            This system helps sales teams manage customer relationships, track products, and collect customer feedback.
+            
+            **Features:**
+            - Product management and search
+            - Customer feedback collection
+            - Sales analytics and reporting
+            
+            Login with your credentials to get started.
+            
+            **Default admin login:**
+            - Username: admin
+            - Password: password
+            """)
+        
+        with col2:
+            login_form()
+    
+    with register_tab:
+        st.markdown("### Create a New Account")
+        st.markdown("Register to access our product catalog and submit feedback.")
+        
+        register_form()
+
+
+@fragment
+def login_form():
+    # A failed attempt reruns only the form; signing in reruns the app
+    with st.form("login_form"):
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        submit = st.form_submit_button("Login")
+
+        if submit:
+            if username and password:
+                user = verify_password(username, password)
+                if user:
+                    st.session_state.logged_in = True
+                    st.session_state.username = user['username']
+                    st.session_state.role = user['role']
+                    st.session_state.session_token = auth.issue_token(user)
+                    st.session_state.page = 'dashboard'
+                    st.success("Login successful!")
+                    st.rerun()
+                else:
+                    st.error("Invalid username or password")
+            else:
+                st.error("Please enter both username and password")
+
+
+@fragment
+def register_form():
+    with st.form("register_form"):
+        new_username = st.text_input("Choose a Username")
+        new_password = st.text_input("Choose a Password", type="password")
+        confirm_password = st.text_input("Confirm Password", type="password")
+
+        register_button = st.form_submit_button("Register")
+
+        if register_button:
+            if not new_username or not new_password or not confirm_password:
+                st.error("All fields are required.")
+            elif new_password != confirm_password:
+                st.error("Passwords do not match.")
+            elif len(new_password) < 6:
+                st.error("Password must be at least 6 characters long.")
+            else:
+                success, message = register_user(new_username, new_password)
+                if success:
+                    st.success(message)
+                    # Switch to login tab after successful registration
+                    st.info("You can now log in with your new account!")
+                else:
+                    st.error(message)
@@ -0,0 +1,107 @@
+import streamlit as st
+import pandas as pd
+
+import profiler
+import startup
+from views import fragment
+from views.data import profile_startup
+
+
+def render():
+    st.title("Performance")
+    
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to view performance data. Admin privileges required.")
+    else:
+        if not profiler.ENABLED:
+            st.info("SQL statement profiling is off: statements, the slow query log and the profiled queries "
+                    "in the query plan audit stay empty. Start the app with CRM_PROFILE=1 to collect them.")
+        perf = profiler.snapshot()
+        st.markdown(f"Collected since **{perf['since']}**. Statement times cover execution up to the first row; "
+                    "data function and page times are wall clock, including fetching and rendering. "
+                    "Pages listed as page/section are reruns of just that fragment of the page.")
+        
+        perf_col1, perf_col2, perf_col3, perf_col4 = st.columns(4)
+        perf_col1.metric("Statements Timed", sum(row['count'] for row in perf['statements']))
+        perf_col2.metric("Statements Traced", perf['traced_statements'])
+        perf_col3.metric("Slow Queries", len(perf['slow_queries']))
+        perf_col4.metric("Page Reruns", sum(row['count'] for row in perf['pages']))
+        
+        def timing_frame(rows, label):
+            frame = pd.DataFrame(rows)
+            if frame.empty:
+                return frame
+            for column in ("total", "mean", "p50", "p95", "p99", "max", "sql_total"):
+                if column in frame:
+                    frame[column] = (frame[column] * 1000).round(2)
+            if "statements" in frame:
+                frame["statements per run"] = (frame["statements"] / frame["count"]).round(1)
+            return frame.rename(columns={"total": "total ms", "mean": "mean ms", "p50": "p50 ms",
+                                         "p95": "p95 ms", "p99": "p99 ms", "max": "max ms",
+                                         "sql_total": "sql ms"}).set_index(label)
+        
+        perf_tab1, perf_tab2, perf_tab3, perf_tab4, perf_tab5 = st.tabs(["Pages", "Data Functions",
+                                                                         "SQL Statements", "Slow Query Log",
+                                                                         "Startup"])
+        with perf_tab1:
+            st.dataframe(timing_frame(perf['pages'], "page"))
+        with perf_tab2:
+            st.dataframe(timing_frame(perf['functions'], "function"))
+        with perf_tab3:
+            st.dataframe(timing_frame(perf['statements'], "statement"))
+        with perf_tab4:
+            slow_query_log()
+        with perf_tab5:
+            startup_profile()
+        
+        export_col1, export_col2, export_col3 = st.columns(3)
+        export_col1.download_button("Export JSON", profiler.get_profiler().to_json(),
+                                    file_name="crm_profile.json", mime="application/json")
+        export_col2.download_button("Export Prometheus", profiler.get_profiler().to_prometheus(),
+                                    file_name="crm_metrics.prom", mime="text/plain")
+        export_col3.button("Reset Timings", on_click=profiler.reset)
+
+
+@fragment
+def slow_query_log():
+    # Reads the log itself, so a new threshold applies without a full rerun
+    perf = profiler.snapshot()
+    threshold = st.number_input("Slow query threshold (ms)", min_value=1.0,
+                                value=float(perf['slow_query_ms']), step=10.0)
+    if threshold != perf['slow_query_ms']:
+        profiler.get_profiler().slow_query_ms = threshold
+    if perf['slow_queries']:
+        st.dataframe(pd.DataFrame(perf['slow_queries']))
+    else:
+        st.info("No statements over the threshold yet.")
+
+
+@fragment
+def startup_profile():
+    st.markdown(f"Each page's module is imported the first time the page is shown. From a fresh process "
+                f"the login page should paint within **{startup.FIRST_PAINT_TARGET_MS:,.0f} ms**, "
+                f"without loading {', '.join(startup.HEAVY_MODULES)}.")
+    if st.button("Profile Startup"):
+        with st.spinner("Timing imports in fresh interpreters..."):
+            try:
+                st.session_state.startup_report = profile_startup()
+            except Exception as e:
+                st.error(f"Startup profiling failed: {str(e)}")
+    startup_report = st.session_state.get('startup_report')
+    if startup_report:
+        paint = startup_report['first_paint']
+        paint_col1, paint_col2, paint_col3 = st.columns(3)
+        paint_col1.metric("Login First Paint (ms)", f"{paint['first_paint_ms']:,.0f}",
+                          delta=f"{paint['first_paint_ms'] - startup.FIRST_PAINT_TARGET_MS:+,.0f} vs target",
+                          delta_color="inverse")
+        paint_col2.metric("Streamlit Load (ms)", f"{paint['streamlit_ms']:,.0f}")
+        paint_col3.metric("Heavy Libraries on Login", ", ".join(paint['heavy']) or "none")
+        st.dataframe(pd.DataFrame([
+            {
+                "Page": row['page'],
+                "Import ms": round(row['import_ms'], 1),
+                "Modules": row['modules'],
+                "Heavy Libraries": ", ".join(row['heavy']),
+            }
+            for row in startup_report['pages']
+        ]).set_index("Page"))
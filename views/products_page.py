@@ -0,0 +1,88 @@
+import streamlit as st
+
+from views import SEARCH_DEBOUNCE, fragment
+from views.data import count_products, get_also_bought, get_product_categories, get_products
+
+# Page sizes offered on the Products page
+PRODUCT_PAGE_SIZES = [12, 24, 48]
+
+
+def render():
+    st.title("Products")
+    catalog(["All"] + get_product_categories())
+
+
+@fragment
+def catalog(categories):
+    # Search, filters, the grid and paging rerun on their own; categories
+    # are read by the script run that drew the page
+    st.markdown("### Search Products")
+    col1, col2, col3 = st.columns([3, 1, 1])
+
+    with col1:
+        # Applied once typing pauses; spacing differences are not a new search
+        search_term = st.text_input("Search by name or description", type="search", live=SEARCH_DEBOUNCE)
+        search_term = " ".join(search_term.split())
+
+    with col2:
+        selected_category = st.selectbox("Category", categories)
+
+    with col3:
+        page_size = st.selectbox("Per page", PRODUCT_PAGE_SIZES)
+
+    category_filter = selected_category if selected_category != "All" else None
+
+    # Keyset cursors for the pages visited so far; reset when the filter changes
+    product_filter = (search_term, selected_category, page_size)
+    if st.session_state.get('products_filter') != product_filter:
+        st.session_state.products_filter = product_filter
+        st.session_state.products_cursors = [None]
+    cursors = st.session_state.products_cursors
+
+    # Fetch one extra row to know whether a next page exists
+    page_products = get_products(search_term, category_filter, after_id=cursors[-1], limit=page_size + 1)
+    has_next = len(page_products) > page_size
+    page_products = page_products[:page_size]
+    total_products = count_products(search_term, category_filter)
+    also_bought = get_also_bought(tuple(product['id'] for product in page_products))
+
+    # Display products in a grid
+    st.markdown("### Product Catalog")
+
+    if not page_products:
+        st.info("No products found matching your search criteria.")
+    else:
+        page_number = len(cursors)
+        page_count = max(1, -(-total_products // page_size))
+        st.markdown(f"Page {page_number} of {page_count} ({total_products} products)")
+
+        # Display products in rows of 3
+        for i in range(0, len(page_products), 3):
+            cols = st.columns(3)
+            for j in range(3):
+                if i + j < len(page_products):
+                    product = page_products[i + j]
+                    with cols[j]:
+                        st.markdown(f"#### {product['name']}")
+                        st.markdown(f"**Price:** ${product['price']:.2f}")
+                        st.markdown(f"**Category:** {product['category']}")
+                        st.markdown(f"**Description:** {product['description']}")
+                        st.markdown(f"**In Stock:** {product['stock_quantity']}")
+                        if product['id'] in also_bought:
+                            st.markdown("**Customers also bought:** " +
+                                        ", ".join(neighbor['name'] for neighbor in also_bought[product['id']]))
+
+                        # Button to leave feedback for this product
+                        if st.button("Leave Feedback", key=f"feedback_{product['id']}"):
+                            st.session_state.selected_product_id = product['id']
+                            st.session_state.page = 'feedback'
+                            st.rerun()
+
+                        st.markdown("---")
+
+        # Page navigation; the cursor moves before the catalog reruns
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            st.button("← Previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+        with next_col:
+            st.button("Next →", disabled=not has_next, on_click=cursors.append, args=(page_products[-1]['id'],))
@@ -0,0 +1,52 @@
+import streamlit as st
+import pandas as pd
+
+import sales
+from views import fragment
+
+
+def render():
+    st.title("Record Sales")
+    
+    if st.session_state.role != 'admin':
+        st.error("You don't have permission to record sales. Admin privileges required.")
+    else:
+        st.markdown("""
+        Enter one line per sale. The whole batch is applied in a single transaction: stock is
+        decremented and the inventory log updated for every accepted line, and lines that would
+        oversell a product are rejected.
+        """)
+        
+        sales_batch()
+
+
+@fragment
+def sales_batch():
+    # Every edit in the grid reruns only this section
+    sale_lines = st.data_editor(
+        pd.DataFrame({
+            "product_id": pd.Series(dtype="Int64"),
+            "quantity": pd.Series(dtype="Int64"),
+            "customer_name": pd.Series(dtype="str"),
+            "customer_email": pd.Series(dtype="str"),
+        }),
+        num_rows="dynamic",
+        key="sale_lines_editor",
+    )
+
+    if st.button("Record Batch"):
+        batch = [
+            {key: (None if pd.isna(value) else value) for key, value in line.items()}
+            for line in sale_lines.to_dict("records")
+            if not pd.isna(line.get("product_id"))
+        ]
+        if not batch:
+            st.error("Please enter at least one sale.")
+        else:
+            line_results = sales.record_sales(batch)
+            accepted = sum(1 for r in line_results if r['status'] == sales.OK)
+            if accepted == len(line_results):
+                st.success(f"Recorded all {accepted} sales.")
+            else:
+                st.warning(f"Recorded {accepted} of {len(line_results)} sales.")
+            st.dataframe(pd.DataFrame(line_results))